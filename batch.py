@@ -0,0 +1,251 @@
+# Time Fairness in Online Knapsack Problems
+# Batch Simulation Engine (advances many traces in lockstep using NumPy)
+
+import numpy as np
+import random
+import knapsack as k
+import instrument
+
+# relative distance under which a vectorized threshold is re-evaluated with the scalar helper,
+# so that admission decisions match the scalar algorithms exactly (np.power and libm pow can differ by an ulp)
+TIE_TOLERANCE = 1e-12
+
+# list of value sequences, one per trace  -- traceValues
+# list of weight sequences, one per trace -- traceWeights
+# returns flat value and weight arrays, plus trace boundaries (length T + 1)
+def flattenTraces(traceValues, traceWeights):
+    lengths = np.array([len(x) for x in traceValues], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    if len(lengths) == 0:
+        return np.zeros(0), np.zeros(0), offsets
+    return np.concatenate(traceValues).astype(float), np.concatenate(traceWeights).astype(float), offsets
+
+# padded (T x n) array of values          -- vals
+# padded (T x n) array of weights         -- weights
+# number of items in each trace           -- lengths
+# returns flat value and weight arrays, plus trace boundaries (length T + 1)
+def paddedToRagged(vals, weights, lengths):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    valid = np.arange(np.shape(vals)[1])[None, :] < lengths[:, None]
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    return np.asarray(vals, dtype=float)[valid], np.asarray(weights, dtype=float)[valid], offsets
+
+# flat boolean mask of packed items        -- packed
+# trace boundaries (length T + 1)          -- offsets
+# returns the packed set of each trace, as in the scalar algorithms
+def packedSets(packed, offsets):
+    return [set(np.flatnonzero(packed[offsets[t]:offsets[t+1]]).tolist()) for t in range(len(offsets) - 1)]
+
+# knapsack capacity (scalar or one per knapsack)     -- W
+# remaining capacity of each knapsack                -- remainingW
+# value density of the item offered to each knapsack -- density
+# weight of the item offered to each knapsack        -- weights
+# threshold function (see ThresholdFunction)        -- threshold
+# per-knapsack threshold parameters                  -- rowArgs
+# returns a boolean array, True for each knapsack that admits its item
+def decide(W, remainingW, density, weights, threshold, rowArgs=()):
+    z_j = (W - remainingW) / W  # how much of each knapsack is occupied
+    phi_j = threshold.vector(z_j, *rowArgs)
+
+    # re-evaluate thresholds that are within rounding distance of the density with the scalar helper
+    close = np.flatnonzero(np.abs(density - phi_j) <= TIE_TOLERANCE * phi_j)
+    if len(close) > 0:
+        if instrument.ENABLED:
+            instrument.count("tieFixups", len(close))
+        phi_j = np.array(np.broadcast_to(phi_j, np.shape(density)), dtype=float)
+        for c in close:
+            phi_j[c] = threshold(float(z_j[c]), *[p[c] for p in rowArgs])
+
+    # add item if value/weight ratio is greater than phi (rem > w is equivalent to rem - w > 0 in floating point)
+    admit = density >= phi_j
+    admit &= remainingW > weights
+    return admit
+
+# flat array of weights for all traces               -- weights
+# flat array of values for all traces                -- vals
+# trace boundaries (length T + 1)                    -- offsets
+# traces are sorted by decreasing length, so that the traces still running are always a prefix of the rows.
+# returns the sort order, the number of traces still running at each step, where each step starts, the
+# item-major position of each item, and item-major (item i of every trace, then item i+1, ...) copies of
+# weights and values, so that each step reads contiguous memory
+def itemMajor(weights, vals, offsets):
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    T = len(lengths)
+    order = np.argsort(-lengths, kind="stable")
+    rank = np.empty(T, dtype=np.int64)
+    rank[order] = np.arange(T)
+    sortedLengths = lengths[order]
+    n = int(sortedLengths[0]) if T > 0 else 0
+
+    # number of traces still running at each step, and where each step starts in item-major order
+    active = T - np.searchsorted(sortedLengths[::-1], np.arange(n), side="right")
+    stepOffsets = np.concatenate(([0], np.cumsum(active)))
+
+    itemIndex = np.arange(offsets[-1] - offsets[0]) - np.repeat(offsets[:-1] - offsets[0], lengths)
+    dest = stepOffsets[itemIndex] + np.repeat(rank, lengths)
+    weightsIM = np.empty(len(dest))
+    valsIM = np.empty(len(dest))
+    weightsIM[dest] = weights[offsets[0]:offsets[-1]]
+    valsIM[dest] = vals[offsets[0]:offsets[-1]]
+    return order, active, stepOffsets, dest, weightsIM, valsIM
+
+# knapsack of capacity W                             -- W
+# flat array of weights for all traces               -- weights
+# flat array of values for all traces                -- vals
+# trace boundaries (length T + 1)                    -- offsets
+# threshold function (see ThresholdFunction)        -- threshold
+# tuple of per-trace parameters                      -- rowParams
+# the threshold is evaluated as threshold.vector(z, *params) for all traces at once, and as
+# threshold(z, *params) for the traces whose density is within rounding distance of the threshold
+# returns final profit, final utilization, and a flat boolean mask of packed items
+def simulate(W, weights, vals, offsets, threshold, rowParams=()):
+    order, active, stepOffsets, dest, weightsIM, valsIM = itemMajor(weights, vals, offsets)
+    T = len(order)
+    n = len(active)
+    densityIM = valsIM / weightsIM
+    params = [np.asarray(p, dtype=float)[order] if np.ndim(p) > 0 else np.full(T, float(p)) for p in rowParams]
+
+    value = np.zeros(T)
+    remainingW = np.full(T, float(W))
+    packedIM = np.zeros(len(dest), dtype=bool)
+    if instrument.ENABLED:
+        threshold = instrument.TimedThreshold(threshold)
+        instrument.count("steps", n)
+    start = instrument.clock()
+
+    #''simulate'' the behavior of the online algorithm on every trace at once
+    for i in range(n):
+        a = active[i]
+        s, t = stepOffsets[i], stepOffsets[i+1]
+        w = weightsIM[s:t]
+        rem = remainingW[:a]
+        admit = decide(W, rem, densityIM[s:t], w, threshold, [p[:a] for p in params])
+        value[:a] += np.where(admit, valsIM[s:t], 0.0)
+        rem -= np.where(admit, w, 0.0)
+        packedIM[s:t] = admit
+
+    instrument.record("simulate", start, len(dest), int(np.count_nonzero(packedIM)) if start is not None else 0)
+
+    # undo the sort by length
+    profits = np.empty(T)
+    utilization = np.empty(T)
+    profits[order] = value
+    utilization[order] = W - remainingW
+    return profits, utilization, packedIM[dest]
+
+# knapsack of capacity W                -- W
+# flat array of weights for all traces  -- weights
+# flat array of values for all traces   -- vals
+# trace boundaries (length T + 1)       -- offsets
+# lower bound on value size ratio       -- L
+# upper bound on value size ratio       -- U
+# precomputed threshold (optional)      -- threshold
+def ZCLBatch(W, weights, vals, offsets, L, U, threshold=None):
+    if threshold is None:
+        threshold = k.PhiThreshold(L, U)
+    return simulate(W, weights, vals, offsets, threshold)
+
+# constant threshold per trace, passed in as a row parameter
+class RowThreshold:
+    def __call__(self, z, phi_j):
+        return phi_j
+
+    def vector(self, z, phi_j):
+        return phi_j
+
+# knapsack of capacity W                -- W
+# flat array of weights for all traces  -- weights
+# flat array of values for all traces   -- vals
+# trace boundaries (length T + 1)       -- offsets
+# lower bound on value size ratio       -- L
+# upper bound on value size ratio       -- U
+# random number generator for z         -- rng
+# draw of z for each trace (optional)    -- z
+def ZCLRandomizedBatch(W, weights, vals, offsets, L, U, rng=random, z=None):
+    # one constant threshold per trace, generated from the phi threshold function
+    threshold = k.PhiThreshold(L, U)
+    if z is None:
+        z = [rng.uniform(0, 1) for _ in range(len(offsets) - 1)]
+    thresholds = [threshold(float(z_j)) for z_j in z]
+    return simulate(W, weights, vals, offsets, RowThreshold(), (thresholds,))
+
+# knapsack of capacity W                -- W
+# flat array of weights for all traces  -- weights
+# flat array of values for all traces   -- vals
+# trace boundaries (length T + 1)       -- offsets
+# lower bound on value size ratio       -- L
+# upper bound on value size ratio       -- U
+# fairness parameter \in [0,1]          -- alpha
+# precomputed threshold (optional)      -- threshold
+def baselineBatch(W, weights, vals, offsets, L, U, alpha, threshold=None):
+    if threshold is None:
+        threshold = k.AlphaPhiThreshold(L, U, alpha)
+    return simulate(W, weights, vals, offsets, threshold)
+
+# knapsack of capacity W                -- W
+# flat array of weights for all traces  -- weights
+# flat array of values for all traces   -- vals
+# trace boundaries (length T + 1)       -- offsets
+# lower bound on value size ratio       -- L
+# upper bound on value size ratio       -- U
+# fairness parameter \in [0,1]          -- alpha
+# precomputed threshold (optional)      -- threshold
+def ECTBatch(W, weights, vals, offsets, L, U, alpha, threshold=None):
+    if threshold is None:
+        threshold = k.AlphaFairThreshold(L, U, alpha)
+    return simulate(W, weights, vals, offsets, threshold)
+
+# knapsack of capacity W                 -- W
+# flat array of weights for all traces   -- weights
+# flat array of values for all traces    -- vals
+# trace boundaries (length T + 1)        -- offsets
+# lower bound on value size ratio        -- L
+# upper bound on value size ratio        -- U
+# predicted d^star (scalar or per trace) -- hat_d
+# trust parameter \in [0,1]              -- gamma
+# precomputed threshold (optional)       -- threshold
+def LAECTBatch(W, weights, vals, offsets, L, U, hat_d, gamma, threshold=None):
+    if threshold is None:
+        threshold = k.AlphaLAThreshold(L, U, gamma)
+    return simulate(W, weights, vals, offsets, threshold, (hat_d,))
+
+# batch counterparts of the scalar algorithms in knapsack.py
+BATCH_ALGORITHMS = {
+    "ZCL": ZCLBatch,
+    "ZCLRandomized": ZCLRandomizedBatch,
+    "baseline": baselineBatch,
+    "ECT": ECTBatch,
+    "LAECT": LAECTBatch,
+}
+
+# name of the algorithm (see BATCH_ALGORITHMS)     -- algorithm
+# knapsack of capacity W                           -- W
+# list of weight sequences, one per trace          -- traceWeights
+# list of value sequences, one per trace           -- traceValues
+# remaining algorithm arguments (L, U, alpha, ...) -- args
+# number of traces simulated together              -- chunkSize
+# keyword arguments for the algorithm (threshold)  -- kwargs
+# arguments given as a sequence with one entry per trace are split along with the traces
+# returns the final profit for each trace, in the original order
+def simulateTraces(algorithm, W, traceWeights, traceValues, *args, chunkSize=2048, **kwargs):
+    T = len(traceValues)
+    if hasattr(traceValues, "gather"):
+        lengths = traceValues.lengths()
+    else:
+        lengths = np.array([len(x) for x in traceValues], dtype=np.int64)
+
+    # group traces of similar length into the same chunk, so every chunk has few lockstep steps
+    order = np.argsort(-lengths, kind="stable")
+    profits = np.empty(T)
+    for start in range(0, T, chunkSize):
+        idx = order[start:start + chunkSize]
+        if hasattr(traceValues, "gather"):
+            # traces backed by flat arrays (see trace_store.py) are gathered in bulk
+            vals, offsets = traceValues.gather(idx)
+            weights, _ = traceWeights.gather(idx)
+        else:
+            vals, weights, offsets = flattenTraces([traceValues[t] for t in idx], [traceWeights[t] for t in idx])
+        chunkArgs = [np.asarray(a)[idx] if np.ndim(a) > 0 and len(a) == T else a for a in args]
+        profits[idx] = BATCH_ALGORITHMS[algorithm](W, weights, vals, offsets, *chunkArgs, **kwargs)[0]
+    return profits
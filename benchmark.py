@@ -0,0 +1,223 @@
+# Time Fairness in Online Knapsack Problems
+# Benchmark Suite (algorithm throughput, DP scaling, data loading, and peak memory, saved as JSON)
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import random
+import numpy as np
+import knapsack as k
+import batch
+import workload
+
+# runs fn once under tracemalloc for its peak memory, then repeat times for its best wall-clock time
+def measure(fn, repeat=3):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+# arguments of each scalar algorithm after (W, weights, vals, n, L, U)
+SCALAR_ARGS = {
+    "ZCL": (),
+    "ZCLRandomized": (),
+    "baseline": (0.5,),
+    "ECT": (0.5,),
+    "LAECT": (None, 0.5),  # hat_d is filled in per trace
+}
+
+# items per second of each scalar algorithm in knapsack.py, and of its batch counterpart in batch.py
+# list of value sequences, one per trace    -- traceValues
+# list of weight sequences, one per trace   -- traceWeights
+# lower/upper bound on value size ratio     -- L, U
+def benchAlgorithms(traceValues, traceWeights, L, U, repeat=3):
+    items = sum(len(x) for x in traceValues)
+    hat_d = np.sqrt(L * U)  # a fixed prediction, in the middle of [L, U] on a log scale
+    results = {}
+    for name, args in SCALAR_ARGS.items():
+        args = tuple(hat_d if a is None else a for a in args)
+
+        def scalar():
+            for tValue, tWeight in zip(traceValues, traceWeights):
+                getattr(k, name)(1, tWeight, tValue, len(tValue), L, U, *args)
+
+        def vectorized():
+            batch.simulateTraces(name, 1, traceWeights, traceValues, L, U, *args)
+
+        scalarTime, scalarPeak = measure(scalar, repeat)
+        batchTime, batchPeak = measure(vectorized, repeat)
+        results[name] = {
+            "scalarItemsPerSecond": items / scalarTime,
+            "scalarPeakBytes": scalarPeak,
+            "batchItemsPerSecond": items / batchTime,
+            "batchPeakBytes": batchPeak,
+        }
+    return results
+
+# calls per second of the threshold helpers and of the threshold objects (scalar and vectorized)
+def benchThresholds(L, U, calls=100000, repeat=3):
+    z = np.random.default_rng(0).uniform(0, 1, calls)
+    zList = z.tolist()
+    helpers = {
+        "phi": lambda x: k.phi(x, L, U),
+        "alphaPhi": lambda x: k.alphaPhi(x, L, U, 0.5),
+        "alphaFair": lambda x: k.alphaFair(x, L, U, 0.5),
+        "alphaLA": lambda x: k.alphaLA(x, L, U, np.sqrt(L * U), 0.5),
+    }
+    objects = {
+        "PhiThreshold": (k.PhiThreshold(L, U), ()),
+        "AlphaPhiThreshold": (k.AlphaPhiThreshold(L, U, 0.5), ()),
+        "AlphaFairThreshold": (k.AlphaFairThreshold(L, U, 0.5), ()),
+        "AlphaLAThreshold": (k.AlphaLAThreshold(L, U, 0.5), (np.sqrt(L * U),)),
+    }
+    results = {}
+    for name, helper in helpers.items():
+        # the helpers are slow (alphaFair computes lambertw on every call), so they get fewer calls
+        sample = zList[:calls // 10]
+        elapsed, _ = measure(lambda: [helper(x) for x in sample], repeat)
+        results[name] = {"callsPerSecond": len(sample) / elapsed}
+    for name, (threshold, params) in objects.items():
+        scalarTime, _ = measure(lambda: [threshold(x, *params) for x in zList], repeat)
+        vectorTime, _ = measure(lambda: threshold.vector(z, *params), repeat)
+        results[name] = {"callsPerSecond": calls / scalarTime, "vectorCallsPerSecond": calls / vectorTime}
+    return results
+
+# time and peak memory of dpOptimalKnapsack for each (n, W), with and without memory-bounded reconstruction
+def benchDP(sizes, repeat=1):
+    rng = np.random.default_rng(0)
+    results = []
+    for n, W in sizes:
+        # integer weights between 1 and 5% of the capacity, as in the cloud traces at scale 100
+        weights = rng.integers(1, max(W // 20, 1) + 1, n).tolist()
+        vals = rng.uniform(1, 100, n).tolist()
+        for memoryBounded in (False, True):
+            elapsed, peak = measure(lambda: k.dpOptimalKnapsack(W, weights, vals, n, memoryBounded), repeat)
+            results.append({"n": n, "W": W, "cells": n * W, "memoryBounded": memoryBounded,
+                            "seconds": elapsed, "cellsPerSecond": n * W / elapsed, "peakBytes": peak})
+    return results
+
+# time to open the columnar store (warm), and to rebuild it from the per-trace cache (see load_traces.py)
+def benchLoading(theta, rebuild=False):
+    import load_traces
+    import trace_store
+    load_traces.loadDataAndOPT(theta=theta)  # make sure the store and the per-trace cache exist
+    results = {}
+    results["loadDataAndOPTSeconds"], results["loadDataAndOPTPeakBytes"] = measure(
+        lambda: load_traces.loadDataAndOPT(theta=theta), 3)
+    results["openStoreSeconds"], _ = measure(lambda: trace_store.openStore(trace_store.storePath(theta)), 3)
+    if rebuild:
+        results["rebuildFromCacheSeconds"], results["rebuildFromCachePeakBytes"] = measure(
+            lambda: load_traces.loadFromMAT(theta=theta), 1)
+    return results
+
+# modules whose import time is measured (the admission core, and the modules worker processes import)
+IMPORT_MODULES = ("knapsack", "batch", "online", "opt", "grid", "load_traces", "workload")
+
+# seconds to import each module in a fresh interpreter (best of repeat), and the heavy optional
+# dependencies (scipy, matplotlib, seaborn, mat4py, numba) it pulled in
+def benchImports(modules=IMPORT_MODULES, repeat=5):
+    script = ("import sys, time, json; start = time.perf_counter(); import {}; "
+              "print(json.dumps([time.perf_counter() - start, sorted(m for m in sys.modules if m.split('.')[0] in "
+              "('scipy', 'matplotlib', 'seaborn', 'mat4py', 'numba'))]))")
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module in modules:
+        best = float("inf")
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-c", script.format(module)], capture_output=True, text=True,
+                                 check=True, cwd=directory).stdout
+            seconds, heavy = json.loads(out.splitlines()[-1])
+            best = min(best, seconds)
+        results[module] = {"seconds": best, "heavyModules": sorted({m.split(".")[0] for m in heavy})}
+    return results
+
+# commit of the working tree, if this is a git checkout
+def gitCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        return None
+
+def main(args):
+    results = {
+        "commit": gitCommit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+    print("benchmarking import times")
+    results["imports"] = benchImports(repeat=args.repeat)
+
+    # synthetic traces (see workload.py) of controllable length, U/L, and weight distribution, with value
+    # densities drawn log-uniformly from [L, U]
+    L = 1.0
+    random.seed(args.seed)
+    results["synthetic"] = {}
+    for ratio in args.ratios:
+        spec = workload.Workload(values="loguniform", L=L, U=L * ratio)
+        traceValues, traceWeights, _, _ = workload.generateTraces(args.traces, args.length, args.seed, spec)
+        print("benchmarking algorithms on synthetic traces (U/L = {})".format(ratio))
+        results["synthetic"][str(ratio)] = {
+            "length": args.length,
+            "traces": args.traces,
+            "weights": list(spec.weights),
+            "algorithms": benchAlgorithms(traceValues, traceWeights, L, L * ratio, args.repeat),
+        }
+
+    print("benchmarking threshold functions")
+    results["thresholds"] = benchThresholds(L, L * args.ratios[-1], repeat=args.repeat)
+
+    print("benchmarking the DP")
+    sizes = [(n, W) for n in args.dp_items for W in args.dp_capacities]
+    results["dp"] = benchDP(sizes)
+
+    import shards
+    print("benchmarking sharded admission across worker processes")
+    results["sharded"] = {router: shards.scalingBenchmark(args.shard_workers, offers=args.shard_offers,
+                                                          router=router, seed=args.seed, alpha=0.5)
+                          for router in shards.ROUTERS}
+
+    if not args.skip_data:
+        import load_traces
+        print("benchmarking data loading and algorithms on the data-cloud traces")
+        results["loading"] = benchLoading(args.theta, args.rebuild)
+        traceValues, traceWeights, L, U = load_traces.loadBaseTraces(theta=args.theta)
+        results["cloud"] = benchAlgorithms(traceValues[:args.traces], traceWeights[:args.traces], L, U, args.repeat)
+
+    results["maxRSSBytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("saved results to {}".format(args.output))
+
+if __name__ == "__main__":
+    # runs the benchmarks and saves them as JSON; compare files from different commits to spot regressions
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--length", type=int, default=5000)
+    parser.add_argument("--traces", type=int, default=20)
+    parser.add_argument("--ratios", type=float, nargs="+", default=[500, 2500, 12500])
+    parser.add_argument("--dp_items", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--dp_capacities", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--shard_workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--shard_offers", type=int, default=200000)
+    parser.add_argument("--theta", type=int, default=10)
+    parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--skip_data", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -1,75 +1,56 @@
 # Time Fairness in Online Knapsack Problems
 # Experiments
 
-import knapsack as k
+import argparse
+import grid
 import numpy as np
-import seaborn as sns
-import random
-import pickle
-from math import e
-import matplotlib.pyplot as plt
-import itertools
-from multiprocessing import Pool
+import trace_store
 
-import matplotlib.style as style
-style.use('tableau-colorblind10')
-
-
-# function stubs for multiprocessing
-def OPT_unpack(args):
-    return k.dpOptimalKnapsack(*args)
-
-def ZCL_unpack(args):
-    return k.ZCL(*args)[0][-1] # profit is returned over time, so just get the final profit
-
-def ZCLRandomized_unpack(args):
-    return k.ZCLRandomized(*args)[0][-1] # profit is returned over time, so just get the final profit
-
-def ECT_unpack(args):
-    return k.ECT(*args)[0][-1] # profit is returned over time, so just get the final profit
-
-def baseline_unpack(args):
-    return k.baseline(*args)[0][-1] # profit is returned over time, so just get the final profit
 
+# algorithms and parameters compared in the experiments (see grid.py)
+ALGORITHMS = {
+    "ZCL": {},
+    "ZCLRandomized": {},
+    "ECT": {"alpha": [0.33, 0.66, 1]},
+    "baseline": {"alpha": [0.66]},
+}
 
 # main functions for experiments.
 # theta is a parameter controlling which of the three data sets to use (see load_traces.py)
-def experiment(theta):
+# runner is a grid.GridRunner whose worker pool is reused across experiments (optional)
+# loadOnly reads the results of an earlier run from the result store instead of computing them
+def experiment(theta, seed=0, runner=None, loadOnly=False):
     import load_traces
 
-    # get traces, L, U, and optimal solutions
-    tracesVal, tracesWgt, L, U, optimalSols, bestDens = load_traces.loadDataAndOPT(theta=theta)
+    spec = {"theta": [theta], "algorithms": ALGORITHMS}
+    if loadOnly:
+        # optimal solutions from the existing store, and the solutions of an earlier run from the result store
+        optimalSols = trace_store.openStore(trace_store.storePath(theta)).optimalSols
+        results = grid.loadGrid(spec, seed=seed)
+    else:
+        # get traces, L, U, and optimal solutions
+        tracesVal, tracesWgt, L, U, optimalSols, bestDens = load_traces.loadDataAndOPT(theta=theta)
 
-    # let's do some experiments!
+        # let's do some experiments!
 
-    # set knapsack capacity to 1, compute lengths of the traces
-    W = 1
-    lengths = [len(x) for x in tracesVal]
+        # compute ZCL, ZCLRandomized, ECT, and baseline algorithm solutions for each trace (with knapsack capacity 1),
+        # using the batch simulation engine on a pool of workers
+        if runner is None:
+            results = grid.runGrid(spec, seed=seed)
+        else:
+            results = runner.run(spec, seed=seed)
 
-    # compute ZCL, ZCLRandomized, ECT, and baseline algorithm solutions for each trace, using a thread pool
-    ZCLSols = []
-    with Pool(10) as p:
-        ZCLSols = p.map(ZCL_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U)))
+    ZCLSols = results[grid.Cell(theta, "ZCL", None, None, None)]
 
-    ZCLRandomizedSols = []
-    with Pool(10) as p:
-        ZCLRandomizedSols = p.map(ZCLRandomized_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U)))
+    ZCLRandomizedSols = results[grid.Cell(theta, "ZCLRandomized", None, None, None)]
 
-    ECT1Sols = [] # alpha = 0.33
-    with Pool(10) as p:
-        ECT1Sols = p.map(ECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), itertools.repeat(0.33)))
+    ECT1Sols = results[grid.Cell(theta, "ECT", 0.33, None, None)] # alpha = 0.33
 
-    ECT2Sols = [] # alpha = 0.66
-    with Pool(10) as p:
-        ECT2Sols = p.map(ECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), itertools.repeat(0.66)))
+    ECT2Sols = results[grid.Cell(theta, "ECT", 0.66, None, None)] # alpha = 0.66
 
-    baselineSols = [] # alpha = 0.66
-    with Pool(10) as p:
-        baselineSols = p.map(baseline_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), itertools.repeat(0.66)))
+    baselineSols = results[grid.Cell(theta, "baseline", 0.66, None, None)] # alpha = 0.66
 
-    ECT3Sols = [] # alpha = 1
-    with Pool(10) as p:
-        ECT3Sols = p.map(ECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), itertools.repeat(1)))
+    ECT3Sols = results[grid.Cell(theta, "ECT", 1, None, None)] # alpha = 1
 
     # compute empirical competitive ratios for each set of solutions, using numpy
     # convert optimal sols to numpy array
@@ -98,36 +79,33 @@ def experiment(theta):
     print("Baseline[0.66]: {}".format(np.mean(baselineRatios)))
     print("ECT[1]: {}".format(np.mean(ECT3Ratios)))
 
+    # report how tight the ratios are when OPT was only bounded (see opt.py)
+    bounds = load_traces.loadOPTBounds(theta=theta)
+    if bounds is not None:
+        print("largest relative gap between OPT bounds: {}".format(np.max(bounds[:, 1] / bounds[:, 0]) - 1))
+
     # return values for plotting
     return ZCLRatios, ZCLRandomizedRatios, ECT1Ratios, ECT2Ratios, baselineRatios, ECT3Ratios
  
 
 if __name__ == "__main__":
+    import plots
+
+    # --load plots the results of an earlier run (from results/) without recomputing anything
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load", action="store_true")
+    args = parser.parse_args()
+
     # for each value of theta, which corresponds to different values of U/L in [500, 2500, 12500], load the data set and run experiments
+    runner = None if args.load else grid.GridRunner()
     for theta in [10, 50, 250]:
-        ZCLRatios, ZCLRandomizedRatios, ECT1Ratios, ECT2Ratios, baselineRatios, ECT3Ratios = experiment(theta=theta)
-
-        # set plot size to (4, 3) and dpi = 500
-        plt.figure(figsize=(4, 3), dpi=500)
+        ZCLRatios, ZCLRandomizedRatios, ECT1Ratios, ECT2Ratios, baselineRatios, ECT3Ratios = experiment(theta=theta, runner=runner, loadOnly=args.load)
 
         linestyles = ['-', '--', ':', ':', '-.', ':', ':']
 
         # CDF plot for competitive ratio (across all experiments)
-        legend = ["ZCL", "ZCLRandomized", "ECT[alpha = 0.25]", "ECT[alpha = 0.5]", "baseline algorithm [alpha = 0.5]", "ECT[alpha = 0.75]", "ECT[alpha = 1]"]
-        for dat,ls in zip([ZCLRatios, ZCLRandomizedRatios, ECT1Ratios, ECT2Ratios, baselineRatios, ECT3Ratios], linestyles):
-            sns.ecdfplot(data = dat, linestyle = ls) # plots empirical CDF
-
-        # set labels and limits 
-        plt.ylabel('empirical CDF')
-        plt.xlabel("empirical competitive ratio")
-        plt.xlim(0.9, 12)
-
-        # [ this can be skipped if you don't need a legend ]
-        # change legend to be located outside the plot (bottom center)
-        # plt.legend(legend, ncol=7, loc='lower center', bbox_to_anchor=(0.5, -0.3))
-
-        # save plot to file
-        plt.tight_layout()
-        plt.savefig("theta{}.png".format(theta))
-        plt.clf()
-
+        # legend: ["ZCL", "ZCLRandomized", "ECT[alpha = 0.25]", "ECT[alpha = 0.5]", "baseline algorithm [alpha = 0.5]", "ECT[alpha = 0.75]", "ECT[alpha = 1]"]
+        plots.ratioCDF([ZCLRatios, ZCLRandomizedRatios, ECT1Ratios, ECT2Ratios, baselineRatios, ECT3Ratios], linestyles,
+                       "theta{}.png".format(theta))
+    if runner is not None:
+        runner.close()
@@ -1,74 +1,54 @@
 # Time Fairness in Online Knapsack Problems
 # Experiments
 
-import knapsack as k
+import argparse
+import grid
 import numpy as np
-import seaborn as sns
-import random
-import pickle
-from math import e
-import math
-import matplotlib.pyplot as plt
-import itertools
-from multiprocessing import Pool
+import trace_store
 
-import matplotlib.style as style
-style.use('seaborn-colorblind')
 
-
-# function stubs for multiprocessing
-def OPT_unpack(args):
-    return k.dpOptimalKnapsack(*args)
-
-def ZCL_unpack(args):
-    return k.ZCL(*args)[0][-1] # profit is returned over time, so just get the final profit
-
-def ZCLRandomized_unpack(args):
-    return k.ZCLRandomized(*args)[0][-1] # profit is returned over time, so just get the final profit
-
-def ECT_unpack(args):
-    return k.ECT(*args)[0][-1] # profit is returned over time, so just get the final profit
-
-def LAECT_unpack(args): 
-    return k.LAECT(*args)[0][-1]  # profit is returned over time, so just get the final profit
+# algorithms and parameters compared in the experiments (see grid.py)
+ALGORITHMS = {
+    "ZCL": {},
+    "ECT": {"alpha": [0.5]},
+    "LAECT": {"gamma": [0.33, 0.66, 1]},
+}
 
 # main functions for experiments.
 # error is a parameter controlling how much multiplicative error to add to the predictions
-def experimentLA(error):
+# runner is a grid.GridRunner whose worker pool is reused across experiments (optional)
+# loadOnly reads the results of an earlier run from the result store instead of computing them
+def experimentLA(error, seed=0, runner=None, loadOnly=False):
     import load_traces
 
-    # get traces, L, U, optimal solutions, and bestDens, where each density is the d^star value for the corresponding trace
-    tracesVal, tracesWgt, L, U, optimalSols, bestDens = load_traces.loadDataAndOPT(theta=50)
-
-    # let's do some experiments!
+    spec = {"theta": [50], "error": [error], "algorithms": ALGORITHMS}
+    if loadOnly:
+        # optimal solutions from the existing store, and the solutions of an earlier run from the result store
+        optimalSols = trace_store.openStore(trace_store.storePath(50)).optimalSols
+        results = grid.loadGrid(spec, seed=seed)
+    else:
+        # get traces, L, U, optimal solutions, and bestDens, where each density is the d^star value for the corresponding trace
+        tracesVal, tracesWgt, L, U, optimalSols, bestDens = load_traces.loadDataAndOPT(theta=50)
 
-    # set knapsack capacity
-    W = 1
-    lengths = [len(x) for x in tracesVal]
+        # let's do some experiments!
 
-    # add some gaussian (mean 0) noise to the predictions, with stddev = error
-    predictions = [x*abs(1 + random.gauss(0, error)) for x in bestDens]
+        # compute ZCL, ECT, and LA-ECT solutions for each trace (with knapsack capacity 1) using the batch simulation
+        # engine on a pool of workers.  the predictions are the d^star values with gaussian (mean 0) noise added,
+        # with stddev = error (see grid.noisyPredictions)
+        if runner is None:
+            results = grid.runGrid(spec, seed=seed)
+        else:
+            results = runner.run(spec, seed=seed)
 
-    # compute ZCL, ECT, and LA-ECT solutions for each trace using a thread pool
-    ZCLSols = []
-    with Pool(10) as p:
-        ZCLSols = p.map(ZCL_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U)))
+    ZCLSols = results[grid.Cell(50, "ZCL", None, None, None)]
 
-    ECTSols = []
-    with Pool(10) as p:
-        ECTSols = p.map(ECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), itertools.repeat(0.5)))
+    ECTSols = results[grid.Cell(50, "ECT", 0.5, None, None)]
 
-    LAECT1Sols = []
-    with Pool(10) as p:
-        LAECT1Sols = p.map(LAECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), predictions, itertools.repeat(0.33)))
+    LAECT1Sols = results[grid.Cell(50, "LAECT", None, 0.33, error)]
 
-    LAECT2Sols = []
-    with Pool(10) as p:
-        LAECT2Sols = p.map(LAECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), predictions, itertools.repeat(0.66)))
+    LAECT2Sols = results[grid.Cell(50, "LAECT", None, 0.66, error)]
 
-    LAECT3Sols = []
-    with Pool(10) as p:
-        LAECT3Sols = p.map(LAECT_unpack, zip(itertools.repeat(W), tracesWgt, tracesVal, lengths, itertools.repeat(L), itertools.repeat(U), predictions, itertools.repeat(1)))
+    LAECT3Sols = results[grid.Cell(50, "LAECT", None, 1, error)]
 
     # compute empirical competitive ratios for each set of solutions, using numpy
     # convert optimal sols to numpy array
@@ -99,34 +79,23 @@ def experimentLA(error):
  
 
 if __name__ == "__main__":
+    import plots
+
+    # --load plots the results of an earlier run (from results/) without recomputing anything
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load", action="store_true")
+    args = parser.parse_args()
+
     # for each prediction error value (refer to experiments section in the paper), load data and run experiments
+    runner = None if args.load else grid.GridRunner()
     for i, error in enumerate([0, (0.5), (1)]):
-        ZCLRatios, ECTRatios, LAECT1Ratios, LAECT2Ratios, LAECT3Ratios = experimentLA(error=error)
-
-        # set plot size to (4, 3) and dpi = 500
-        plt.figure(figsize=(4, 3), dpi=500)
+        ZCLRatios, ECTRatios, LAECT1Ratios, LAECT2Ratios, LAECT3Ratios = experimentLA(error=error, runner=runner, loadOnly=args.load)
 
         linestyles = ['-', ':', '--', '--', '--', '--', '--']
 
-        # CDF plot for competitive ratio (across all experiments)
-        legend = ["ZCL", "ECT[α = 0.5]", "LA-ECT[γ = 0.33]", "LA-ECT[γ = 0.66]", "LA-ECT[γ = 1]"]
-        for j, (dat,ls) in enumerate(zip([ZCLRatios, ECTRatios, LAECT1Ratios, LAECT2Ratios, LAECT3Ratios], linestyles)):
-            if j < 4:
-                sns.ecdfplot(data = dat, linestyle = ls) # plots empirical CDF
-            else:
-                sns.ecdfplot(data = dat, linestyle = ls, color="C5") # plots empirical CDF (skips a bad color)
-
-        # set labels and limits
-        plt.ylabel('empirical CDF')
-        plt.xlabel("empirical competitive ratio")
-        plt.xlim(0.9, 12)
-
-        # [ this can be skipped if you don't need a legend ]
-        # change legend to be located outside the plot (bottom center)
-        # plt.legend(legend, ncol=5, loc='lower center', bbox_to_anchor=(0.5, -0.3))
-
-        # save plot to file
-        plt.tight_layout()
-        plt.savefig("error{}.png".format(i))
-        plt.clf()
-
+        # CDF plot for competitive ratio (across all experiments); the last curve skips a bad color
+        # legend: ["ZCL", "ECT[α = 0.5]", "LA-ECT[γ = 0.33]", "LA-ECT[γ = 0.66]", "LA-ECT[γ = 1]"]
+        plots.ratioCDF([ZCLRatios, ECTRatios, LAECT1Ratios, LAECT2Ratios, LAECT3Ratios], linestyles,
+                       "error{}.png".format(i), colors=[None, None, None, None, "C5"], plotStyle='seaborn-colorblind')
+    if runner is not None:
+        runner.close()
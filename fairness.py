@@ -0,0 +1,158 @@
+# Time Fairness in Online Knapsack Problems
+# Time-Fairness Analytics (admission probability against arrival position and value density, over the shuffles)
+#
+# every base trace is stored with many shuffles (see trace_store.py), so each item arrives at many positions.
+# mapping the packed items of each shuffle back to the base trace through its permutation gives, for every item,
+# its probability of admission over random arrival orders, and for every (arrival position, density) bin the
+# admission rate.  a time-fair algorithm admits items of the same density with the same probability whatever
+# their arrival time.  results are summed as tasks finish, so only the packed masks of one task are ever in memory
+
+import argparse
+import functools
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+import numpy as np
+import grid
+import trace_store
+import instrument
+
+# number of bins of the relative arrival position (position / trace length) and of the value density
+POSITION_BINS = 10
+DENSITY_BINS = 10
+
+# algorithms and parameters compared by default (see grid.expandGrid)
+ALGORITHMS = {
+    "ZCL": {},
+    "ZCLRandomized": {},
+    "baseline": {"alpha": [0.66]},
+    "ECT": {"alpha": [0.33, 0.66, 1]},
+    "LAECT": {"gamma": [0.33, 0.66, 1]},
+}
+
+# for each grid cell (in the order of cells):
+#   admitted, offered    -- (positions x densities) counts of admitted and offered items
+#   itemProbability      -- admission probability of every base item over the shuffles (flat, in store order)
+#   positionProfile      -- admission rate in each position bin
+#   disparity            -- mean over density bins (weighted by items) of the largest difference in admission
+#                           rate between two position bins; 0 for a perfectly time-fair algorithm
+#   spread               -- same, with the standard deviation of the admission rate across position bins
+# itemDensity holds the value density of every base item, and densityEdges the (log-spaced) density bins
+Fairness = namedtuple("Fairness", ["cells", "densityEdges", "itemDensity", "admitted", "offered", "itemProbability",
+                                   "positionProfile", "disparity", "spread"])
+
+# lower/upper bound on value size ratio -- L, U
+# log-spaced density bin edges over [L, U]
+def densityEdges(L, U, bins=DENSITY_BINS):
+    return np.geomspace(L, U, bins + 1)
+
+# (position bin, density bin) of every item of the gathered traces, as one flat bin index
+def itemBins(store, density, offsets, positionBins=POSITION_BINS, densityBins=DENSITY_BINS):
+    lengths = np.diff(offsets)
+    position = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+    positionBin = position * positionBins // np.repeat(lengths, lengths)
+    densityBin = np.clip((np.log(density / store.L) / np.log(store.U / store.L) * densityBins).astype(np.int64),
+                         0, densityBins - 1)
+    return positionBin * densityBins + densityBin
+
+# simulates one cell on every shuffle of a group of base traces, and returns the number of admissions of each of
+# their base items and the admitted/offered counts per (position, density) bin
+def runFairnessTask(task):
+    cellIndex, cell, bases, rowArgs = task
+    store = grid.workerStore(cell.theta)
+    shuffles = store.traces.shuffles
+    rows = (bases[:, None] * shuffles + np.arange(shuffles)[None, :]).reshape(-1)
+    packed = grid.simulateCell(cell, store, rows, rowArgs, grid.workerW)[2]
+
+    # flat position (in the base arrays) of every simulated item, in arrival order
+    index, offsets = store.traces.gatherIndex(rows)
+    vals = np.asarray(store.traces.baseValues[index])
+    weights = np.asarray(store.traces.baseWeights[index])
+    bins = itemBins(store, vals / weights, offsets)
+
+    # the base traces of a task are consecutive, so their items are one range of the base arrays
+    lo = int(store.traces.baseOffsets[bases[0]])
+    hi = int(store.traces.baseOffsets[bases[-1] + 1])
+    itemAdmissions = np.bincount(index[packed] - lo, minlength=hi - lo)
+    admitted = np.bincount(bins[packed], minlength=POSITION_BINS * DENSITY_BINS)
+    offered = np.bincount(bins, minlength=POSITION_BINS * DENSITY_BINS)
+    return cellIndex, lo, itemAdmissions, admitted, offered
+
+# (positions x densities) admitted and offered counts -- admitted, offered
+# returns the disparity and spread of the admission rate across position bins (see Fairness)
+def fairnessScores(admitted, offered):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = np.where(offered > 0, admitted / offered, np.nan)
+    items = offered.sum(axis=0)
+    seen = np.flatnonzero(np.all(offered > 0, axis=0))  # density bins offered at every position
+    if len(seen) == 0:
+        return np.nan, np.nan
+    weights = items[seen] / items[seen].sum()
+    gap = np.max(rate[:, seen], axis=0) - np.min(rate[:, seen], axis=0)
+    return float(np.dot(weights, gap)), float(np.dot(weights, np.std(rate[:, seen], axis=0)))
+
+# value of theta (see load_traces.py)                    -- theta
+# algorithms and parameters (see grid.expandGrid)        -- algorithms
+# prediction errors for LAECT                            -- errors
+# seed for predictions and ZCLRandomized (see grid.py)   -- seed
+# number of worker processes (default: one per core)     -- processes
+# number of base traces per task (times the shuffles)    -- chunkSize
+# the admission counts of every base item are held densely, as one float64 per (cell, base item): 8 bytes x cells
+# x base items, which is the size of the returned itemProbability itself (e.g. 11 cells of 10^7 items take 880 MB).
+# every other buffer only grows with the items of one task
+def fairnessStudy(theta=10, algorithms=ALGORITHMS, errors=(0,), seed=0, processes=None, W=1, chunkSize=4):
+    import load_traces
+    load_traces.loadDataAndOPT(theta=theta)  # load the data set once, the workers share its columnar store
+    store = trace_store.openStore(trace_store.storePath(theta))
+    shuffles = store.traces.shuffles
+    bases = len(store.traces.baseOffsets) - 1
+    items = int(store.traces.baseOffsets[-1])
+    cells = grid.expandGrid({"theta": [theta], "error": list(errors), "algorithms": algorithms})
+
+    tasks = []
+    for i, cell in enumerate(cells):
+        rowArgs = grid.cellRowArgs(cell, store, seed)
+        for start in range(0, bases, chunkSize):
+            group = np.arange(start, min(start + chunkSize, bases))
+            rows = (group[:, None] * shuffles + np.arange(shuffles)[None, :]).reshape(-1)
+            tasks.append((i, cell, group, None if rowArgs is None else rowArgs[rows]))
+
+    itemAdmissions = np.zeros((len(cells), items))
+    admitted = np.zeros((len(cells), POSITION_BINS, DENSITY_BINS))
+    offered = np.zeros((len(cells), POSITION_BINS, DENSITY_BINS))
+    with Pool(processes or os.cpu_count(), initializer=grid.initWorker, initargs=(W, instrument.ENABLED)) as p:
+        finished = p.imap_unordered(functools.partial(instrument.collect, runFairnessTask), tasks)
+        for done, ((i, lo, counts, a, o), profile) in enumerate(finished, 1):
+            instrument.merge(profile)
+            itemAdmissions[i, lo:lo + len(counts)] += counts
+            admitted[i] += a.reshape(POSITION_BINS, DENSITY_BINS)
+            offered[i] += o.reshape(POSITION_BINS, DENSITY_BINS)
+            print("\rfairness: {}/{} tasks".format(done, len(tasks)), end="", flush=True)
+    print()
+
+    with np.errstate(invalid="ignore"):
+        positionProfile = admitted.sum(axis=2) / offered.sum(axis=2)
+    scores = np.array([fairnessScores(a, o) for a, o in zip(admitted, offered)]).reshape(len(cells), 2)
+    itemDensity = np.asarray(store.traces.baseValues) / np.asarray(store.traces.baseWeights)
+    return Fairness(cells, densityEdges(store.L, store.U), itemDensity, admitted, offered, itemAdmissions / shuffles,
+                    positionProfile, scores[:, 0], scores[:, 1])
+
+if __name__ == "__main__":
+    # prints the time-fairness scores of each algorithm, and its admission rate from the first to the last
+    # tenth of the arrivals
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theta", type=int, default=10)
+    parser.add_argument("--errors", type=float, nargs="+", default=[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    result = fairnessStudy(args.theta, errors=args.errors, seed=args.seed, processes=args.processes)
+    print("{:>14} {:>6} {:>6} {:>6} {:>10} {:>8}   admission rate by arrival position".format(
+        "algorithm", "alpha", "gamma", "error", "disparity", "spread"))
+    for i, cell in enumerate(result.cells):
+        print("{:>14} {:>6} {:>6} {:>6} {:10.4f} {:8.4f}   {}".format(
+            cell.algorithm, *("-" if x is None else x for x in (cell.alpha, cell.gamma, cell.error)),
+            result.disparity[i], result.spread[i], " ".join("{:.3f}".format(x) for x in result.positionProfile[i])))
+    if instrument.ENABLED:
+        instrument.report()
@@ -0,0 +1,225 @@
+# Time Fairness in Online Knapsack Problems
+# Experiment Grid Runner (algorithms x parameters x data sets x prediction errors on one persistent worker pool)
+
+import os
+import pickle
+import time
+import functools
+import numpy as np
+from collections import namedtuple
+from multiprocessing import Pool
+import batch
+import trace_store
+import result_store
+import instrument
+
+# number of tasks per worker for each grid cell, so that workers stay busy when tasks take uneven time
+TASKS_PER_WORKER = 4
+
+# one point of the grid.  parameters that do not apply to the algorithm are None (error only applies to LAECT)
+Cell = namedtuple("Cell", ["theta", "algorithm", "alpha", "gamma", "error"])
+
+# declarative grid, e.g.
+#   {"theta": [10, 50, 250],
+#    "error": [0, 0.5, 1],
+#    "algorithms": {"ZCL": {}, "ECT": {"alpha": [0.33, 0.66, 1]}, "LAECT": {"gamma": [0.33, 0.66, 1]}}}
+# returns the list of cells, in a fixed order
+def expandGrid(spec):
+    cells = []
+    for theta in spec["theta"]:
+        for algorithm, params in spec["algorithms"].items():
+            for alpha in params.get("alpha", [None]):
+                for gamma in params.get("gamma", [None]):
+                    errors = spec.get("error", [0]) if algorithm == "LAECT" else [None]
+                    for error in errors:
+                        cells.append(Cell(theta, algorithm, alpha, gamma, error))
+    return cells
+
+# d^star of each trace         -- bestDens
+# multiplicative error         -- error
+# seed for the noise           -- seed
+# adds gaussian (mean 0) noise to the predictions, with stddev = error.  the noise stream is keyed on
+# (seed, error level), using the bits of the error itself so the stream does not depend on which other levels
+# are in the grid: different error levels get independent noise, while every gamma at one error level sees the
+# same noise (common random numbers, so LA-ECT variants are compared on identical predictions)
+def noisyPredictions(bestDens, error, seed=0):
+    errorKey = int(np.float64(error).view(np.uint64))
+    rng = np.random.default_rng(np.random.SeedSequence([seed, errorKey]))
+    return np.asarray(bestDens, dtype=float) * np.abs(1 + rng.normal(0, error, len(bestDens)))
+
+# number of items in each trace, sorted by decreasing length  -- lengths
+# target number of items per task                            -- taskItems
+# returns the boundaries of consecutive groups of (sorted) traces with about taskItems items each
+def taskBoundaries(lengths, taskItems):
+    if len(lengths) == 0:
+        return np.zeros(1, dtype=np.int64)
+    cumulative = np.cumsum(lengths)
+    cuts = np.searchsorted(cumulative, np.arange(taskItems, cumulative[-1], taskItems), side="right")
+    return np.unique(np.concatenate(([0], cuts, [len(lengths)])))
+
+# stores opened by this worker, by theta.  stores are memory-mapped, so all workers share their pages
+workerStores = {}
+workerW = None
+
+# knapsack of capacity W                           -- W
+# collect timers and counters (see instrument.py)  -- profile
+def initWorker(W, profile=False):
+    global workerW
+    workerW = W
+    workerStores.clear()
+    instrument.enable(profile)
+
+# opens a store once per worker, and again only if it was rebuilt since (see load_traces.loadDataAndOPT)
+def workerStore(theta):
+    path = trace_store.storePath(theta)
+    version = os.stat(os.path.join(path, "meta.json")).st_mtime_ns
+    if theta not in workerStores or workerStores[theta][0] != version:
+        workerStores[theta] = (version, trace_store.openStore(path))
+    return workerStores[theta][1]
+
+# per-trace inputs of a cell for every trace of its store (z for ZCLRandomized, predictions for LAECT, or None),
+# drawn in the main process so that results do not depend on the number of tasks
+def cellRowArgs(cell, store, seed):
+    if cell.algorithm == "LAECT":
+        return noisyPredictions(store.bestDensities, cell.error, seed)
+    if cell.algorithm == "ZCLRandomized":
+        return np.random.default_rng(np.random.SeedSequence([seed, cell.theta])).uniform(0, 1, len(store))
+    return None
+
+# simulates the algorithm of a cell on a group of traces of a store, with the per-trace inputs of those traces.
+# returns the result of the batch algorithm (final profits, final utilization, and the flat packed mask)
+def simulateCell(cell, store, rows, rowArgs, W):
+    vals, offsets = store.traceValues().gather(rows)
+    weights, _ = store.traceWeights().gather(rows)
+    if cell.algorithm == "ZCLRandomized":
+        args, kwargs = (), {"z": rowArgs}
+    elif cell.algorithm == "LAECT":
+        args, kwargs = (rowArgs, cell.gamma), {}
+    elif cell.algorithm in ("baseline", "ECT"):
+        args, kwargs = (cell.alpha,), {}
+    else:
+        args, kwargs = (), {}
+    return batch.BATCH_ALGORITHMS[cell.algorithm](W, weights, vals, offsets, store.L, store.U, *args, **kwargs)
+
+# simulates one algorithm on a group of traces of one store
+def runTask(task):
+    cellIndex, cell, rows, rowArgs = task
+    profits = simulateCell(cell, workerStore(cell.theta), rows, rowArgs, workerW)[0]
+    return cellIndex, rows, profits
+
+# a pool of worker processes that lives across grid runs.  workers open the columnar stores once, and
+# every (algorithm, group of traces) task only carries trace indices
+class GridRunner:
+    # number of worker processes (default: one per core) -- processes
+    # knapsack of capacity W                             -- W
+    def __init__(self, processes=None, W=1):
+        self.processes = processes or os.cpu_count()
+        self.W = W
+        self.pool = Pool(self.processes, initializer=initWorker, initargs=(W, instrument.ENABLED))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    # tasks for every cell, with traces sorted by length so each task has few lockstep steps
+    def tasks(self, cells, stores, seed):
+        tasks = []
+        for i, cell in enumerate(cells):
+            store = stores[cell.theta]
+            lengths = store.traces.lengths()
+            order = np.argsort(-lengths, kind="stable")
+            taskItems = max(int(lengths.sum()) // (self.processes * TASKS_PER_WORKER), 1)
+            bounds = taskBoundaries(lengths[order], taskItems)
+            rowArgs = cellRowArgs(cell, store, seed)
+            for j in range(len(bounds) - 1):
+                rows = order[bounds[j]:bounds[j+1]]
+                tasks.append((i, cell, rows, None if rowArgs is None else rowArgs[rows]))
+        return tasks
+
+    # declarative grid (see expandGrid)            -- spec
+    # seed for predictions and ZCLRandomized       -- seed
+    # reuse finished cells from the result store   -- resume
+    # every cell is saved to the result store (see result_store.py) as soon as its last task finishes, so an
+    # interrupted sweep resumes where it stopped.  with instrumentation enabled (see instrument.py), the timers
+    # and counters of the run (including those of the workers) are saved next to the results
+    # returns a dict from each cell to the final profit of each trace (in store order)
+    def run(self, spec, seed=0, resume=True):
+        import load_traces
+        instrument.reset()
+        start = instrument.clock()
+        cells = expandGrid(spec)
+        stores = {}
+        datasets = {}
+        for theta in spec["theta"]:
+            load_traces.loadDataAndOPT(theta=theta)  # make sure the stores exist before the workers open them
+            stores[theta] = trace_store.openStore(trace_store.storePath(theta))
+            datasets[theta] = result_store.datasetVersion(trace_store.storePath(theta))
+
+        version = result_store.codeVersion()
+        keys = {cell: result_store.cellKey(cell, seed, self.W, datasets[cell.theta], version) for cell in cells}
+        results = {}
+        for cell, key in keys.items():
+            stored = result_store.loadCell(key) if resume else None
+            if stored is not None:
+                results[cell] = stored
+                instrument.count("resultCacheHits")
+        pending = [cell for cell in cells if cell not in results]
+        print("{} of {} cells already finished".format(len(cells) - len(pending), len(cells)))
+
+        tasks = self.tasks(pending, stores, seed)
+        if instrument.ENABLED:
+            instrument.count("tasks", len(tasks))
+            instrument.count("taskBytes", sum(len(pickle.dumps(task)) for task in tasks))
+        remaining = np.bincount(np.array([task[0] for task in tasks], dtype=np.int64), minlength=len(pending))
+        for cell in pending:
+            results[cell] = np.empty(len(stores[cell.theta]))
+        # cells of an empty store have no tasks, and are finished already
+        for i in np.flatnonzero(remaining == 0):
+            result_store.saveCell(keys[pending[i]], pending[i], seed, results[pending[i]],
+                                  stores[pending[i].theta].optimalSols)
+        finished = self.pool.imap_unordered(functools.partial(instrument.collect, runTask), tasks)
+        for done, ((i, rows, profits), profile) in enumerate(finished, 1):
+            instrument.merge(profile)
+            cell = pending[i]
+            results[cell][rows] = profits
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                result_store.saveCell(keys[cell], cell, seed, results[cell], stores[cell.theta].optimalSols)
+            print("\rgrid: {}/{} tasks".format(done, len(tasks)), end="", flush=True)
+        if len(tasks) > 0:
+            print()
+
+        # wall-clock time of the run; compared with the summed task time of the workers, it shows what
+        # scheduling, pickling, and result handling cost
+        instrument.record("run", start)
+        if instrument.ENABLED:
+            instrument.dump(os.path.join(result_store.RESULTS_DIR, "profile-{}.json".format(time.strftime("%Y%m%d-%H%M%S"))))
+        return results
+
+# declarative grid (see expandGrid)          -- spec
+# seed for predictions and ZCLRandomized     -- seed
+# knapsack of capacity W                     -- W
+# returns the stored profits of every cell of a grid that was already run with the current code and data sets,
+# in the same form as GridRunner.run, without starting workers or simulating anything (the stores must exist).
+# raises KeyError for the first cell that has no stored results
+def loadGrid(spec, seed=0, W=1):
+    version = result_store.codeVersion()
+    datasets = {theta: result_store.datasetVersion(trace_store.storePath(theta)) for theta in spec["theta"]}
+    results = {}
+    for cell in expandGrid(spec):
+        profits = result_store.loadCell(result_store.cellKey(cell, seed, W, datasets[cell.theta], version))
+        if profits is None:
+            raise KeyError("no stored results for {}; run the grid first".format(cell))
+        results[cell] = profits
+    return results
+
+# runs a grid on a temporary pool (see GridRunner.run)
+def runGrid(spec, seed=0, processes=None, W=1, resume=True):
+    with GridRunner(processes, W) as runner:
+        return runner.run(spec, seed, resume)
@@ -0,0 +1,123 @@
+# Time Fairness in Online Knapsack Problems
+# Instrumentation (optional per-phase timers and counters for the algorithms and the experiment runners)
+#
+# disabled by default; enable with instrument.enable() or by setting KNAPSACK_PROFILE=1.  when disabled, every
+# hook is a single check of ENABLED per algorithm call (or per lockstep step), and nothing is timed or counted
+
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+ENABLED = os.environ.get("KNAPSACK_PROFILE", "") not in ("", "0")
+
+# accumulated seconds per phase, and counts per event (items, admissions, threshold evaluations, cache hits, ...)
+timers = defaultdict(float)
+counters = defaultdict(int)
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+def count(name, n=1):
+    if ENABLED:
+        counters[name] += n
+
+# times the enclosed block under the given phase name (only use this outside per-item loops)
+@contextmanager
+def phase(name):
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timers[name] += time.perf_counter() - start
+
+# start time for record (None when disabled)
+def clock():
+    return time.perf_counter() if ENABLED else None
+
+# adds the time since start to the named phase, and counts the items offered and admitted
+def record(name, start, items=0, admissions=0):
+    if start is None:
+        return
+    timers[name] += time.perf_counter() - start
+    counters["items"] += items
+    counters["admissions"] += admissions
+
+# a threshold function (or threshold object) that times and counts its evaluations.  algorithms only wrap
+# their threshold in this when instrumentation is enabled
+class TimedThreshold:
+    def __init__(self, threshold, name="threshold"):
+        self.threshold = threshold
+        self.name = name
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        result = self.threshold(*args)
+        timers[self.name] += time.perf_counter() - start
+        counters[self.name + "Evaluations"] += 1
+        return result
+
+    def vector(self, z, *args):
+        start = time.perf_counter()
+        result = self.threshold.vector(z, *args)
+        timers[self.name + "Vector"] += time.perf_counter() - start
+        counters[self.name + "Evaluations"] += np.size(z)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.threshold, name)
+
+# snapshot of the timers and counters
+def summary():
+    return {"timers": dict(timers), "counters": dict(counters)}
+
+# adds a summary (e.g. from a worker process) to the timers and counters of this process
+def merge(profile):
+    if profile is None:
+        return
+    for name, seconds in profile["timers"].items():
+        timers[name] += seconds
+    for name, n in profile["counters"].items():
+        counters[name] += n
+
+# runs fn(task), and returns its result together with the profile of this call (None when disabled).
+# use as functools.partial(instrument.collect, fn) with a Pool, then merge the profiles in the main process.
+# the timers and counters from before the call are restored afterwards, so it is also safe to call in-process
+def collect(fn, task):
+    if not ENABLED:
+        return fn(task), None
+    saved = summary()
+    reset()
+    try:
+        with phase("task"):
+            result = fn(task)
+        profile = summary()
+    finally:
+        reset()
+        merge(saved)
+    return result, profile
+
+# writes the summary to a JSON file
+def dump(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode = 0o777, exist_ok = True)
+    with open(path, "w") as f:
+        json.dump(summary(), f, indent=2, sort_keys=True)
+
+# prints the summary, slowest phases first
+def report():
+    for name, seconds in sorted(timers.items(), key=lambda x: -x[1]):
+        print("{:>32}: {:10.4f} s".format(name, seconds))
+    for name, n in sorted(counters.items()):
+        print("{:>32}: {:10d}".format(name, n))
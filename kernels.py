@@ -0,0 +1,252 @@
+# Time Fairness in Online Knapsack Problems
+# Compiled Kernels (optional Numba backend for the per-trace admission loop, the DP, and the d* search)
+#
+# select with the backend argument of the algorithms in knapsack.py (and of knapsack.dpOptimalKnapsack and
+# opt.bestConstantThreshold), or for every call by setting KNAPSACK_BACKEND=numba.  Numba is only imported
+# (and the kernels compiled) on first use; when it is not installed, every call falls back to the Python code
+# (with a warning, once per process).
+# results are identical to the Python backend: the kernels use the same floating point operations, and hand
+# any item whose density is within TIE_TOLERANCE of the threshold back to the scalar threshold object
+
+import argparse
+import os
+import warnings
+import numpy as np
+
+BACKENDS = ("python", "numba")
+BACKEND = os.environ.get("KNAPSACK_BACKEND", "python")
+
+# relative distance between a density and the kernel's threshold below which the item is decided by the
+# scalar threshold object instead (the same tolerance as batch.py)
+TIE_TOLERANCE = 1e-12
+
+# kinds of threshold understood by admitKernel (see ThresholdFunction.kernelParams in knapsack.py)
+CONSTANT = 0    # params: value
+PHI = 1         # params: base, Le
+ALPHA_PHI = 2   # params: base, Le, alpha, ell, L
+ALPHA_FAIR = 3  # params: L, U, alpha, betaReal
+ALPHA_LA = 4    # params: base, Le, gamma, hat_d
+
+# compiled kernels by name, False if Numba is not installed, None before the first use
+compiled = None
+
+# knapsack of capacity W                                -- W
+# weights and values of the items (float arrays)        -- weights, vals
+# first item to decide, and the state before it         -- start, remainingW, value
+# kind of threshold and its constants                   -- kind, params
+# outputs: admitted items, profit and utilization        -- packed, profit, utilization
+# runs the admission rule of knapsack.ZCL from item start on, and returns (i, remainingW, value), where i is
+# the first item whose density is too close to the threshold to decide here (or the number of items if none)
+def admitKernel(W, weights, vals, start, remainingW, value, kind, params, tolerance, packed, profit, utilization):
+    for i in range(start, len(weights)):
+        z_j = (W - remainingW) / W  # how much of knapsack is occupied
+        if kind == CONSTANT:
+            phi_j = params[0]
+        elif kind == PHI:
+            phi_j = (params[0]**z_j)*params[1]
+        elif kind == ALPHA_PHI:
+            if z_j < params[2]:
+                phi_j = params[4]
+            else:
+                phi_j = (params[0]**((z_j-params[3])/(1-params[3])))*params[1]
+        elif kind == ALPHA_FAIR:
+            if z_j < params[2]:
+                phi_j = params[0]
+            else:
+                phi_j = params[1]*np.exp(params[3]*(z_j-1))
+        else:
+            gamma = params[2]
+            hat_d = params[3]
+            phi_j = (params[0]**(z_j/(1-gamma)))*params[1]
+            if phi_j >= hat_d:
+                phi_j = max((params[0]**((z_j-gamma)/(1-gamma)))*params[1], hat_d)
+
+        density = vals[i]/weights[i]
+        if abs(density - phi_j) <= tolerance*phi_j:
+            return i, remainingW, value
+        if density >= phi_j and (remainingW - weights[i]) > 0:
+            packed[i] = True
+            value += vals[i]
+            remainingW -= weights[i]
+        utilization[i] = W - remainingW
+        profit[i] = value
+    return len(weights), remainingW, value
+
+# same as knapsack.dpTable, one capacity at a time (from the top, so dp[c-w] still holds the previous row)
+def dpTableKernel(W, weights, vals, dp, choice):
+    for i in range(len(weights)):
+        w = weights[i]
+        if w > W:
+            continue
+        for c in range(W, w - 1, -1):
+            candidate = dp[c - w] + vals[i]
+            if candidate > dp[c]:
+                dp[c] = candidate
+                choice[i, c >> 3] |= np.uint8(1 << (7 - (c & 7)))
+
+# same as knapsack.dpRow
+def dpRowKernel(W, weights, vals, dp):
+    for i in range(len(weights)):
+        w = weights[i]
+        if w > W:
+            continue
+        for c in range(W, w - 1, -1):
+            candidate = dp[c - w] + vals[i]
+            if candidate > dp[c]:
+                dp[c] = candidate
+
+# same as the item loop of opt.constantThresholdProfits
+def bestThresholdKernel(weights, vals, cutoff, remainingW, profit):
+    for i in range(len(weights)):
+        for c in range(cutoff[i]):
+            if remainingW[c] > weights[i]:
+                remainingW[c] -= weights[i]
+                profit[c] += vals[i]
+
+KERNELS = {
+    "admit": admitKernel,
+    "dpTable": dpTableKernel,
+    "dpRow": dpRowKernel,
+    "bestThreshold": bestThresholdKernel,
+}
+
+# compiles the kernels on first use; returns them by name, or False if Numba is not installed
+def compiledKernels():
+    global compiled
+    if compiled is None:
+        try:
+            import numba
+        except ImportError:
+            # warned once per process, since compiled is only None until the first call
+            warnings.warn("numba is not installed, using the python backend", RuntimeWarning, stacklevel=3)
+            compiled = False
+        else:
+            compiled = {name: numba.njit(cache=True)(fn) for name, fn in KERNELS.items()}
+    return compiled
+
+# name of a backend, or None for the default (KNAPSACK_BACKEND) -- backend
+# whether to run the compiled kernels
+def useCompiled(backend=None):
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError("unknown backend {}; expected one of {}".format(backend, ", ".join(BACKENDS)))
+    return backend == "numba" and bool(compiledKernels())
+
+# knapsack of capacity W                        -- W
+# list of weights for each item                 -- weights
+# list of values for each item                  -- vals
+# number of items                               -- n
+# threshold object (see knapsack.py)            -- threshold
+# parameters of the threshold (e.g. hat_d)      -- params
+# compiled counterpart of the loop in knapsack.ZCL/baseline/ECT/LAECT, with the same return value.  returns
+# None if the threshold has no compiled form (e.g. a tabulated threshold), so the caller runs its own loop
+def admit(W, weights, vals, n, threshold, params=()):
+    kernelParams = threshold.kernelParams(*params)
+    if kernelParams is None:
+        return None
+    kind, constants = kernelParams
+    constants = np.asarray(constants, dtype=float)
+    weights = np.asarray(weights[:n], dtype=float)
+    vals = np.asarray(vals[:n], dtype=float)
+    packed = np.zeros(n, dtype=bool)
+    profit = np.zeros(n)
+    utilization = np.zeros(n)
+
+    kernel = compiledKernels()["admit"]
+    i, remainingW, value = 0, float(W), 0.0
+    while True:
+        i, remainingW, value = kernel(W, weights, vals, i, remainingW, value, kind, constants, TIE_TOLERANCE,
+                                      packed, profit, utilization)
+        if i >= n:
+            break
+        # near tie: decide this item with the scalar threshold, exactly as the Python loop does
+        phi_j = threshold((W - remainingW) / W, *params)
+        if (vals[i]/weights[i]) >= phi_j and (remainingW - weights[i]) > 0:
+            packed[i] = True
+            value += vals[i]
+            remainingW -= weights[i]
+        utilization[i] = W - remainingW
+        profit[i] = value
+        i += 1
+    return profit.tolist(), utilization.tolist(), set(np.flatnonzero(packed).tolist())
+
+# compiled counterparts of knapsack.dpTable and knapsack.dpRow
+def dpTable(W, weights, vals):
+    dp = np.zeros(W + 1)
+    choice = np.zeros((len(weights), (W + 8) // 8), dtype=np.uint8)
+    compiledKernels()["dpTable"](W, weights, vals, dp, choice)
+    return dp, choice
+
+def dpRow(W, weights, vals):
+    dp = np.zeros(W + 1)
+    compiledKernels()["dpRow"](W, weights, vals, dp)
+    return dp
+
+# compiled counterpart of the item loop of opt.constantThresholdProfits; updates remainingW and profit in place
+def bestThreshold(weights, vals, cutoff, remainingW, profit):
+    compiledKernels()["bestThreshold"](weights, vals, cutoff, remainingW, profit)
+
+# value of theta (see load_traces.py)            -- theta
+# number of traces to compare (default: all)     -- traces
+# runs every algorithm, the DP, and the d* search with both backends on the data-cloud traces, and returns
+# the number of mismatches (profits, utilizations, and packed sets must be identical)
+def parityCheck(theta=10, traces=None, dpScale=100):
+    import random
+    import knapsack as k
+    import opt
+    import load_traces
+    if not compiledKernels():
+        print("numba is not installed, nothing to compare")
+        return 0
+
+    traceValues, traceWeights, L, U = load_traces.loadBaseTraces(theta=theta)
+    traceValues, traceWeights = traceValues[:traces], traceWeights[:traces]
+    algorithms = {
+        "ZCL": lambda tValue, tWeight, backend: k.ZCL(1, tWeight, tValue, len(tValue), L, U, backend=backend),
+        "baseline": lambda tValue, tWeight, backend: k.baseline(1, tWeight, tValue, len(tValue), L, U, 0.5,
+                                                                backend=backend),
+        "ECT": lambda tValue, tWeight, backend: k.ECT(1, tWeight, tValue, len(tValue), L, U, 0.5, backend=backend),
+        "LAECT": lambda tValue, tWeight, backend: k.LAECT(1, tWeight, tValue, len(tValue), L, U,
+                                                          np.sqrt(L * U), 0.5, backend=backend),
+    }
+    mismatches = 0
+    for i, (tValue, tWeight) in enumerate(zip(traceValues, traceWeights)):
+        for name, run in algorithms.items():
+            if run(tValue, tWeight, "python") != run(tValue, tWeight, "numba"):
+                print("trace {}: {} differs".format(i, name))
+                mismatches += 1
+
+        # both backends draw the same random threshold from the same seed
+        results = []
+        for backend in BACKENDS:
+            random.seed(i)
+            results.append(k.ZCLRandomized(1, tWeight, tValue, len(tValue), L, U, backend=backend))
+        if results[0] != results[1]:
+            print("trace {}: ZCLRandomized differs".format(i))
+            mismatches += 1
+
+        weightsP = np.rint(np.asarray(tWeight) * dpScale).astype(np.int64).tolist()
+        for memoryBounded in (False, True):
+            results = [k.dpOptimalKnapsack(dpScale, weightsP, tValue, len(tValue), memoryBounded, backend=backend)
+                       for backend in BACKENDS]
+            if results[0] != results[1]:
+                print("trace {}: dpOptimalKnapsack (memoryBounded={}) differs".format(i, memoryBounded))
+                mismatches += 1
+
+        results = [opt.bestConstantThreshold(1, tWeight, tValue, len(tValue), backend=backend)
+                   for backend in BACKENDS]
+        if results[0] != results[1]:
+            print("trace {}: bestConstantThreshold differs".format(i))
+            mismatches += 1
+        print("\rparity: {}/{} traces".format(i + 1, len(traceValues)), end="", flush=True)
+    print()
+    print("{} mismatches".format(mismatches))
+    return mismatches
+
+if __name__ == "__main__":
+    # compares the numba backend with the python backend on the data-cloud traces
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theta", type=int, default=10)
+    parser.add_argument("--traces", type=int, default=None)
+    args = parser.parse_args()
+    raise SystemExit(1 if parityCheck(args.theta, args.traces) else 0)
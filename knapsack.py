@@ -1,37 +1,97 @@
 # Time Fairness in Online Knapsack Problems
 # Algorithm Implementations
+#
+# depends only on the standard library and NumPy, so admission controllers and worker processes start quickly.
+# scipy is only imported the first time a Lambert-W value is needed (see lambertw), and plotting is in plots.py
 
+import abc
 import numpy as np
 import random
 import math
 from math import e
 from math import log
-import matplotlib.pyplot as plt
-import scipy
-
-# knapsack of capacity W        -- W
-# list of weights for each item -- weights
-# list of values for each item  -- vals
-# number of items               -- n
-def dpOptimalKnapsack(W, weights, vals, n):
-    dp = [0 for i in range(W + 1)]  # Making the dp array
-    packed = set()
+import instrument
+import kernels
 
+# knapsack of capacity W                    -- W
+# list of (integer) weights for each item   -- weights
+# list of values for each item              -- vals
+# number of items                           -- n
+# reconstruct with O(W) memory (optional)   -- memoryBounded
+# "python" or "numba" (see kernels.py)       -- backend
+def dpOptimalKnapsack(W, weights, vals, n, memoryBounded=False, backend=None):
     if W < min(weights):
         return 0, set()
 
-    for i in range(1, n + 1):  # taking first i elements
-        for w in range(W, 0, -1):  # starting from back,so that we also have data of
-            # previous computation when taking i-1 items
-            if weights[i - 1] <= w:
-                if dp[w - weights[i - 1]] + vals[i - 1] > dp[w]:
-                    packed.add(i-1)
-                else:
-                    if (i - 1) in packed:
-                        packed.remove(i-1)
-                dp[w] = max(dp[w], dp[w - weights[i - 1]] + vals[i - 1])
+    weights = np.asarray(weights[:n], dtype=np.int64)
+    vals = np.asarray(vals[:n], dtype=float)
+    row, table = (kernels.dpRow, kernels.dpTable) if kernels.useCompiled(backend) else (dpRow, dpTable)
+
+    if memoryBounded:
+        # divide-and-conquer (Hirschberg-style) reconstruction, which never stores an n x W table
+        packed = set()
+        dpReconstruct(W, weights, vals, np.arange(n), packed, row, table)
+        return row(W, weights, vals)[W], packed
+
+    dp, choice = table(W, weights, vals)
+    return dp[W], dpBacktrack(W, weights, choice, np.arange(n))  # returning the maximum value of knapsack, plus the packed values
+
+# one 0/1 knapsack DP step per item, as a NumPy shift-and-max over the capacity axis
+# returns the best value for every capacity 0..W
+def dpRow(W, weights, vals):
+    dp = np.zeros(W + 1)
+    for w, v in zip(weights, vals):
+        if w > W:
+            continue
+        np.maximum(dp[w:], dp[:W + 1 - w] + v, out=dp[w:])  # right side is evaluated before dp is updated
+    return dp
+
+# same as dpRow, but also returns a bit-packed (n x W+1) matrix recording which items improve each capacity
+def dpTable(W, weights, vals):
+    dp = np.zeros(W + 1)
+    choice = np.zeros((len(weights), (W + 8) // 8), dtype=np.uint8)
+    take = np.zeros(W + 1, dtype=bool)
+    for i, (w, v) in enumerate(zip(weights, vals)):
+        if w > W:
+            continue
+        candidate = dp[:W + 1 - w] + v
+        take[:w] = False
+        np.greater(candidate, dp[w:], out=take[w:])
+        dp[w:] = np.where(take[w:], candidate, dp[w:])
+        choice[i] = np.packbits(take)
+    return dp, choice
+
+# walks the choice matrix from capacity W back to the first item to recover the packed set
+# original index of each row of the choice matrix -- items
+def dpBacktrack(W, weights, choice, items):
+    packed = set()
+    c = W
+    for i in range(len(items) - 1, -1, -1):
+        if (choice[i, c >> 3] >> (7 - (c & 7))) & 1:
+            packed.add(int(items[i]))
+            c -= int(weights[i])
+    return packed
+
+# largest (items x capacity) subproblem solved directly with a choice matrix in memory-bounded mode
+DP_DIRECT_CELLS = 1 << 24
+
+# recursively splits the items in half, and the capacity at the point where the best value of the first
+# half plus the best value of the second half (with the remaining capacity) is maximal.
+# row and table compute dpRow and dpTable (or their compiled counterparts in kernels.py)
+def dpReconstruct(W, weights, vals, items, packed, row=dpRow, table=dpTable):
+    if len(items) == 0 or W <= 0:
+        return
+    if len(items) == 1 or len(items) * (W + 1) <= DP_DIRECT_CELLS:
+        dp, choice = table(W, weights[items], vals[items])
+        packed.update(dpBacktrack(W, weights[items], choice, items))
+        return
 
-    return dp[W], packed  # returning the maximum value of knapsack, plus the packed values
+    first, second = items[:len(items) // 2], items[len(items) // 2:]
+    f = row(W, weights[first], vals[first])
+    g = row(W, weights[second], vals[second])
+    c = int(np.argmax(f + g[::-1]))  # capacity given to the first half
+    dpReconstruct(c, weights, vals, first, packed, row, table)
+    dpReconstruct(W - c, weights, vals, second, packed, row, table)
 
 # knapsack of capacity W                -- W
 # list of weights for each item         -- weights
@@ -39,17 +99,30 @@ def dpOptimalKnapsack(W, weights, vals, n):
 # number of items                       -- n
 # lower bound on value size ratio       -- L
 # upper bound on value size ratio       -- U
-def ZCL(W, weights, vals, n, L, U):
+# precomputed threshold (optional)      -- threshold
+# "python" or "numba" (see kernels.py)  -- backend
+def ZCL(W, weights, vals, n, L, U, threshold=None, backend=None):
     packed = set()
     value = 0
     remainingW = W
     utilization = []
     profit = []
+    if threshold is None:
+        threshold = PhiThreshold(L, U)
+    if instrument.ENABLED:
+        threshold = instrument.TimedThreshold(threshold)
+    start = instrument.clock()
+
+    if kernels.useCompiled(backend):
+        result = kernels.admit(W, weights, vals, n, threshold)
+        if result is not None:
+            instrument.record("ZCL", start, n, len(result[2]))
+            return result
 
     #''simulate'' the behavior of online algorithm using a for loop
     for i in range(n):
         z_j = (W - remainingW) / W  # how much of knapsack is occupied
-        phi_j = phi(z_j, L, U)
+        phi_j = threshold(z_j)
 
         # add item if value/weight ratio is greater than phi
         if (vals[i]/weights[i]) >= phi_j and (remainingW - weights[i]) > 0 :
@@ -59,6 +132,7 @@ def ZCL(W, weights, vals, n, L, U):
         utilization.append(W - remainingW)
         profit.append(value)
 
+    instrument.record("ZCL", start, n, len(packed))
     return profit, utilization, packed  # returning the value of knapsack, plus the packed values
 
 # knapsack of capacity W                -- W
@@ -67,17 +141,25 @@ def ZCL(W, weights, vals, n, L, U):
 # number of items                       -- n
 # lower bound on value size ratio       -- L
 # upper bound on value size ratio       -- U
-def ZCLRandomized(W, weights, vals, n, L, U):
+# "python" or "numba" (see kernels.py)  -- backend
+def ZCLRandomized(W, weights, vals, n, L, U, backend=None):
     packed = set()
     value = 0
     remainingW = W
     utilization = []
     profit = []
     z_j = random.uniform(0, 1)  # generate threshold from phi threshold function
+    threshold = instrument.TimedThreshold(phi) if instrument.ENABLED else phi
+    start = instrument.clock()
+
+    if kernels.useCompiled(backend):
+        result = kernels.admit(W, weights, vals, n, ConstantThreshold(threshold(z_j, L, U)))
+        instrument.record("ZCLRandomized", start, n, len(result[2]))
+        return result
 
     #''simulate'' the behavior of online algorithm using a for loop
     for i in range(n):
-        phi_j = phi(z_j, L, U)
+        phi_j = threshold(z_j, L, U)
 
         # add item if value/weight ratio is greater than phi
         if (vals[i]/weights[i]) >= phi_j and (remainingW - weights[i]) > 0 :
@@ -87,6 +169,7 @@ def ZCLRandomized(W, weights, vals, n, L, U):
         utilization.append(W - remainingW)
         profit.append(value)
 
+    instrument.record("ZCLRandomized", start, n, len(packed))
     return profit, utilization, packed  # returning the value of knapsack, plus the packed values
 
 # knapsack of capacity W                -- W
@@ -96,17 +179,30 @@ def ZCLRandomized(W, weights, vals, n, L, U):
 # lower bound on value size ratio       -- L
 # upper bound on value size ratio       -- U
 # fairness parameter \in [0,1]          -- alpha
-def baseline(W, weights, vals, n, L, U, alpha):
+# precomputed threshold (optional)      -- threshold
+# "python" or "numba" (see kernels.py)  -- backend
+def baseline(W, weights, vals, n, L, U, alpha, threshold=None, backend=None):
     packed = set()
     value = 0
     remainingW = W
     utilization = []
     profit = []
+    if threshold is None:
+        threshold = AlphaPhiThreshold(L, U, alpha)
+    if instrument.ENABLED:
+        threshold = instrument.TimedThreshold(threshold)
+    start = instrument.clock()
+
+    if kernels.useCompiled(backend):
+        result = kernels.admit(W, weights, vals, n, threshold)
+        if result is not None:
+            instrument.record("baseline", start, n, len(result[2]))
+            return result
 
     #''simulate'' the behavior of online algorithm using a for loop
     for i in range(n):
         z_j = (W - remainingW) / W  # how much of knapsack is occupied
-        phi_j = alphaPhi(z_j, L, U, alpha)
+        phi_j = threshold(z_j)
 
         # add item if value/weight ratio is greater than phi
         if (vals[i]/weights[i]) >= phi_j and (remainingW - weights[i]) > 0 :
@@ -116,6 +212,7 @@ def baseline(W, weights, vals, n, L, U, alpha):
         utilization.append(W - remainingW)
         profit.append(value)
 
+    instrument.record("baseline", start, n, len(packed))
     return profit, utilization, packed  # returning the value of knapsack, plus the packed values
 
 # knapsack of capacity W                -- W
@@ -125,17 +222,30 @@ def baseline(W, weights, vals, n, L, U, alpha):
 # lower bound on value size ratio       -- L
 # upper bound on value size ratio       -- U
 # fairness parameter \in [0,1]          -- alpha
-def ECT(W, weights, vals, n, L, U, alpha):
+# precomputed threshold (optional)      -- threshold
+# "python" or "numba" (see kernels.py)  -- backend
+def ECT(W, weights, vals, n, L, U, alpha, threshold=None, backend=None):
     packed = set()
     value = 0
     remainingW = W
     utilization = []
     profit = []
+    if threshold is None:
+        threshold = AlphaFairThreshold(L, U, alpha)
+    if instrument.ENABLED:
+        threshold = instrument.TimedThreshold(threshold)
+    start = instrument.clock()
+
+    if kernels.useCompiled(backend):
+        result = kernels.admit(W, weights, vals, n, threshold)
+        if result is not None:
+            instrument.record("ECT", start, n, len(result[2]))
+            return result
 
     #''simulate'' the behavior of online algorithm using a for loop
     for i in range(n):
         z_j = (W - remainingW) / W  # how much of knapsack is occupied
-        psi_j = alphaFair(z_j, L, U, alpha)
+        psi_j = threshold(z_j)
 
         # add item if value/weight ratio is greater than phi
         if (vals[i]/weights[i]) >= psi_j and (remainingW - weights[i]) > 0 :
@@ -145,6 +255,7 @@ def ECT(W, weights, vals, n, L, U, alpha):
         utilization.append(W - remainingW)
         profit.append(value)
 
+    instrument.record("ECT", start, n, len(packed))
     return profit, utilization, packed  # returning the value of knapsack, plus the packed values
 
 # knapsack of capacity W                -- W
@@ -154,17 +265,30 @@ def ECT(W, weights, vals, n, L, U, alpha):
 # lower bound on value size ratio       -- L
 # upper bound on value size ratio       -- U
 # fairness parameter \in [0,1]          -- alpha
-def LAECT(W, weights, vals, n, L, U, hat_d, gamma):
+# precomputed threshold (optional)      -- threshold
+# "python" or "numba" (see kernels.py)  -- backend
+def LAECT(W, weights, vals, n, L, U, hat_d, gamma, threshold=None, backend=None):
     packed = set()
     value = 0
     remainingW = W
     utilization = []
     profit = []
+    if threshold is None:
+        threshold = AlphaLAThreshold(L, U, gamma)
+    if instrument.ENABLED:
+        threshold = instrument.TimedThreshold(threshold)
+    start = instrument.clock()
+
+    if kernels.useCompiled(backend):
+        result = kernels.admit(W, weights, vals, n, threshold, (hat_d,))
+        if result is not None:
+            instrument.record("LAECT", start, n, len(result[2]))
+            return result
 
     #''simulate'' the behavior of online algorithm using a for loop
     for i in range(n):
         z_j = (W - remainingW) / W  # how much of knapsack is occupied
-        psi_j = alphaLA(z_j, L, U, hat_d, gamma)
+        psi_j = threshold(z_j, hat_d)
 
         # add item if value/weight ratio is greater than phi
         if (vals[i]/weights[i]) >= psi_j and (remainingW - weights[i]) > 0 :
@@ -174,6 +298,7 @@ def LAECT(W, weights, vals, n, L, U, hat_d, gamma):
         utilization.append(W - remainingW)
         profit.append(value)
 
+    instrument.record("LAECT", start, n, len(packed))
     return profit, utilization, packed  # returning the value of knapsack, plus the packed values
 
 # helper function phi for ZCL algos
@@ -188,9 +313,33 @@ def alphaPhi(z, L, U, alpha):
     else:
         return (((U*e)/L)**((z-ell)/(1-ell)))*(L/e)
 
+# principal branch of the Lambert-W function at a real x >= -1/e, as a NumPy complex number (like
+# scipy.special.lambertw, which is used when scipy is installed).  otherwise, Halley's iteration on w * e^w = x
+def lambertw(x):
+    try:
+        from scipy.special import lambertw as scipyLambertw
+    except ImportError:
+        pass
+    else:
+        return scipyLambertw(x, k=0)
+
+    if x < -1/e:
+        raise ValueError("lambertw is only real for x >= -1/e")
+    w = log(1 + x) if x > 0 else 0.0
+    for _ in range(100):
+        ew = math.exp(w)
+        f = w*ew - x
+        if w == -1 or f == 0:
+            break
+        step = f / (ew*(w + 1) - (w + 2)*f/(2*w + 2))
+        w -= step
+        if abs(step) <= 1e-15 * (1 + abs(w)):
+            break
+    return np.complex128(w)
+
 # helper function phi for ECT algo
 def alphaFair(z, L, U, alpha):
-    beta = (scipy.special.lambertw(((U-U*alpha)/(L*alpha)), k=0))/(1-alpha)
+    beta = (lambertw(((U-U*alpha)/(L*alpha))))/(1-alpha)
     if z < alpha:
         return L
     else:
@@ -208,4 +357,229 @@ def alphaLA(z, L, U, hat_d, gamma):
         if exp2 >= hat_d:
             return exp2
         else:
-            return hat_d
\ No newline at end of file
+            return hat_d
+
+# threshold functions with their constants computed once per parameter set, so that a sweep
+# pays for log(U/L), fractional powers, and lambertw once instead of once per item.
+# each object is called as threshold(z, *params) for a scalar utilization z, and threshold.vector(z, *params)
+# evaluates a whole array of utilizations at once.  tabulate(maxError) replaces the exponential part of the
+# threshold with a dense piecewise-linear table over z, accurate to a relative error of maxError.
+class ThresholdFunction(abc.ABC):
+    def __init__(self, L, U):
+        self.L = L
+        self.U = U
+        self.table = None
+
+    # exponential part of the threshold at x (scalar and vectorized)
+    @abc.abstractmethod
+    def curve(self, x):
+        pass
+
+    @abc.abstractmethod
+    def curveVector(self, x):
+        pass
+
+    # domain of x (where it differs from [0, 1], override in subclasses) and growth rate of the exponential
+    # part, both used to size the table
+    def curveDomain(self):
+        return 0.0, 1.0
+
+    @abc.abstractmethod
+    def curveRate(self):
+        pass
+
+    # maximum relative interpolation error of the table -- maxError
+    def tabulate(self, maxError=1e-9):
+        lo, hi = self.curveDomain()
+        # linear interpolation of A*exp(c*x) with spacing h has relative error at most (c*h)^2 / 8
+        h = math.sqrt(8 * maxError) / max(self.curveRate(), 1e-12)
+        grid = np.linspace(lo, hi, max(int(math.ceil((hi - lo) / h)) + 1, 2))
+        self.table = (grid, self.curveVector(grid))
+        return self
+
+    def _curve(self, x):
+        if self.table is not None:
+            return float(np.interp(x, *self.table))
+        return self.curve(x)
+
+    def _curveVector(self, x):
+        if self.table is not None:
+            return np.interp(x, *self.table)
+        return self.curveVector(x)
+
+    # kind and constants of the threshold for kernels.admitKernel, or None if it has no compiled form
+    def kernelParams(self, *params):
+        return None
+
+# threshold of the ZCL algorithm (see phi)
+class PhiThreshold(ThresholdFunction):
+    def __init__(self, L, U):
+        super().__init__(L, U)
+        self.base = (U*e)/L
+        self.Le = L/e
+
+    def curve(self, x):
+        return (self.base**x)*self.Le
+
+    def curveVector(self, x):
+        return np.power(self.base, x)*self.Le
+
+    def curveRate(self):
+        return log(self.base)
+
+    def __call__(self, z):
+        return self._curve(z)
+
+    def vector(self, z):
+        return self._curveVector(z)
+
+    def kernelParams(self):
+        if self.table is not None:
+            return None
+        return kernels.PHI, (self.base, self.Le)
+
+# threshold of the baseline algorithm (see alphaPhi)
+class AlphaPhiThreshold(PhiThreshold):
+    def __init__(self, L, U, alpha):
+        super().__init__(L, U)
+        self.alpha = alpha
+        self.ell = ((alpha * log(U/L)) + alpha - 1) / (log(U/L))
+
+    def curve(self, z):
+        return (self.base**((z-self.ell)/(1-self.ell)))*self.Le
+
+    def curveVector(self, z):
+        return np.power(self.base, (z-self.ell)/(1-self.ell))*self.Le
+
+    def curveDomain(self):
+        return min(self.alpha, 1.0), 1.0
+
+    def curveRate(self):
+        return log(self.base)/(1-self.ell)
+
+    def __call__(self, z):
+        if z < self.alpha:
+            return self.L
+        return self._curve(z)
+
+    def vector(self, z):
+        if self.alpha >= 1:
+            return np.full(np.shape(z), float(self.L))  # z < 1 always holds, so the threshold stays flat
+        return np.where(z < self.alpha, self.L, self._curveVector(np.maximum(z, self.alpha)))
+
+    def kernelParams(self):
+        if self.table is not None:
+            return None
+        return kernels.ALPHA_PHI, (self.base, self.Le, self.alpha, self.ell, self.L)
+
+    def tabulate(self, maxError=1e-9):
+        if self.alpha >= 1:
+            return self  # the threshold is flat, nothing to tabulate
+        return super().tabulate(maxError)
+
+# threshold of the ECT algorithm (see alphaFair)
+class AlphaFairThreshold(ThresholdFunction):
+    def __init__(self, L, U, alpha):
+        super().__init__(L, U)
+        self.alpha = alpha
+        if alpha < 1:
+            # same (complex) expression as alphaFair, so that scalar thresholds match it exactly
+            self.beta = (lambertw(((U-U*alpha)/(L*alpha))))/(1-alpha)
+            self.betaReal = float(np.real(self.beta))
+
+    def curve(self, z):
+        return float(np.real(self.U*(e**(self.beta*(z-1)))))
+
+    def curveVector(self, z):
+        return self.U*np.exp(self.betaReal*(z-1))
+
+    def curveDomain(self):
+        return min(self.alpha, 1.0), 1.0
+
+    def curveRate(self):
+        return self.betaReal
+
+    def __call__(self, z):
+        if z < self.alpha:
+            return self.L
+        return self._curve(z)
+
+    def vector(self, z):
+        if self.alpha >= 1:
+            return np.full(np.shape(z), float(self.L))  # z < 1 always holds, so the threshold stays flat
+        return np.where(z < self.alpha, self.L, self._curveVector(np.maximum(z, self.alpha)))
+
+    def kernelParams(self):
+        if self.table is not None:
+            return None
+        return kernels.ALPHA_FAIR, (self.L, self.U, self.alpha, self.betaReal if self.alpha < 1 else 0.0)
+
+    def tabulate(self, maxError=1e-9):
+        if self.alpha >= 1:
+            return self  # the threshold is flat, nothing to tabulate
+        return super().tabulate(maxError)
+
+# threshold of the LAECT algorithm (see alphaLA), called with the prediction hat_d as a parameter
+class AlphaLAThreshold(PhiThreshold):
+    def __init__(self, L, U, gamma):
+        super().__init__(L, U)
+        self.gamma = gamma
+
+    # exp in alphaLA is curve(z), and exp2 is curve(z - gamma)
+    def curve(self, x):
+        return (self.base**(x/(1-self.gamma)))*self.Le
+
+    def curveVector(self, x):
+        return np.power(self.base, x/(1-self.gamma))*self.Le
+
+    def curveDomain(self):
+        return -self.gamma, 1.0
+
+    def curveRate(self):
+        return log(self.base)/(1-self.gamma)
+
+    def __call__(self, z, hat_d):
+        if self.gamma == 1:
+            return hat_d
+        exp = self._curve(z)
+        if exp < hat_d:
+            return exp
+        exp2 = self._curve(z-self.gamma)
+        if exp2 >= hat_d:
+            return exp2
+        return hat_d
+
+    def vector(self, z, hat_d):
+        if self.gamma == 1:
+            return np.broadcast_to(hat_d, np.shape(z))
+        exp = self._curveVector(z)
+        exp2 = self._curveVector(z-self.gamma)
+        return np.where(exp < hat_d, exp, np.where(exp2 >= hat_d, exp2, hat_d))
+
+    def kernelParams(self, hat_d):
+        if self.gamma == 1:
+            return kernels.CONSTANT, (hat_d,)
+        if self.table is not None:
+            return None
+        return kernels.ALPHA_LA, (self.base, self.Le, self.gamma, hat_d)
+
+    def tabulate(self, maxError=1e-9):
+        if self.gamma == 1:
+            return self  # the threshold is the prediction itself, nothing to tabulate
+        return super().tabulate(maxError)
+
+# threshold that stays at one value (ZCLRandomized draws it once per trace), also used by online.py and shards.py
+class ConstantThreshold:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self, z, *params):
+        return self.value
+
+    def vector(self, z, *params):
+        return np.full(np.shape(z), float(self.value))
+
+    def kernelParams(self, *params):
+        return kernels.CONSTANT, (self.value,)
@@ -1,33 +1,30 @@
 # Time Fairness in Online Knapsack Problems
 # Data Loading Helper (loads cloud traces in the form of MATLAB .mat files)
+#
+# mat4py is only imported when a MAT file has to be parsed (see readTrace); opening an up-to-date columnar store
+# needs NumPy only
 
-from mat4py import loadmat
 import knapsack as k
+import opt
+import trace_store
+import instrument
 import numpy as np
-import seaborn as sns
 import random
-import pickle
 import os
+import json
+import hashlib
 from math import e
-import itertools
-import matplotlib.pyplot as plt
 from multiprocessing import Pool
 
-# function to load the specified trace with the specified value for theta
-def loadFromMAT(theta=10):
+# function to load the original (unshuffled) traces with the specified value for theta, plus L and U
+def loadBaseTraces(theta=10):
     # load cloud traces
     traceValues = []
     traceWeights = []
     for i in range(1, 87):
         # loads a single trace from a single MAT file
-        data = loadmat('data-cloud/values{}/jobvalue{}.mat'.format(theta, i))
-        weights = data['jobweightCell']
-        values = data['jobvalueCell']
-        
-        # flatten weights and values into a single list each
-        weightsF = [x[0] for x in weights]
-        valuesF = [x[0] for x in values]
-        
+        valuesF, weightsF = readTrace(tracePath(theta, i))
+
         # append to running list
         traceValues.append(valuesF)
         traceWeights.append(weightsF)
@@ -42,75 +39,125 @@ def loadFromMAT(theta=10):
     # print(L)
     # print(U)
 
-    W = 100
+    return traceValues, traceWeights, L, U
+
+# reads the values and weights of one trace from a MAT file, flattened into a single list each
+def readTrace(path):
+    from mat4py import loadmat
+    data = loadmat(path)
+    return [x[0] for x in data['jobvalueCell']], [x[0] for x in data['jobweightCell']]
+
+# bump whenever the per-trace preprocessing below changes, to invalidate cached results
+PREPROCESS_VERSION = 3
+
+# directory holding cached per-trace preprocessing results
+CACHE_DIR = os.path.join("cache", "traces")
+
+# path of the MAT file holding the specified trace
+def tracePath(theta, i):
+    return 'data-cloud/values{}/jobvalue{}.mat'.format(theta, i)
+
+# cache key of a trace: a hash of its source file and of every parameter that affects its preprocessing
+def traceKey(path, params):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        h.update(f.read())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+# parses a single trace, computes its optimal solution and d^star, and caches the result under its key
+def preprocessTrace(args):
+    path, key, solver, solverOptions = args
+
+    # loads a single trace from a single MAT file
+    tValue, tWeight = readTrace(path)
+    densities = np.array(tValue) / np.array(tWeight)
+
+    # compute optimal solution (the DP solver converts weights to integers, see opt.py)
+    result = opt.solveOPT(1, tWeight, tValue, len(tValue), method=solver, **solverOptions)
+    sol = result.value
+
+    # find best constant threshold value density (i.e. d^star as defined in the paper), see opt.py
+    bestDensity, _ = opt.bestConstantThreshold(1, tWeight, tValue, len(tValue))
+
+    # write to a temporary file first, so an interrupted worker never leaves a partial cache entry
+    os.makedirs(CACHE_DIR, mode = 0o777, exist_ok = True)
+    target = os.path.join(CACHE_DIR, key + ".npz")
+    tmp = os.path.join(CACHE_DIR, "{}.{}.tmp.npz".format(key, os.getpid()))
+    np.savez(tmp, values=np.array(tValue), weights=np.array(tWeight), opt=sol, bounds=(result.lower, result.upper),
+             dstar=bestDensity, densityRange=(densities.min(), densities.max()))
+    os.replace(tmp, target)
+    return key
+
+# preprocessing parameters of the specified value for theta, and the key of each of its traces
+def traceKeys(theta, solver, solverOptions):
+    params = {"version": PREPROCESS_VERSION, "solver": solver, "options": solverOptions}
+    return [traceKey(tracePath(theta, i), params) for i in range(1, 87)]
 
-    # for each trace, shuffle it 100 times and add each to a list of artificial traces
-    # also, compute the optimal solution to save computations, since order doesnt matter
-    # also, compute d^star for each of the original traces (see Prediction Model in the paper), and save to bestDensities
-    arTraceValues = []
-    arTraceWeights = []
+# function to load the specified trace with the specified value for theta
+# the offline optimum is computed with the given solver and its options (see opt.py)
+# every shuffle is a permutation derived from the master seed, so the shuffled traces are reproducible
+# traces are preprocessed in parallel by a pool of processes (default: one per core), and only traces
+# whose source file or parameters changed since the last run are recomputed
+def loadFromMAT(theta=10, solver="dp", shuffles=100, seed=0, processes=None, **solverOptions):
+    keys = traceKeys(theta, solver, solverOptions)
+    paths = [tracePath(theta, i) for i in range(1, 87)]
+    missing = [(path, key, solver, solverOptions) for path, key in zip(paths, keys)
+               if not os.path.exists(os.path.join(CACHE_DIR, key + ".npz"))]
+
+    # compute the optimal solution and d^star of each trace that is not cached yet
+    print("{} of {} traces cached".format(len(keys) - len(missing), len(keys)))
+    instrument.count("traceCacheHits", len(keys) - len(missing))
+    instrument.count("traceCacheMisses", len(missing))
+    if len(missing) > 0:
+        with Pool(processes or os.cpu_count()) as p:
+            for done, _ in enumerate(p.imap_unordered(preprocessTrace, missing), 1):
+                print("\rpreprocessing traces: {}/{}".format(done, len(missing)), end="", flush=True)
+        print()
+
+    # each trace is shuffled (100 times by default) to give a list of artificial traces, see trace_store.py
+    traceValues = []
+    traceWeights = []
     optimalSols = []
+    optimalBounds = []
     bestDensities = []
-    for (tValue, tWeight) in zip(traceValues, traceWeights):
-        # compute optimal solution
-        weightsP = [int(x*100) for x in tWeight] # convert weights to integers for DP solution
-        sol, packed = k.dpOptimalKnapsack(W, weightsP, tValue, len(tValue))
-        packedDensities = [tValue[i]/tWeight[i] for i in packed]
-
-        # find best constant threshold value density (i.e. d^star as defined in the paper)
-        print(".", end="", flush=True)
-        delta = 1
-        minD = min(packedDensities)
-        maxD = max(packedDensities)
-        densities = [minD+(delta*i) for i in range(int((maxD-minD)/delta)+1)]
-        sols = []
-        ratios = []
-        for density in densities: # try several possible values for d^star
-            thresol = k.LAECT(1, tWeight, tValue, len(tValue), L, U, density, 1)[0][-1]
-            sols.append(thresol)
-            if thresol == 0:
-                ratios.append(1000000)
-                continue
-            ratios.append(sol/thresol)
-        ratios = np.array(ratios)
-        bestDensity = densities[np.argmin(ratios)]
-
-        # shuffle original trace 100 times
-        for _ in range(100):
-            tempValue = tValue.copy()
-            tempWeight = tWeight.copy()
-
-            # combine values and weights, then shuffle
-            combined = list(zip(tempValue, tempWeight))
-            random.shuffle(combined)
-            shufValue, shufWeight = zip(*combined)
-
-            # save shuffled traces, optimal solutions, and d^star value densities
-            arTraceValues.append(shufValue)
-            arTraceWeights.append(shufWeight)
-            optimalSols.append(sol)
-            bestDensities.append(bestDensity)
-            
-    # save the loaded traces to pickle files to speed things up next time
-    os.makedirs("pickled{}".format(theta), mode = 0o777, exist_ok = True)
-    pickle.dump( arTraceValues, open( "pickled{}/traces_values.pickle".format(theta), "wb" ) )
-    pickle.dump( arTraceWeights, open( "pickled{}/traces_weights.pickle".format(theta), "wb" ) )
-    pickle.dump( optimalSols, open( "pickled{}/optimal_sols.pickle".format(theta), "wb" ) )
-    pickle.dump( bestDensities, open( "pickled{}/optimal_dens.pickle".format(theta), "wb" ) )
-    pickle.dump( (L, U), open( "pickled{}/bounds.pickle".format(theta), "wb" ) )
-
-    return arTraceValues, arTraceWeights, L, U, optimalSols, bestDensities
-
-def loadDataAndOPT(theta=10):
-    # try to load from pickle file
+    ranges = []
+    for key in keys:
+        with np.load(os.path.join(CACHE_DIR, key + ".npz")) as cached:
+            traceValues.append(cached["values"])
+            traceWeights.append(cached["weights"])
+            optimalSols.append(float(cached["opt"]))
+            optimalBounds.append(tuple(cached["bounds"]))
+            bestDensities.append(float(cached["dstar"]))
+            ranges.append(cached["densityRange"])
+
+    # compute L and U based on jobs in ALL traces
+    L = float(min(r[0] for r in ranges))
+    U = float(max(r[1] for r in ranges))
+
+    # save the loaded traces to a columnar store to speed things up next time
+    trace_store.writeStore(trace_store.storePath(theta), traceValues, traceWeights, optimalSols, optimalBounds, bestDensities, L, U, shuffles, seed, keys)
+    store = trace_store.openStore(trace_store.storePath(theta))
+
+    return store.traceValues(), store.traceWeights(), L, U, store.optimalSols, store.bestDensities
+
+# the traces are memory-mapped rather than copied, so processes loading the same store share its pages
+# the store is rebuilt (recomputing only changed traces) if any source file or parameter changed
+def loadDataAndOPT(theta=10, solver="dp", shuffles=100, seed=0, processes=None, **solverOptions):
+    # try to load from the columnar store
+    try:
+        store = trace_store.openStore(trace_store.storePath(theta))
+        if (store.keys, store.traces.shuffles, store.traces.seed) != (traceKeys(theta, solver, solverOptions), shuffles, seed):
+            raise IOError("columnar store is out of date")
+        print("Loaded traces from columnar store")
+    except OSError:
+        print("No up-to-date columnar store found. Loading traces from MATLAB files...")
+        return loadFromMAT(theta=theta, solver=solver, shuffles=shuffles, seed=seed, processes=processes, **solverOptions)
+    return store.traceValues(), store.traceWeights(), store.L, store.U, store.optimalSols, store.bestDensities
+
+# certified (lower, upper) bounds on the optimal solution of each trace, or None if they were not saved
+def loadOPTBounds(theta=10):
     try:
-        arTraceValues = pickle.load( open( "pickled{}/traces_values.pickle".format(theta), "rb" ) )
-        arTraceWeights = pickle.load( open( "pickled{}/traces_weights.pickle".format(theta), "rb" ) )
-        optimalSols = pickle.load( open( "pickled{}/optimal_sols.pickle".format(theta), "rb" ) )
-        bestDensities = pickle.load( open( "pickled{}/optimal_dens.pickle".format(theta), "rb" ) )
-        L, U = pickle.load( open( "pickled{}/bounds.pickle".format(theta), "rb" ) )
-        print("Loaded traces from pickle file")
-    except (OSError, IOError) as e:
-        print("No pickle file found. Loading traces from MATLAB files...")
-        arTraceValues, arTraceWeights, L, U, optimalSols, bestDensities = loadFromMAT(theta=theta)
-    return arTraceValues, arTraceWeights, L, U, optimalSols, bestDensities
\ No newline at end of file
+        return trace_store.openStore(trace_store.storePath(theta)).optimalBounds
+    except OSError:
+        return None
@@ -0,0 +1,124 @@
+# Time Fairness in Online Knapsack Problems
+# Monte Carlo ZCL-Randomized (thousands of random thresholds per trace, evaluated in one pass over the items)
+#
+# a run of ZCLRandomized draws z once and then admits every item whose density is at least phi(z) while it fits,
+# so its profit only depends on the first distinct density at or above phi(z).  the draws of a trace are mapped
+# to those densities, and opt.constantThresholdProfits simulates each distinct one once, all of them together in
+# a single pass over the items.  profits are identical to separate calls of knapsack.ZCLRandomized with the
+# same draws of z
+
+import argparse
+import functools
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+import numpy as np
+import knapsack as k
+import opt
+import grid
+import trace_store
+import instrument
+
+# edges of the histogram of empirical competitive ratios (the last bin holds every larger ratio, and runs
+# where nothing is admitted)
+RATIO_EDGES = np.concatenate((np.linspace(1, 12, 111), [np.inf]))
+
+# per-trace mean and standard deviation of the profit over the draws, mean competitive ratio and mean fraction
+# of OPT, and the histogram (over all traces and draws) of the competitive ratios
+MonteCarlo = namedtuple("MonteCarlo", ["meanProfit", "stdProfit", "meanRatio", "meanFraction", "ratioEdges",
+                                       "ratioCounts"])
+
+# knapsack of capacity W                -- W
+# list of weights for each item         -- weights
+# list of values for each item          -- vals
+# number of items                       -- n
+# lower bound on value size ratio       -- L
+# upper bound on value size ratio       -- U
+# array of draws of z                   -- z
+# "python" or "numba" (kernels.py)      -- backend
+# returns the final profit of ZCLRandomized for each draw of z
+def ZCLRandomizedProfits(W, weights, vals, n, L, U, z, backend=None):
+    densities = np.unique(np.asarray(vals[:n], dtype=float) / np.asarray(weights[:n], dtype=float))
+    thresholds = np.array([k.phi(float(z_j), L, U) for z_j in z])  # same helper as knapsack.ZCLRandomized
+
+    # a threshold admits the same items as the first density at or above it; thresholds above every density
+    # admit nothing
+    first = np.searchsorted(densities, thresholds, side="left")
+    used = np.unique(first[first < len(densities)])
+    _, usedProfits = opt.constantThresholdProfits(W, weights, vals, n, densities[used], backend)
+    profits = np.zeros(len(z))
+    admits = first < len(densities)
+    profits[admits] = usedProfits[np.searchsorted(used, first[admits])]
+    return profits
+
+# master seed  -- seed
+# index of the trace  -- t
+# the draws of z of a trace only depend on (seed, trace), not on how traces are split into tasks
+def drawStream(seed, t):
+    return np.random.default_rng(np.random.SeedSequence([seed, t]))
+
+# simulates every draw on one group of traces, and returns their per-trace statistics and ratio histogram
+def runMonteCarloTask(task):
+    theta, rows, draws, seed, W = task
+    store = grid.workerStore(theta)
+    values = store.traceValues()
+    weights = store.traceWeights()
+    stats = np.empty((len(rows), 4))
+    counts = np.zeros(len(RATIO_EDGES) - 1, dtype=np.int64)
+    for i, t in enumerate(rows):
+        tValue, tWeight = values[t], weights[t]
+        z = drawStream(seed, t).uniform(0, 1, draws)
+        profits = ZCLRandomizedProfits(W, tWeight, tValue, len(tValue), store.L, store.U, z)
+        optimal = store.optimalSols[t]
+        with np.errstate(divide="ignore"):  # a run where nothing is admitted has an infinite ratio
+            ratios = optimal / profits
+        stats[i] = profits.mean(), profits.std(), ratios.mean(), (profits / optimal).mean()
+        counts += np.histogram(np.minimum(ratios, RATIO_EDGES[-2]), RATIO_EDGES)[0]
+    return rows, stats, counts
+
+# value of theta (see load_traces.py)                    -- theta
+# number of draws of z per trace                         -- draws
+# master seed of the draws                               -- seed
+# number of worker processes (default: one per core)     -- processes
+# number of traces per task                              -- chunkSize
+def monteCarloStudy(theta=10, draws=1000, seed=0, processes=None, W=1, chunkSize=64):
+    import load_traces
+    load_traces.loadDataAndOPT(theta=theta)  # load the data set once, the workers share its columnar store
+    store = trace_store.openStore(trace_store.storePath(theta))
+    tasks = [(theta, np.arange(start, min(start + chunkSize, len(store))), draws, seed, W)
+             for start in range(0, len(store), chunkSize)]
+
+    stats = np.empty((len(store), 4))
+    counts = np.zeros(len(RATIO_EDGES) - 1, dtype=np.int64)
+    with Pool(processes or os.cpu_count(), initializer=grid.initWorker, initargs=(W, instrument.ENABLED)) as p:
+        finished = p.imap_unordered(functools.partial(instrument.collect, runMonteCarloTask), tasks)
+        for done, ((rows, taskStats, taskCounts), profile) in enumerate(finished, 1):
+            instrument.merge(profile)
+            stats[rows] = taskStats
+            counts += taskCounts
+            print("\rmonte carlo: {}/{} tasks".format(done, len(tasks)), end="", flush=True)
+    print()
+    return MonteCarlo(stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3], RATIO_EDGES, counts)
+
+if __name__ == "__main__":
+    # prints the expected competitive ratio of ZCL-Randomized over many draws per trace, and its distribution
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theta", type=int, default=10)
+    parser.add_argument("--draws", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    result = monteCarloStudy(args.theta, args.draws, args.seed, args.processes)
+    print("mean competitive ratio: {}".format(np.mean(result.meanRatio)))
+    print("mean ALG / OPT: {}".format(np.mean(result.meanFraction)))
+    print("mean relative stddev of the profit per trace: {}".format(np.mean(result.stdProfit / result.meanProfit)))
+    cumulative = np.cumsum(result.ratioCounts) / result.ratioCounts.sum()
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        edge = result.ratioEdges[np.searchsorted(cumulative, q) + 1]
+        if np.isinf(edge):
+            print("{:.0%} of runs have a ratio above {} (or admit nothing)".format(q, result.ratioEdges[-2]))
+        else:
+            print("{:.0%} of runs have a ratio of at most {}".format(q, edge))
+    if instrument.ENABLED:
+        instrument.report()
@@ -0,0 +1,222 @@
+# Time Fairness in Online Knapsack Problems
+# Streaming Admission (one knapsack that decides on items as they arrive)
+
+import argparse
+import itertools
+from collections import namedtuple
+import numpy as np
+import random
+import knapsack as k
+
+# number of upcoming items checked at once by offer_many while looking for the next admission
+SCAN_WINDOW = 256
+
+# number of items evaluate decides at once
+BLOCK_SIZE = 1 << 16
+
+# final profit and utilization (W - remaining capacity) of a streamed trace, the number of items offered and
+# admitted, and the profit and utilization after every sampleEvery-th item (with their item indices)
+StreamResult = namedtuple("StreamResult", ["profit", "utilization", "items", "admitted",
+                                           "sampleIndex", "sampleProfit", "sampleUtilization"])
+
+# threshold function for each algorithm in knapsack.py
+# lower bound on value size ratio       -- L
+# upper bound on value size ratio       -- U
+# fairness parameter \in [0,1]          -- alpha
+# predicted d^star                      -- hat_d
+# trust parameter \in [0,1]             -- gamma
+def makeThreshold(algorithm, L, U, alpha=None, hat_d=None, gamma=None):
+    if algorithm == "ZCL":
+        return k.PhiThreshold(L, U)
+    if algorithm == "ZCLRandomized":
+        return k.ConstantThreshold(k.phi(random.uniform(0, 1), L, U))
+    if algorithm == "baseline":
+        return k.AlphaPhiThreshold(L, U, alpha)
+    if algorithm == "ECT":
+        return k.AlphaFairThreshold(L, U, alpha)
+    if algorithm == "LAECT":
+        return k.AlphaLAThreshold(L, U, gamma)
+    raise ValueError("unknown algorithm {}".format(algorithm))
+
+# a single knapsack which admits or rejects each offered item using the threshold rules in knapsack.py,
+# with the same decisions as the scalar algorithms.  per-item cost and memory are O(1); the profit and
+# utilization after each item are only kept when history > 0, in a ring buffer of the last history items
+class OnlineKnapsack:
+    __slots__ = ("W", "remainingW", "value", "threshold", "params", "count", "admitted",
+                 "historyProfit", "historyUtilization", "historyLength")
+
+    # knapsack of capacity W                            -- W
+    # lower bound on value size ratio                   -- L
+    # upper bound on value size ratio                   -- U
+    # name of the algorithm (ZCL, ZCLRandomized, ...)   -- algorithm
+    # algorithm parameters (alpha, hat_d, gamma)        -- params
+    # precomputed threshold (optional)                  -- threshold
+    # number of recent items to record (0 disables)     -- history
+    def __init__(self, W, L, U, algorithm="ZCL", threshold=None, history=0, **params):
+        self.W = W
+        self.remainingW = W
+        self.value = 0
+        self.threshold = makeThreshold(algorithm, L, U, **params) if threshold is None else threshold
+        self.params = (params["hat_d"],) if algorithm == "LAECT" else ()  # per-call threshold parameters
+        self.count = 0
+        self.admitted = 0
+        self.historyLength = history
+        self.historyProfit = np.zeros(history) if history > 0 else None
+        self.historyUtilization = np.zeros(history) if history > 0 else None
+
+    # fraction of the knapsack that is occupied
+    @property
+    def utilization(self):
+        return (self.W - self.remainingW) / self.W
+
+    # value of the offered item   -- value
+    # weight of the offered item  -- weight
+    # returns True if the item is admitted
+    def offer(self, value, weight):
+        z_j = (self.W - self.remainingW) / self.W  # how much of knapsack is occupied
+        admit = (value/weight) >= self.threshold(z_j, *self.params) and (self.remainingW - weight) > 0
+        if admit:
+            self.value += value
+            self.remainingW -= weight
+            self.admitted += 1
+        if self.historyLength > 0:
+            i = self.count % self.historyLength
+            self.historyProfit[i] = self.value
+            self.historyUtilization[i] = self.W - self.remainingW
+        self.count += 1
+        return admit
+
+    # array of values of the offered items   -- values
+    # array of weights of the offered items  -- weights
+    # returns a boolean array of admission decisions, identical to calling offer on each item in order
+    def offer_many(self, values, weights):
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        densities = values / weights
+        n = len(values)
+        decisions = np.zeros(n, dtype=bool)
+        recordFrom = max(n - self.historyLength, 0)  # only the last history items can still be in the ring buffer
+        profitAfter = np.empty(n) if self.historyLength > 0 else None
+        utilizationAfter = np.empty(n) if self.historyLength > 0 else None
+
+        # the threshold only changes after an admission, so scan ahead for the next item that clears it
+        i = 0
+        while i < n:
+            phi_j = self.threshold((self.W - self.remainingW) / self.W, *self.params)
+            end = min(i + SCAN_WINDOW, n)
+            clears = (densities[i:end] >= phi_j) & (weights[i:end] < self.remainingW)
+            j = int(np.argmax(clears)) + i
+            if not clears[j - i]:
+                j = end  # nothing in this window is admitted
+            if profitAfter is not None and j > recordFrom:
+                profitAfter[i:j] = self.value
+                utilizationAfter[i:j] = self.W - self.remainingW
+            if j < end:
+                decisions[j] = True
+                self.value += values[j]
+                self.remainingW -= weights[j]
+                self.admitted += 1
+                if profitAfter is not None:
+                    profitAfter[j] = self.value
+                    utilizationAfter[j] = self.W - self.remainingW
+                j += 1
+            i = j
+
+        if self.historyLength > 0 and n > 0:
+            positions = (self.count + np.arange(recordFrom, n)) % self.historyLength
+            self.historyProfit[positions] = profitAfter[recordFrom:]
+            self.historyUtilization[positions] = utilizationAfter[recordFrom:]
+        self.count += n
+        return decisions
+
+    # returns the recorded profit and utilization after each of the most recent items, oldest first
+    def history(self):
+        if self.historyLength == 0:
+            return np.zeros(0), np.zeros(0)
+        kept = min(self.count, self.historyLength)
+        positions = (self.count - kept + np.arange(kept)) % self.historyLength
+        return self.historyProfit[positions], self.historyUtilization[positions]
+
+# iterable of (value, weight) chunks, each a pair of arrays or lists -- chunks
+# number of items per block                                          -- blockSize
+# splits every chunk into blocks of at most blockSize items
+def blocks(chunks, blockSize=BLOCK_SIZE):
+    for values, weights in chunks:
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        for start in range(0, len(values), blockSize):
+            yield values[start:start + blockSize], weights[start:start + blockSize]
+
+# iterable of (value, weight) pairs -- items
+# groups single items into blocks of blockSize items
+def itemBlocks(items, blockSize=BLOCK_SIZE):
+    items = iter(items)
+    while True:
+        block = list(itertools.islice(items, blockSize))
+        if len(block) == 0:
+            return
+        values, weights = zip(*block)
+        yield np.array(values, dtype=float), np.array(weights, dtype=float)
+
+# knapsack of capacity W                                       -- W
+# iterable of (values, weights) chunks (e.g. from workload.py)  -- chunks
+# lower bound on value size ratio                              -- L
+# upper bound on value size ratio                              -- U
+# name of the algorithm (ZCL, ZCLRandomized, ...)              -- algorithm
+# record profit and utilization every sampleEvery items (0 disables) -- sampleEvery
+# number of items decided at once                              -- blockSize
+# algorithm parameters (alpha, hat_d, gamma)                   -- params
+# runs an algorithm on a trace that arrives in chunks, e.g. one larger than memory.  only the knapsack state
+# (and the samples, if requested) is kept between blocks, and the decisions are those of the scalar algorithms
+# in knapsack.py, so profit[i] and utilization[i] of the list-based algorithm appear as samples for every
+# i = sampleEvery - 1, 2 * sampleEvery - 1, ...
+def evaluate(W, chunks, L, U, algorithm="ZCL", sampleEvery=0, blockSize=BLOCK_SIZE, threshold=None, **params):
+    knapsack = OnlineKnapsack(W, L, U, algorithm, threshold, **params)
+    sampleIndex = []
+    sampleProfit = []
+    sampleUtilization = []
+    for values, weights in blocks(chunks, blockSize):
+        value, remainingW, count = knapsack.value, knapsack.remainingW, knapsack.count
+        decisions = knapsack.offer_many(values, weights)
+        if sampleEvery > 0:
+            # replay the additions and subtractions of the scalar loop, in the same order, at the admissions
+            admitted = np.flatnonzero(decisions)
+            profitAfter = np.add.accumulate(np.concatenate(([value], values[admitted])))
+            remainingAfter = np.subtract.accumulate(np.concatenate(([remainingW], weights[admitted])))
+            index = np.arange(sampleEvery - 1 - count % sampleEvery, len(values), sampleEvery)
+            last = np.searchsorted(admitted, index, side="right")  # admissions up to and including each sample
+            sampleIndex.append(count + index)
+            sampleProfit.append(profitAfter[last])
+            sampleUtilization.append(W - remainingAfter[last])
+
+    if sampleEvery > 0 and len(sampleIndex) > 0:
+        sampleIndex, sampleProfit, sampleUtilization = (np.concatenate(x) for x in
+                                                        (sampleIndex, sampleProfit, sampleUtilization))
+    else:
+        sampleIndex, sampleProfit, sampleUtilization = np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    return StreamResult(knapsack.value, W - knapsack.remainingW, knapsack.count, knapsack.admitted,
+                        sampleIndex, sampleProfit, sampleUtilization)
+
+if __name__ == "__main__":
+    # streams one synthetic trace (see workload.py), e.g. of 100 million items, through an algorithm
+    import time
+    import workload
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10**7)
+    parser.add_argument("--algorithm", default="ECT", choices=["ZCL", "ZCLRandomized", "baseline", "ECT", "LAECT"])
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--W", type=float, default=1000.0)
+    parser.add_argument("--sample", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    L, U = workload.bounds(workload.Workload())
+    params = {"baseline": {"alpha": args.alpha}, "ECT": {"alpha": args.alpha},
+              "LAECT": {"hat_d": np.sqrt(L * U), "gamma": args.gamma}}.get(args.algorithm, {})
+    chunks = ((values, weights) for times, values, weights in workload.traceChunks(args.items, seed=args.seed))
+    start = time.perf_counter()
+    result = evaluate(args.W, chunks, L, U, args.algorithm, args.sample, **params)
+    elapsed = time.perf_counter() - start
+    print("{} items, {} admitted, profit {:.6f}, utilization {:.6f} ({:.0f} items/s)".format(
+        result.items, result.admitted, result.profit, result.utilization, result.items / elapsed))
@@ -0,0 +1,228 @@
+# Time Fairness in Online Knapsack Problems
+# Offline Optimal Solvers (exact DP, branch-and-bound, and FPTAS), each reporting certified bounds on OPT
+
+import numpy as np
+from bisect import bisect_right
+from collections import namedtuple
+import knapsack as k
+import kernels
+
+# value of the returned solution, certified lower/upper bounds on OPT, and the packed set
+OPTResult = namedtuple("OPTResult", ["value", "lower", "upper", "packed"])
+
+# relative slack on the capacity constraint for floating point weights
+CAPACITY_TOLERANCE = 1e-9
+
+# items that can be part of some feasible solution, sorted by decreasing value density
+def densityOrder(W, weights, vals):
+    weights = np.asarray(weights, dtype=float)
+    vals = np.asarray(vals, dtype=float)
+    fits = np.flatnonzero((weights <= W * (1 + CAPACITY_TOLERANCE)) & (vals > 0))
+    return fits[np.argsort(-vals[fits] / weights[fits], kind="stable")]
+
+# value of the fractional relaxation (Dantzig bound), an upper bound on OPT.  it uses the same slack on the
+# capacity as the solvers, so it also bounds any solution they pack
+def fractionalBound(W, weights, vals):
+    order = densityOrder(W, weights, vals)
+    capacity = W * (1 + CAPACITY_TOLERANCE)
+    cumW = np.cumsum(np.asarray(weights, dtype=float)[order])
+    cumV = np.cumsum(np.asarray(vals, dtype=float)[order])
+    j = int(np.searchsorted(cumW, capacity, side="right"))  # first item that does not fit completely
+    if j == len(order):
+        return float(cumV[-1]) if j > 0 else 0.0
+    prefixW = cumW[j-1] if j > 0 else 0.0
+    prefixV = cumV[j-1] if j > 0 else 0.0
+    return float(prefixV + (capacity - prefixW) * vals[order[j]] / weights[order[j]])
+
+# knapsack of capacity W                                   -- W
+# list of weights for each item                            -- weights
+# list of values for each item                             -- vals
+# number of items                                          -- n
+# weights are integerized as multiples of 1/scale          -- scale
+# exact DP (see knapsack.dpOptimalKnapsack), so lower = upper = value
+def dpSolver(W, weights, vals, n, scale=100, memoryBounded=False):
+    scaled = np.asarray(weights[:n], dtype=float) * scale
+    weightsP = np.rint(scaled).astype(np.int64)
+    if not np.allclose(scaled, weightsP, rtol=0, atol=1e-6):
+        raise ValueError("weights are not integral at scale {}; use the bnb or fptas solver".format(scale))
+    value, packed = k.dpOptimalKnapsack(int(round(W * scale)), weightsP.tolist(), vals, n, memoryBounded=memoryBounded)
+    return OPTResult(value, value, value, packed)
+
+# knapsack of capacity W                        -- W
+# list of weights for each item                 -- weights
+# list of values for each item                  -- vals
+# number of items                               -- n
+# maximum number of search nodes (optional)     -- maxNodes
+# depth-first branch-and-bound over items sorted by density, pruned with the fractional relaxation.
+# if the node budget runs out, the upper bound is the largest fractional bound among unexplored nodes
+def branchAndBound(W, weights, vals, n, maxNodes=10**6):
+    weights = np.asarray(weights[:n], dtype=float)
+    vals = np.asarray(vals[:n], dtype=float)
+    order = densityOrder(W, weights, vals)
+    sw = weights[order].tolist()
+    sv = vals[order].tolist()
+    m = len(order)
+    capacity = W * (1 + CAPACITY_TOLERANCE)
+
+    # prefix sums over the sorted items give the fractional bound of any suffix in O(log m)
+    cumW = [0.0] + np.cumsum(sw).tolist()
+    cumV = [0.0] + np.cumsum(sv).tolist()
+
+    def bound(i, c, v):
+        j = bisect_right(cumW, cumW[i] + c) - 1  # items i..j-1 fit completely
+        if j >= m:
+            return v + cumV[m] - cumV[i]
+        return v + cumV[j] - cumV[i] + (c - (cumW[j] - cumW[i])) * sv[j] / sw[j]
+
+    bestValue = 0.0
+    bestChosen = None
+    # each node is (next item, remaining capacity, value, chosen items as a linked list, fractional bound)
+    stack = [(0, capacity, 0.0, None, bound(0, capacity, 0.0))]
+    nodes = 0
+    while stack and nodes < maxNodes:
+        i, c, v, chosen, b = stack.pop()
+        if b <= bestValue:
+            continue
+        nodes += 1
+
+        # greedy dive: take items in density order while they fit, branching on each item that is taken
+        while i < m:
+            if sw[i] <= c:
+                skipBound = bound(i + 1, c, v)
+                if skipBound > bestValue:
+                    stack.append((i + 1, c, v, chosen, skipBound))
+                c -= sw[i]
+                v += sv[i]
+                chosen = (i, chosen)
+            i += 1
+            if bound(i, c, v) <= bestValue:
+                break
+        if v > bestValue:
+            bestValue, bestChosen = v, chosen
+
+    packed = set()
+    while bestChosen is not None:
+        packed.add(int(order[bestChosen[0]]))
+        bestChosen = bestChosen[1]
+    upper = max([bestValue] + [node[4] for node in stack if node[4] > bestValue])
+    return OPTResult(bestValue, bestValue, upper, packed)
+
+# knapsack of capacity W                        -- W
+# list of weights for each item                 -- weights
+# list of values for each item                  -- vals
+# number of items                               -- n
+# approximation parameter \in (0,1)             -- epsilon
+# profit-scaling FPTAS: the returned solution has value at least (1 - epsilon) OPT
+def fptas(W, weights, vals, n, epsilon=0.1):
+    weights = np.asarray(weights[:n], dtype=float)
+    vals = np.asarray(vals[:n], dtype=float)
+    order = densityOrder(W, weights, vals)
+    capacity = W * (1 + CAPACITY_TOLERANCE)
+    upper = fractionalBound(W, weights, vals)
+    if len(order) == 0:
+        return OPTResult(0.0, 0.0, 0.0, set())
+
+    # lower bound from the greedy (density order) solution or the single most valuable item
+    greedy = order[np.cumsum(weights[order]) <= capacity]
+    lower = max(vals[greedy].sum(), vals[order].max())
+
+    # no solution has more than maxItems items, so rounding each profit down by at most K loses at most
+    # maxItems * K = epsilon * lower <= epsilon * OPT
+    maxItems = min(len(order), int(capacity / weights[order].min()))
+    K = epsilon * lower / max(maxItems, 1)
+    profits = np.floor(vals[order] / K).astype(np.int64)
+    P = int(min(np.floor(upper / K), profits.sum()))
+
+    # minWeight[p] is the least weight with scaled profit exactly p, with a bit-packed choice matrix for backtracking
+    minWeight = np.full(P + 1, np.inf)
+    minWeight[0] = 0.0
+    choice = np.zeros((len(order), (P + 8) // 8), dtype=np.uint8)
+    take = np.zeros(P + 1, dtype=bool)
+    for i, (p, w) in enumerate(zip(profits, weights[order])):
+        if p == 0 or p > P:
+            continue
+        candidate = minWeight[:P + 1 - p] + w
+        take[:p] = False
+        np.less(candidate, minWeight[p:], out=take[p:])
+        minWeight[p:] = np.where(take[p:], candidate, minWeight[p:])
+        choice[i] = np.packbits(take)
+
+    p = int(np.flatnonzero(minWeight <= capacity).max())
+    chosen = set()
+    for i in range(len(order) - 1, -1, -1):
+        if (choice[i, p >> 3] >> (7 - (p & 7))) & 1:
+            chosen.add(int(order[i]))
+            p -= int(profits[i])
+
+    # fill any remaining capacity greedily, which can only improve the solution
+    remaining = capacity - weights[list(chosen)].sum()
+    for i in order:
+        if int(i) not in chosen and weights[i] <= remaining:
+            chosen.add(int(i))
+            remaining -= weights[i]
+
+    value = float(vals[list(chosen)].sum())
+    return OPTResult(value, value, max(min(upper, value / (1 - epsilon)), value), chosen)
+
+# knapsack of capacity W                     -- W
+# list of weights for each item              -- weights
+# list of values for each item               -- vals
+# number of items                            -- n
+# sorted, distinct thresholds (optional)     -- thresholds
+# "python" or "numba" (kernels.py)           -- backend
+# profit of a constant threshold (admitting every item whose density is at least the threshold while it fits,
+# as in knapsack.ZCLRandomized) at each of the given thresholds, by default every distinct density.  the profit
+# only changes at item densities; the thresholds are sorted once and all of them are advanced together in a
+# single pass over the items, replaying the capacity checks of the scalar algorithms exactly
+# returns the thresholds and their profits
+def constantThresholdProfits(W, weights, vals, n, thresholds=None, backend=None):
+    weights = np.asarray(weights[:n], dtype=float)
+    vals = np.asarray(vals[:n], dtype=float)
+    densities = vals / weights
+    thresholds = np.unique(densities) if thresholds is None else np.asarray(thresholds, dtype=float)
+
+    # an item clears a prefix of the (increasing) thresholds
+    cutoff = np.searchsorted(thresholds, densities, side="right")
+    remainingW = np.full(len(thresholds), float(W))
+    profit = np.zeros(len(thresholds))
+    if kernels.useCompiled(backend):
+        kernels.bestThreshold(weights, vals, cutoff, remainingW, profit)
+    else:
+        admit = np.empty(len(thresholds), dtype=bool)
+        for i in range(n):
+            c = cutoff[i]
+            np.greater(remainingW[:c], weights[i], out=admit[:c])
+            np.subtract(remainingW[:c], weights[i], out=remainingW[:c], where=admit[:c])
+            np.add(profit[:c], vals[i], out=profit[:c], where=admit[:c])
+    return thresholds, profit
+
+# knapsack of capacity W           -- W
+# list of weights for each item    -- weights
+# list of values for each item     -- vals
+# number of items                  -- n
+# "python" or "numba" (kernels.py) -- backend
+# exact best constant threshold (d^star), among every distinct density (see constantThresholdProfits)
+# returns the smallest candidate with the largest profit (every threshold between it and the next smaller
+# density admits the same items), and that profit
+def bestConstantThreshold(W, weights, vals, n, backend=None):
+    candidates, profit = constantThresholdProfits(W, weights, vals, n, backend=backend)
+    if len(candidates) == 0:
+        return 0.0, 0.0
+    best = int(np.argmax(profit))
+    return float(candidates[best]), float(profit[best])
+
+# available solvers for the offline optimum
+SOLVERS = {
+    "dp": dpSolver,
+    "bnb": branchAndBound,
+    "fptas": fptas,
+}
+
+# knapsack of capacity W                              -- W
+# list of weights for each item                       -- weights
+# list of values for each item                        -- vals
+# number of items                                     -- n
+# name of the solver (see SOLVERS)                    -- method
+# solver options (scale, maxNodes, epsilon, ...)      -- options
+def solveOPT(W, weights, vals, n, method="dp", **options):
+    return SOLVERS[method](W, weights, vals, n, **options)
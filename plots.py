@@ -0,0 +1,35 @@
+# Time Fairness in Online Knapsack Problems
+# Plotting (empirical CDFs of the competitive ratios; the only module that needs matplotlib and seaborn)
+
+import seaborn as sns
+import matplotlib.pyplot as plt
+import matplotlib.style as style
+
+# list of arrays of empirical competitive ratios, one per curve  -- ratios
+# line style of each curve                                       -- linestyles
+# file to save the plot to                                       -- path
+# color of each curve (None for the next color of the style)     -- colors
+# matplotlib style of the plot                                   -- plotStyle
+def ratioCDF(ratios, linestyles, path, colors=None, plotStyle='tableau-colorblind10'):
+    style.use(plotStyle)
+
+    # set plot size to (4, 3) and dpi = 500
+    plt.figure(figsize=(4, 3), dpi=500)
+
+    # CDF plot for competitive ratio (across all experiments)
+    colors = colors or [None] * len(ratios)
+    for dat, ls, color in zip(ratios, linestyles, colors):
+        if color is None:
+            sns.ecdfplot(data = dat, linestyle = ls) # plots empirical CDF
+        else:
+            sns.ecdfplot(data = dat, linestyle = ls, color = color)
+
+    # set labels and limits
+    plt.ylabel('empirical CDF')
+    plt.xlabel("empirical competitive ratio")
+    plt.xlim(0.9, 12)
+
+    # save plot to file
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.clf()
@@ -0,0 +1,59 @@
+# Time Fairness in Online Knapsack Problems
+# Result Store (per-trace profits and ratios of each experiment cell, keyed by code version and parameters)
+
+import numpy as np
+import hashlib
+import json
+import os
+
+# directory holding one file per finished cell
+RESULTS_DIR = "results"
+
+# source files whose changes can change simulated profits: the algorithms and their engines, the grid runner,
+# the trace gathering and permutations of the columnar store, and the compiled kernels and OPT solvers that
+# the stored ratios depend on
+RESULT_SOURCES = ("knapsack.py", "batch.py", "grid.py", "trace_store.py", "opt.py", "kernels.py")
+
+# hash of the simulation code, so results from older code are never reused
+def codeVersion():
+    h = hashlib.sha256()
+    for name in RESULT_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# hash of a data set, i.e. of the metadata of its columnar store (trace keys, shuffles, and seed)
+def datasetVersion(storePath):
+    with open(os.path.join(storePath, "meta.json"), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# grid cell (see grid.Cell)            -- cell
+# seed for the random inputs           -- seed
+# knapsack of capacity W               -- W
+# hash of the data set                 -- dataset
+# hash of the simulation code          -- version
+# numeric parameters are hashed as floats, so e.g. alpha = 1 and alpha = 1.0 name the same cell
+def cellKey(cell, seed, W, dataset, version):
+    fields = [float(x) if isinstance(x, (int, float)) and not isinstance(x, bool) else x for x in cell]
+    params = {"cell": fields, "seed": seed, "W": float(W), "dataset": dataset, "version": version}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def cellPath(key):
+    return os.path.join(RESULTS_DIR, key + ".npz")
+
+# returns the stored per-trace profits of a cell, or None if it has not finished yet
+def loadCell(key):
+    try:
+        with np.load(cellPath(key)) as stored:
+            return stored["profits"]
+    except OSError:
+        return None
+
+# stores the per-trace profits of a finished cell, along with its parameters and competitive ratios
+def saveCell(key, cell, seed, profits, optimalSols):
+    os.makedirs(RESULTS_DIR, mode = 0o777, exist_ok = True)
+    tmp = os.path.join(RESULTS_DIR, "{}.{}.tmp.npz".format(key, os.getpid()))
+    with np.errstate(divide="ignore"):  # a trace where nothing is admitted has an infinite ratio
+        ratios = np.asarray(optimalSols)/profits
+    np.savez_compressed(tmp, profits=profits, ratios=ratios, cell=json.dumps(list(cell)), seed=seed)
+    os.replace(tmp, cellPath(key))
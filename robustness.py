@@ -0,0 +1,127 @@
+# Time Fairness in Online Knapsack Problems
+# Prediction-Error Robustness Study (many noisy prediction replicates per error level, with confidence intervals)
+
+import argparse
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+import numpy as np
+import grid
+import sweep
+import trace_store
+import instrument
+import functools
+
+# z value of the two-sided 95% normal confidence interval
+CONFIDENCE_Z = 1.96
+
+# mean empirical competitive ratio of LA-ECT for each (error, gamma), with the bounds of its confidence interval
+# over the noise replicates, and the mean ratio of each replicate (errors x gammas x replicates).  a trace where
+# nothing is admitted has an infinite ratio, so the same statistics are also given for the fraction of OPT
+# obtained (ALG / OPT), which stays finite
+Robustness = namedtuple("Robustness", ["errors", "gammas", "mean", "lower", "upper", "replicateMeans",
+                                       "fractionMean", "fractionLower", "fractionUpper"])
+
+# master seed                       -- seed
+# multiplicative error              -- error
+# index of the trace in the store   -- trace
+# every trace draws its noise from its own stream, which only depends on (seed, error level, trace), so the
+# replicates are the same for any split of the traces into tasks and any number of workers.  the error level
+# is keyed on the bits of the error itself (as in grid.noisyPredictions), so the noise of one level does not
+# depend on which other levels are studied, or in which order
+def noiseStream(seed, error, trace):
+    errorKey = int(np.float64(error).view(np.uint64))
+    return np.random.default_rng(np.random.SeedSequence([seed, errorKey, trace]))
+
+# simulates LA-ECT for every (gamma, replicate) pair on one group of traces, and returns the sums of the
+# competitive ratios and of the fractions of OPT over the traces for each pair
+def runRobustnessTask(task):
+    theta, errorIndex, error, gammas, replicates, rows, seed, W = task
+    store = grid.workerStore(theta)
+    optimalSols = np.asarray(store.optimalSols[rows])
+
+    # multiplicative gaussian (mean 0) noise with stddev = error, one draw per (trace, replicate)
+    noise = np.abs(1 + np.array([noiseStream(seed, error, int(t)).normal(0, error, replicates) for t in rows])
+                   .reshape(len(rows), replicates))
+    predictions = np.asarray(store.bestDensities[rows])[:, None] * noise
+
+    # one column per (gamma, replicate) pair, all advancing together over the items of each trace
+    columns = sweep.LAECTColumns(store.L, store.U, np.repeat(gammas, replicates))
+    vals, offsets = store.traceValues().gather(rows)
+    weights, _ = store.traceWeights().gather(rows)
+    profits = sweep.sweep(W, weights, vals, offsets, columns, (np.tile(predictions, len(gammas)),))
+    with np.errstate(divide="ignore"):  # a trace where nothing is admitted has an infinite ratio
+        ratios = optimalSols[:, None] / profits
+    fractions = profits / optimalSols[:, None]
+    shape = (len(gammas), replicates)
+    return errorIndex, ratios.sum(axis=0).reshape(shape), fractions.sum(axis=0).reshape(shape)
+
+# value of theta (see load_traces.py)                    -- theta
+# array of prediction error levels                       -- errors
+# array of trust parameters                              -- gammas
+# number of noise replicates per error level             -- replicates
+# master seed of the noise                               -- seed
+# number of worker processes (default: one per core)     -- processes
+# number of traces per task                              -- chunkSize
+def robustnessStudy(theta=50, errors=(0, 0.25, 0.5, 0.75, 1), gammas=(0.33, 0.66, 1), replicates=100, seed=0,
+                    processes=None, W=1, chunkSize=256):
+    import load_traces
+    load_traces.loadDataAndOPT(theta=theta)  # load the data set once, the workers share its columnar store
+    store = trace_store.openStore(trace_store.storePath(theta))
+    errors = np.asarray(errors, dtype=float)
+    gammas = np.asarray(gammas, dtype=float)
+
+    order = np.argsort(-store.traces.lengths(), kind="stable")
+    tasks = []
+    for e, error in enumerate(errors):
+        for start in range(0, len(store), chunkSize):
+            tasks.append((theta, e, error, gammas, replicates, order[start:start + chunkSize], seed, W))
+
+    # the per-trace ratios are summed as tasks finish, so memory does not grow with the number of replicates
+    ratioSums = np.zeros((len(errors), len(gammas), replicates))
+    fractionSums = np.zeros((len(errors), len(gammas), replicates))
+    with Pool(processes or os.cpu_count(), initializer=grid.initWorker, initargs=(W, instrument.ENABLED)) as p:
+        finished = p.imap_unordered(functools.partial(instrument.collect, runRobustnessTask), tasks)
+        for done, ((e, ratios, fractions), profile) in enumerate(finished, 1):
+            instrument.merge(profile)
+            ratioSums[e] += ratios
+            fractionSums[e] += fractions
+            print("\rrobustness: {}/{} tasks".format(done, len(tasks)), end="", flush=True)
+    print()
+
+    # each replicate gives one mean ratio over all traces; the interval is over replicates
+    replicateMeans = ratioSums / len(store)
+    mean, lower, upper = confidenceInterval(replicateMeans)
+    fractionMean, fractionLower, fractionUpper = confidenceInterval(fractionSums / len(store))
+    return Robustness(errors, gammas, mean, lower, upper, replicateMeans, fractionMean, fractionLower, fractionUpper)
+
+# mean and normal confidence interval along the last axis (replicates) -- samples
+def confidenceInterval(samples):
+    mean = samples.mean(axis=-1)
+    if samples.shape[-1] < 2:
+        return mean, mean, mean
+    with np.errstate(invalid="ignore"):  # infinite ratios have an undefined spread
+        halfWidth = CONFIDENCE_Z * samples.std(axis=-1, ddof=1) / np.sqrt(samples.shape[-1])
+    return mean, mean - halfWidth, mean + halfWidth
+
+if __name__ == "__main__":
+    # prints the mean competitive ratio of LA-ECT (with 95% confidence intervals) as a function of the error
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theta", type=int, default=50)
+    parser.add_argument("--errors", type=float, nargs="+", default=[0, 0.25, 0.5, 0.75, 1])
+    parser.add_argument("--gammas", type=float, nargs="+", default=[0.33, 0.66, 1])
+    parser.add_argument("--replicates", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    result = robustnessStudy(args.theta, args.errors, args.gammas, args.replicates, args.seed, args.processes)
+    print("{:>7} {:>7} {:>12} {:>25} {:>12} {:>25}".format("error", "gamma", "mean ratio", "95% confidence interval",
+                                                             "ALG / OPT", "95% confidence interval"))
+    for e, error in enumerate(result.errors):
+        for g, gamma in enumerate(result.gammas):
+            print("{:7.3f} {:7.3f} {:12.6f}   [{:10.6f}, {:10.6f}] {:12.6f}   [{:10.6f}, {:10.6f}]".format(
+                error, gamma, result.mean[e, g], result.lower[e, g], result.upper[e, g],
+                result.fractionMean[e, g], result.fractionLower[e, g], result.fractionUpper[e, g]))
+    if instrument.ENABLED:
+        instrument.report()
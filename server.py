@@ -0,0 +1,285 @@
+# Time Fairness in Online Knapsack Problems
+# Asyncio Admission Server (many independent knapsacks, with concurrent offers coalesced into micro-batches)
+
+import asyncio
+import argparse
+import math
+import random
+import time
+from collections import deque
+import numpy as np
+import knapsack as k
+import batch
+
+# many independent knapsacks (e.g. one per tenant) sharing one algorithm, with state held in arrays
+class KnapsackBank:
+    # number of knapsacks                                -- numKnapsacks
+    # knapsack of capacity W                             -- W
+    # lower bound on value size ratio                    -- L
+    # upper bound on value size ratio                    -- U
+    # name of the algorithm (ZCL, ZCLRandomized, ...)    -- algorithm
+    # algorithm parameters (alpha, gamma, and hat_d, which may be given per knapsack) -- params
+    # without a prediction, LAECT uses hat_d = sqrt(L*U), the middle of [L, U] on a log scale
+    def __init__(self, numKnapsacks, W, L, U, algorithm="ECT", alpha=None, hat_d=None, gamma=None):
+        self.numKnapsacks = numKnapsacks
+        self.W = W
+        self.remainingW = np.full(numKnapsacks, float(W))
+        self.value = np.zeros(numKnapsacks)
+        self.rowParams = ()
+        if algorithm == "ZCL":
+            self.threshold = k.PhiThreshold(L, U)
+        elif algorithm == "ZCLRandomized":
+            # one constant threshold per knapsack, generated from the phi threshold function
+            self.threshold = batch.RowThreshold()
+            phiThreshold = k.PhiThreshold(L, U)
+            self.rowParams = (np.array([phiThreshold(random.uniform(0, 1)) for _ in range(numKnapsacks)]),)
+        elif algorithm == "baseline":
+            self.threshold = k.AlphaPhiThreshold(L, U, alpha)
+        elif algorithm == "ECT":
+            self.threshold = k.AlphaFairThreshold(L, U, alpha)
+        elif algorithm == "LAECT":
+            self.threshold = k.AlphaLAThreshold(L, U, gamma)
+            if hat_d is None:
+                hat_d = np.sqrt(L * U)
+            self.rowParams = (np.broadcast_to(np.asarray(hat_d, dtype=float), (numKnapsacks,)),)
+        else:
+            raise ValueError("unknown algorithm {}".format(algorithm))
+
+    # knapsack receiving each offer  -- knapsacks
+    # value of each offered item     -- values
+    # weight of each offered item    -- weights
+    # returns a boolean array of admission decisions.  offers to the same knapsack are decided in the order
+    # given, in rounds that each hold at most one offer per knapsack
+    def admit(self, knapsacks, values, weights):
+        knapsacks = np.asarray(knapsacks, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        decisions = np.zeros(len(knapsacks), dtype=bool)
+
+        # rank of each offer among the offers to the same knapsack
+        order = np.argsort(knapsacks, kind="stable")
+        sortedIds = knapsacks[order]
+        groupStart = np.flatnonzero(np.concatenate(([True], sortedIds[1:] != sortedIds[:-1])))
+        rank = np.empty(len(knapsacks), dtype=np.int64)
+        rank[order] = np.arange(len(knapsacks)) - np.repeat(groupStart, np.diff(np.append(groupStart, len(knapsacks))))
+
+        # decided on copies of the state, so a batch that fails part-way leaves every knapsack unchanged
+        value = self.value.copy()
+        remainingW = self.remainingW.copy()
+        for r in range(int(rank.max()) + 1 if len(rank) > 0 else 0):
+            sel = np.flatnonzero(rank == r)
+            ids = knapsacks[sel]
+            w = weights[sel]
+            admit = batch.decide(self.W, remainingW[ids], values[sel] / w, w, self.threshold,
+                                 [p[ids] for p in self.rowParams])
+            value[ids] += np.where(admit, values[sel], 0.0)
+            remainingW[ids] -= np.where(admit, w, 0.0)
+            decisions[sel] = admit
+        self.value = value
+        self.remainingW = remainingW
+        return decisions
+
+# serves admission decisions for a KnapsackBank.  callers await offer(...) (in-process) or send
+# "knapsack value weight" lines over a socket; concurrent offers are coalesced into micro-batches of up to
+# maxBatch offers, waiting at most maxDelay seconds for a batch to fill up
+class AdmissionServer:
+    def __init__(self, bank, maxBatch=4096, maxDelay=0.0005, latencyWindow=100000):
+        self.bank = bank
+        self.maxBatch = maxBatch
+        self.maxDelay = maxDelay
+        self.latencies = deque(maxlen=latencyWindow)
+        self.queue = None
+        self.task = None
+        self.offers = 0
+        self.batches = 0
+        self.startTime = None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.startTime = time.perf_counter()
+        self.task = asyncio.create_task(self.batchLoop())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    # knapsack receiving the offer  -- knapsack
+    # value of the offered item     -- value
+    # weight of the offered item    -- weight
+    # returns True if the item is admitted
+    async def offer(self, knapsack, value, weight):
+        if not 0 <= knapsack < self.bank.numKnapsacks:
+            raise ValueError("knapsack {} out of range; the bank has {} knapsacks".format(knapsack,
+                                                                                   self.bank.numKnapsacks))
+        if not (weight > 0 and math.isfinite(weight) and math.isfinite(value)):
+            raise ValueError("expected a finite value and a finite positive weight, got {} and {}".format(value,
+                                                                                                      weight))
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((knapsack, value, weight, time.perf_counter(), future))
+        return await future
+
+    async def batchLoop(self):
+        while True:
+            pending = [await self.queue.get()]
+            deadline = time.perf_counter() + self.maxDelay
+            while len(pending) < self.maxBatch:
+                if not self.queue.empty():
+                    pending.append(self.queue.get_nowait())
+                    continue
+                # give other callers a chance to submit before the deadline
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            knapsacks, values, weights, submitted, futures = zip(*pending)
+            try:
+                decisions = self.bank.admit(knapsacks, values, weights)
+            except Exception as e:
+                # fail this batch only, so the loop keeps serving later offers
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            for future, decision, t in zip(futures, decisions.tolist(), submitted):
+                if not future.done():
+                    future.set_result(decision)
+                self.latencies.append(now - t)
+            self.offers += len(pending)
+            self.batches += 1
+
+    # throughput (offers/s since start), latency percentiles (seconds, over recent offers), and mean batch size
+    def stats(self):
+        elapsed = time.perf_counter() - self.startTime
+        latencies = np.array(self.latencies) if len(self.latencies) > 0 else np.zeros(1)
+        return {
+            "offers": self.offers,
+            "throughput": self.offers / elapsed if elapsed > 0 else 0.0,
+            "p50": float(np.percentile(latencies, 50)),
+            "p99": float(np.percentile(latencies, 99)),
+            "meanBatch": self.offers / max(self.batches, 1),
+        }
+
+    # one "knapsack value weight" request per line, answered in order with "1" (admit) or "0" (reject), or with
+    # "error <message>" for a malformed or failed request.  requests on a connection may be pipelined; they are
+    # decided concurrently with all other offers
+    async def handleClient(self, reader, writer):
+        answers = asyncio.Queue()
+
+        async def respond():
+            while True:
+                task = await answers.get()
+                if task is None:
+                    break
+                try:
+                    writer.write(b"1\n" if await task else b"0\n")
+                except Exception as e:
+                    writer.write("error {}\n".format(e).encode())
+                if answers.empty():
+                    await writer.drain()
+
+        responder = asyncio.create_task(respond())
+        try:
+            async for line in reader:
+                try:
+                    fields = line.split()
+                    if len(fields) != 3:
+                        raise ValueError("expected 'knapsack value weight', got {} fields".format(len(fields)))
+                    answer = asyncio.ensure_future(self.offer(int(fields[0]), float(fields[1]), float(fields[2])))
+                except ValueError as e:
+                    # answered in its place, so pipelined clients stay aligned with their requests
+                    answer = asyncio.get_running_loop().create_future()
+                    answer.set_exception(e)
+                answers.put_nowait(answer)
+            answers.put_nowait(None)
+            await responder
+        finally:
+            responder.cancel()
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handleClient, host, port)
+
+# load generator: knapsack i replays trace i (mod the number of traces), with one outstanding offer per knapsack
+# the admission server                              -- server
+# list of value sequences, one per trace            -- traceValues
+# list of weight sequences, one per trace           -- traceWeights
+# number of knapsacks to drive                      -- numKnapsacks
+# number of items offered to each knapsack          -- itemsPerKnapsack
+async def replay(server, traceValues, traceWeights, numKnapsacks, itemsPerKnapsack=None):
+    async def tenant(i):
+        tValue = traceValues[i % len(traceValues)]
+        tWeight = traceWeights[i % len(traceWeights)]
+        n = len(tValue) if itemsPerKnapsack is None else min(itemsPerKnapsack, len(tValue))
+        for j in range(n):
+            await server.offer(i, tValue[j], tWeight[j])
+
+    await asyncio.gather(*[tenant(i) for i in range(numKnapsacks)])
+
+# same as replay, but sends offers over the given number of socket connections, pipelining one offer
+# per knapsack on each connection at a time
+async def replaySocket(host, port, traceValues, traceWeights, numKnapsacks, itemsPerKnapsack=None, connections=16):
+    async def connection(c):
+        reader, writer = await asyncio.open_connection(host, port)
+        tenants = list(range(c, numKnapsacks, connections))
+        position = {i: 0 for i in tenants}
+        while tenants:
+            sent = []
+            for i in tenants:
+                tValue = traceValues[i % len(traceValues)]
+                tWeight = traceWeights[i % len(traceWeights)]
+                n = len(tValue) if itemsPerKnapsack is None else min(itemsPerKnapsack, len(tValue))
+                if position[i] < n:
+                    writer.write("{} {!r} {!r}\n".format(i, tValue[position[i]], tWeight[position[i]]).encode())
+                    position[i] += 1
+                    sent.append(i)
+            await writer.drain()
+            for _ in sent:
+                await reader.readline()
+            tenants = sent
+        writer.close()
+
+    await asyncio.gather(*[connection(c) for c in range(connections)])
+
+async def main(args):
+    import load_traces
+    traceValues, traceWeights, L, U = load_traces.loadBaseTraces(theta=args.theta)
+    bank = KnapsackBank(args.knapsacks, 1, L, U, args.algorithm, alpha=args.alpha, hat_d=args.hat_d, gamma=args.gamma)
+    server = AdmissionServer(bank, maxBatch=args.max_batch, maxDelay=args.max_delay)
+    await server.start()
+    if args.socket:
+        listener = await server.serve(port=args.port)
+        await replaySocket("127.0.0.1", args.port, traceValues, traceWeights, args.knapsacks, args.items)
+        listener.close()
+    else:
+        await replay(server, traceValues, traceWeights, args.knapsacks, args.items)
+    await server.stop()
+
+    stats = server.stats()
+    print("offers: {}".format(stats["offers"]))
+    print("throughput: {:.0f} offers/s".format(stats["throughput"]))
+    print("latency p50: {:.3f} ms, p99: {:.3f} ms".format(stats["p50"]*1e3, stats["p99"]*1e3))
+    print("mean batch size: {:.1f}".format(stats["meanBatch"]))
+
+if __name__ == "__main__":
+    # replays the data-cloud traces against a local server and reports throughput and latency
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theta", type=int, default=10)
+    parser.add_argument("--algorithm", default="ECT")
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--hat_d", type=float, default=None)
+    parser.add_argument("--knapsacks", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--max_batch", type=int, default=4096)
+    parser.add_argument("--max_delay", type=float, default=0.0005)
+    parser.add_argument("--socket", action="store_true")
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,226 @@
+# Time Fairness in Online Knapsack Problems
+# Sharded Admission (many knapsacks, or one capacity split into shards, with their state in shared memory)
+#
+# the remaining capacity and value of every shard live in one shared memory block, so worker processes decide
+# offers concurrently with the threshold rules in knapsack.py.  every threshold is non-decreasing in the
+# utilization, and capacity is only ever taken, so a rejection made from a stale read of the remaining
+# capacity is still correct: offers are rejected without a lock, and only admissions take the lock of their
+# shard (locks are striped over shards), re-reading the capacity and deciding again if it changed meanwhile
+
+import argparse
+import heapq
+import os
+import random
+import time
+from multiprocessing import Lock, Pool, util
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import online
+
+# number of locks shared by the shards (shard s uses lock s % LOCK_STRIPES)
+LOCK_STRIPES = 64
+
+# number of offers per worker task
+TASK_OFFERS = 10000
+
+# shards in shared memory, each a knapsack of capacity W deciding with the same threshold.  created in the main
+# process, and attached to by workers with ShardedBank(**bank.spec())
+class ShardedBank:
+    # number of shards                                  -- shards
+    # capacity of each shard                            -- W
+    # threshold object (see online.makeThreshold)       -- threshold
+    # per-call threshold parameters (hat_d for LAECT)   -- params
+    # locks striped over the shards (created if None)   -- locks
+    # name of the shared memory block to attach to      -- name
+    def __init__(self, shards, W, threshold, params=(), locks=None, name=None):
+        self.shards = shards
+        self.W = W
+        self.threshold = threshold
+        self.params = params
+        self.locks = locks if locks is not None else [Lock() for _ in range(min(shards, LOCK_STRIPES))]
+        self.owner = name is None
+        self.memory = SharedMemory(name=name, create=self.owner, size=2 * shards * 8)
+        self.state = self.memory.buf.cast("d")  # remaining capacity of every shard, then value of every shard
+        self.remainingW = np.ndarray(shards, dtype=np.float64, buffer=self.memory.buf)
+        if self.owner:
+            self.remainingW[:] = W
+            np.ndarray(shards, dtype=np.float64, buffer=self.memory.buf, offset=shards * 8)[:] = 0.0
+        # (-remaining capacity, shard) of every shard as last seen by this process, for leastUtilizedRoute.  the
+        # capacity of a shard only ever decreases, so a stale entry can only overstate it
+        self.leastUtilized = [(-float(W), s) for s in range(shards)]
+
+    # arguments that attach another process to this bank (the locks must be passed at process creation)
+    def spec(self):
+        return {"shards": self.shards, "W": self.W, "threshold": self.threshold, "params": self.params,
+                "locks": self.locks, "name": self.memory.name}
+
+    def close(self):
+        self.remainingW = None
+        self.state.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # final value of every shard
+    def values(self):
+        return np.array(self.state[self.shards:])
+
+    # utilization (W - remaining capacity) of every shard
+    def utilization(self):
+        return self.W - np.array(self.state[:self.shards])
+
+    # shard receiving the offer    -- shard
+    # value of the offered item    -- value
+    # weight of the offered item   -- weight
+    # returns (admitted, retried), where retried is True if the shard changed between the decision and the lock
+    def offer(self, shard, value, weight):
+        remainingW = self.state[shard]
+        density = value/weight
+        phi_j = self.threshold((self.W - remainingW) / self.W, *self.params)
+        if not (density >= phi_j and (remainingW - weight) > 0):
+            return False, False
+
+        with self.locks[shard % len(self.locks)]:
+            current = self.state[shard]
+            retried = current != remainingW
+            if retried:
+                # another worker admitted an item to this shard in between: decide again on the current state
+                phi_j = self.threshold((self.W - current) / self.W, *self.params)
+                if not (density >= phi_j and (current - weight) > 0):
+                    return False, True
+            self.state[shard] = current - weight
+            self.state[self.shards + shard] += value
+        return True, retried
+
+# routing policies: shard for the offer with the given key (e.g. an item or tenant id), from the shared state
+
+# Fibonacci hashing: the key times 2^64 / golden ratio (mod 2^64), mapped to a shard by its high bits (a
+# multiply-high, which works for any number of shards), since the low bits of the product mix the key poorly
+def hashRoute(bank, key, rng):
+    return (((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) * bank.shards) >> 64
+
+# shard with the most remaining capacity (the lowest index among ties).  entries of the heap whose capacity
+# changed since they were pushed are refreshed when they reach the top, so an offer costs O(log shards) per
+# shard that changed instead of a scan of every shard
+def leastUtilizedRoute(bank, key, rng):
+    heap = bank.leastUtilized
+    while True:
+        negRemaining, shard = heap[0]
+        current = bank.state[shard]
+        if -negRemaining == current:
+            return shard
+        heapq.heapreplace(heap, (-current, shard))
+
+def powerOfTwoRoute(bank, key, rng):
+    a = rng.randrange(bank.shards)
+    b = rng.randrange(bank.shards)
+    return a if bank.state[a] >= bank.state[b] else b
+
+ROUTERS = {
+    "hash": hashRoute,
+    "leastUtilized": leastUtilizedRoute,
+    "powerOfTwo": powerOfTwoRoute,
+}
+
+# bank attached to by this worker
+workerBank = None
+
+def initWorker(spec):
+    global workerBank
+    workerBank = ShardedBank(**spec)
+    # detach from the shared memory when the worker exits (the pool must be closed and joined, not terminated)
+    util.Finalize(None, workerBank.close, exitpriority=10)
+
+# offers a block of items (keys are their positions in the workload), routing each one with the given policy.
+# returns the number of offers, admissions, and admissions decided again under the lock
+def runOffers(task):
+    router, start, values, weights, seed = task
+    route = ROUTERS[router]
+    rng = random.Random(seed)
+    admitted = 0
+    retries = 0
+    for i, (value, weight) in enumerate(zip(values.tolist(), weights.tolist())):
+        admit, retried = workerBank.offer(route(workerBank, start + i, rng), value, weight)
+        admitted += admit
+        retries += retried
+    return len(values), admitted, retries
+
+# name of the algorithm (ZCL, ZCLRandomized, ...)   -- algorithm
+# lower/upper bound on value size ratio             -- L, U
+# algorithm parameters (alpha, hat_d, gamma)        -- params
+# returns the threshold and per-call parameters of an algorithm, to be shared by every shard and worker
+def makeThreshold(algorithm, L, U, **params):
+    threshold = online.makeThreshold(algorithm, L, U, **params)  # ZCLRandomized draws its threshold once, here
+    return threshold, ((params["hat_d"],) if algorithm == "LAECT" else ())
+
+# flat arrays of values and weights of the offers   -- values, weights
+# sharded bank (see ShardedBank)                    -- bank
+# routing policy (see ROUTERS)                      -- router
+# number of worker processes                        -- workers
+# offers every item to the bank from a pool of workers, and returns the wall-clock seconds (excluding pool
+# start-up), and the number of offers, admissions, and retries
+def runSharded(values, weights, bank, router="powerOfTwo", workers=1, seed=0):
+    tasks = [(router, start, values[start:start + TASK_OFFERS], weights[start:start + TASK_OFFERS], seed + start)
+             for start in range(0, len(values), TASK_OFFERS)]
+    with Pool(workers, initializer=initWorker, initargs=(bank.spec(),)) as p:
+        p.map(abs, range(workers))  # wait until every worker has attached
+        start = time.perf_counter()
+        results = p.map(runOffers, tasks, chunksize=1)
+        elapsed = time.perf_counter() - start
+        p.close()
+        p.join()
+    offers, admitted, retries = (sum(x) for x in zip(*results)) if results else (0, 0, 0)
+    return elapsed, offers, admitted, retries
+
+# list of numbers of worker processes                  -- workerCounts
+# number of shards, and capacity of each shard         -- shards, W
+# number of offers (a synthetic trace, see workload.py) -- offers
+# offers throughput (offers per second) against the number of workers, each run starting from empty shards
+def scalingBenchmark(workerCounts=(1, 2, 4), shards=64, W=100, offers=200000, algorithm="ECT", router="powerOfTwo",
+                     seed=0, **params):
+    import workload
+    L, U = workload.bounds(workload.Workload())
+    chunks = list(workload.traceChunks(offers, seed=seed))
+    values = np.concatenate([c[1] for c in chunks]) if chunks else np.zeros(0)
+    weights = np.concatenate([c[2] for c in chunks]) if chunks else np.zeros(0)
+    if algorithm == "LAECT":
+        params.setdefault("hat_d", float(np.sqrt(L * U)))
+    threshold, thresholdParams = makeThreshold(algorithm, L, U, **params)
+
+    results = []
+    for workers in workerCounts:
+        with ShardedBank(shards, W, threshold, thresholdParams) as bank:
+            elapsed, offered, admitted, retries = runSharded(values, weights, bank, router, workers, seed)
+            results.append({"workers": workers, "shards": shards, "router": router, "algorithm": algorithm,
+                            "offers": offered, "admitted": admitted, "retries": retries, "seconds": elapsed,
+                            "offersPerSecond": offered / elapsed if elapsed > 0 else 0.0,
+                            "value": float(bank.values().sum()),
+                            "utilization": float(bank.utilization().sum() / (shards * W))})
+        print("{} workers: {:.0f} offers/s ({} admitted, {} retried under the lock)".format(
+            workers, results[-1]["offersPerSecond"], admitted, retries))
+    return results
+
+if __name__ == "__main__":
+    # reports how the offer throughput of a sharded bank scales with the number of worker processes
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--W", type=float, default=100)
+    parser.add_argument("--offers", type=int, default=1000000)
+    parser.add_argument("--algorithm", default="ECT", choices=["ZCL", "ZCLRandomized", "baseline", "ECT", "LAECT"])
+    parser.add_argument("--router", default="powerOfTwo", choices=list(ROUTERS))
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--gamma", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    params = {"baseline": {"alpha": args.alpha}, "ECT": {"alpha": args.alpha},
+              "LAECT": {"gamma": args.gamma}}.get(args.algorithm, {})
+    scalingBenchmark(sorted(set(args.workers)), args.shards, args.W, args.offers, args.algorithm, args.router,
+                     args.seed, **params)
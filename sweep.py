@@ -0,0 +1,279 @@
+# Time Fairness in Online Knapsack Problems
+# Parameter Sweeps (many alpha or gamma values per trace in one pass, and the competitive ratio vs fairness frontier)
+
+import argparse
+import os
+from collections import namedtuple
+from multiprocessing import Pool
+import numpy as np
+import knapsack as k
+import batch
+import grid
+import trace_store
+import instrument
+import functools
+
+# mean competitive ratio at each swept value, and whether the value is on the Pareto frontier
+# (no other value is at least as fair, i.e. has a larger or equal alpha, with a lower mean ratio)
+Frontier = namedtuple("Frontier", ["values", "meanRatios", "pareto"])
+
+# thresholds of one algorithm for many parameter values at once.  vector(z, K, *args) evaluates a (traces x K)
+# array of utilizations, with the constants of the first K values broadcast along the columns
+class ColumnThresholds:
+    def __init__(self, L, U, thresholds):
+        self.L = L
+        self.U = U
+        self.thresholds = thresholds
+
+    # utilization from which column j can differ from a threshold that is flat at L (-inf if it always can)
+    def divergence(self):
+        return np.full(len(self.thresholds), -np.inf)
+
+    # scalar threshold of column j, used near ties so decisions match the scalar algorithms exactly
+    def __call__(self, z, j, *args):
+        return self.thresholds[j](z, *args)
+
+# baseline algorithm for an increasing array of alpha values (see AlphaPhiThreshold)
+class BaselineColumns(ColumnThresholds):
+    def __init__(self, L, U, alphas):
+        super().__init__(L, U, [k.AlphaPhiThreshold(L, U, alpha) for alpha in alphas])
+        self.alpha = np.asarray(alphas, dtype=float)
+        self.base = self.thresholds[0].base
+        self.Le = self.thresholds[0].Le
+        self.ell = np.array([t.ell for t in self.thresholds])
+        self.span = np.where(self.alpha < 1, 1 - self.ell, 1.0)  # the curve is never used when alpha >= 1
+
+    def divergence(self):
+        return self.alpha
+
+    def vector(self, z, K):
+        alpha = self.alpha[:K]
+        curve = np.power(self.base, (np.maximum(z, alpha) - self.ell[:K])/self.span[:K])*self.Le
+        return np.where(z < alpha, self.L, curve)
+
+# ECT algorithm for an increasing array of alpha values (see AlphaFairThreshold)
+class ECTColumns(ColumnThresholds):
+    def __init__(self, L, U, alphas):
+        super().__init__(L, U, [k.AlphaFairThreshold(L, U, alpha) for alpha in alphas])
+        self.alpha = np.asarray(alphas, dtype=float)
+        self.beta = np.array([t.betaReal if t.alpha < 1 else 0.0 for t in self.thresholds])
+
+    def divergence(self):
+        return self.alpha
+
+    def vector(self, z, K):
+        alpha = self.alpha[:K]
+        return np.where(z < alpha, self.L, self.U*np.exp(self.beta[:K]*(np.maximum(z, alpha)-1)))
+
+# LAECT algorithm for an array of gamma values (see AlphaLAThreshold), with one prediction per trace
+# (or per trace and value)
+class LAECTColumns(ColumnThresholds):
+    def __init__(self, L, U, gammas):
+        super().__init__(L, U, [k.AlphaLAThreshold(L, U, gamma) for gamma in gammas])
+        self.gamma = np.asarray(gammas, dtype=float)
+        self.base = self.thresholds[0].base
+        self.Le = self.thresholds[0].Le
+        self.span = np.where(self.gamma < 1, 1 - self.gamma, 1.0)  # the curve is never used when gamma = 1
+
+    def vector(self, z, K, hat_d):
+        gamma = self.gamma[:K]
+        exp = np.power(self.base, z/self.span[:K])*self.Le
+        exp2 = np.power(self.base, (z-gamma)/self.span[:K])*self.Le
+        return np.where(gamma == 1, hat_d, np.where(exp < hat_d, exp, np.where(exp2 >= hat_d, exp2, hat_d)))
+
+# algorithms that can be swept, and the parameter that is swept
+SWEEP_COLUMNS = {
+    "baseline": BaselineColumns,
+    "ECT": ECTColumns,
+    "LAECT": LAECTColumns,
+}
+
+# knapsack of capacity W                               -- W
+# flat array of weights for all traces                 -- weights
+# flat array of values for all traces                  -- vals
+# trace boundaries (length T + 1)                      -- offsets
+# thresholds for every swept value (ColumnThresholds)  -- columns
+# tuple of per-trace parameters (hat_d for LAECT)      -- rowParams
+# a parameter may also be a (T x number of values) array, with one entry per (trace, value) pair
+# every (trace, value) pair is a knapsack, and all of them advance together over the items of each trace.
+# while a trace's utilization is below alpha, the threshold is flat at L for every alpha, so all values share
+# one run (the "greedy" run below); a column only gets its own state once some trace reaches its alpha, so the
+# columns must be sorted by alpha (sweepTraces and sweepStore sort any values they are given)
+# returns a (T x number of values) array of final profits
+def sweep(W, weights, vals, offsets, columns, rowParams=()):
+    divergence = columns.divergence()
+    if np.any(divergence[1:] < divergence[:-1]):
+        raise ValueError("swept values must be in increasing order")
+    order, active, stepOffsets, dest, weightsIM, valsIM = batch.itemMajor(weights, vals, offsets)
+    T = len(order)
+    P = len(columns.thresholds)
+    densityIM = valsIM / weightsIM
+    params = [np.asarray(p, dtype=float)[order] if np.ndim(p) > 0 else np.full(T, float(p)) for p in rowParams]
+
+    # shared run with a threshold that is flat at L, and per-column runs for the first K columns
+    greedyRemainingW = np.full(T, float(W))
+    greedyValue = np.zeros(T)
+    remainingW = np.empty((T, P))
+    value = np.empty((T, P))
+    K = 0
+    if instrument.ENABLED:
+        columns = instrument.TimedThreshold(columns)
+        instrument.count("steps", len(active))
+    start = instrument.clock()
+
+    for i in range(len(active)):
+        a = active[i]
+        s, t = stepOffsets[i], stepOffsets[i+1]
+        w = weightsIM[s:t]
+        density = densityIM[s:t]
+
+        # columns split off from the shared run as soon as some trace reaches their alpha
+        newK = int(np.searchsorted(divergence, ((W - greedyRemainingW[:a]) / W).max(), side="right"))
+        if newK > K:
+            remainingW[:, K:newK] = greedyRemainingW[:, None]
+            value[:, K:newK] = greedyValue[:, None]
+            K = newK
+
+        if K > 0:
+            rem = remainingW[:a, :K]
+            z = (W - rem) / W
+            rowArgs = [p[:a, None] if p.ndim == 1 else p[:a, :K] for p in params]
+            phi = columns.vector(z, K, *rowArgs)
+
+            # re-evaluate thresholds that are within rounding distance of the density with the scalar helper
+            close = np.argwhere(np.abs(density[:, None] - phi) <= batch.TIE_TOLERANCE * phi)
+            if instrument.ENABLED:
+                instrument.count("tieFixups", len(close))
+            for r, j in close:
+                phi[r, j] = columns(float(z[r, j]), j, *[p[r] if p.ndim == 1 else p[r, j] for p in params])
+
+            admit = (density[:, None] >= phi) & (rem > w[:, None])
+            value[:a, :K] += np.where(admit, valsIM[s:t, None], 0.0)
+            rem -= np.where(admit, w[:, None], 0.0)
+
+        if K < P:
+            admit = (density >= columns.L) & (greedyRemainingW[:a] > w)
+            greedyValue[:a] += np.where(admit, valsIM[s:t], 0.0)
+            greedyRemainingW[:a] -= np.where(admit, w, 0.0)
+
+    # columns that never split off behave like the shared run; undo the sort by length
+    value[:, K:] = greedyValue[:, None]
+    instrument.record("sweep", start, len(dest) * P)
+    profits = np.empty((T, P))
+    profits[order] = value
+    return profits
+
+# name of the algorithm (see SWEEP_COLUMNS)        -- algorithm
+# knapsack of capacity W                           -- W
+# list of weight sequences, one per trace          -- traceWeights
+# list of value sequences, one per trace           -- traceValues
+# lower bound on value size ratio                  -- L
+# upper bound on value size ratio                  -- U
+# array of alpha (or gamma) values                 -- values
+# predicted d^star of each trace (LAECT only)      -- hat_d
+# number of traces simulated together              -- chunkSize
+# returns a (T x number of values) array of final profits, in the original order of the traces and values
+def sweepTraces(algorithm, W, traceWeights, traceValues, L, U, values, hat_d=None, chunkSize=512):
+    valueOrder = np.argsort(values, kind="stable")
+    columns = SWEEP_COLUMNS[algorithm](L, U, np.asarray(values, dtype=float)[valueOrder])
+    T = len(traceValues)
+    if hasattr(traceValues, "gather"):
+        lengths = traceValues.lengths()
+    else:
+        lengths = np.array([len(x) for x in traceValues], dtype=np.int64)
+
+    # group traces of similar length into the same chunk, so every chunk has few lockstep steps
+    order = np.argsort(-lengths, kind="stable")
+    profits = np.empty((T, len(values)))
+    for start in range(0, T, chunkSize):
+        idx = order[start:start + chunkSize]
+        if hasattr(traceValues, "gather"):
+            vals, offsets = traceValues.gather(idx)
+            weights, _ = traceWeights.gather(idx)
+        else:
+            vals, weights, offsets = batch.flattenTraces([traceValues[t] for t in idx], [traceWeights[t] for t in idx])
+        if hat_d is None:
+            rowParams = ()
+        else:
+            rowHat_d = np.asarray(hat_d)[idx]
+            rowParams = (rowHat_d[:, valueOrder] if rowHat_d.ndim == 2 else rowHat_d,)
+        profits[idx[:, None], valueOrder] = sweep(W, weights, vals, offsets, columns, rowParams)
+    return profits
+
+# sweeps one group of traces of a columnar store (see grid.workerStore)
+def runSweepTask(task):
+    theta, algorithm, values, W, rows, hat_d = task
+    store = grid.workerStore(theta)
+    columns = SWEEP_COLUMNS[algorithm](store.L, store.U, values)
+    vals, offsets = store.traceValues().gather(rows)
+    weights, _ = store.traceWeights().gather(rows)
+    return rows, sweep(W, weights, vals, offsets, columns, () if hat_d is None else (hat_d,))
+
+# value of theta (see load_traces.py)                       -- theta
+# name of the algorithm (see SWEEP_COLUMNS)                 -- algorithm
+# array of alpha (or gamma) values                          -- values
+# multiplicative error of the predictions (LAECT only)      -- error
+# seed for the predictions                                  -- seed
+# number of worker processes (default: one per core)        -- processes
+# number of traces per task                                 -- chunkSize
+# returns a (T x number of values) array of final profits for the traces of the store (with the values in the
+# given order), and their optimal solutions
+def sweepStore(theta, algorithm, values, error=0, seed=0, processes=None, W=1, chunkSize=256):
+    import load_traces
+    valueOrder = np.argsort(values, kind="stable")
+    values = np.asarray(values, dtype=float)[valueOrder]
+    load_traces.loadDataAndOPT(theta=theta)  # make sure the store exists before the workers open it
+    store = trace_store.openStore(trace_store.storePath(theta))
+    predictions = grid.noisyPredictions(store.bestDensities, error, seed) if algorithm == "LAECT" else None
+
+    order = np.argsort(-store.traces.lengths(), kind="stable")
+    tasks = []
+    for start in range(0, len(store), chunkSize):
+        rows = order[start:start + chunkSize]
+        tasks.append((theta, algorithm, values, W, rows, None if predictions is None else predictions[rows]))
+
+    profits = np.empty((len(store), len(values)))
+    with Pool(processes or os.cpu_count(), initializer=grid.initWorker, initargs=(W, instrument.ENABLED)) as p:
+        finished = p.imap_unordered(functools.partial(instrument.collect, runSweepTask), tasks)
+        for done, ((rows, chunkProfits), profile) in enumerate(finished, 1):
+            instrument.merge(profile)
+            profits[rows[:, None], valueOrder] = chunkProfits
+            print("\rsweep: {}/{} tasks".format(done, len(tasks)), end="", flush=True)
+    print()
+    return profits, np.asarray(store.optimalSols)
+
+# array of alpha (or gamma) values               -- values
+# (T x number of values) array of final profits  -- profits
+# optimal solution of each trace                 -- optimalSols
+# returns the mean empirical competitive ratio at each value, and the Pareto-optimal values, where a larger
+# alpha is fairer (for gamma, the Pareto flag marks values that beat every larger gamma), in the given order
+def frontier(values, profits, optimalSols):
+    with np.errstate(divide="ignore"):  # a trace where nothing is admitted has an infinite ratio
+        meanRatios = np.mean(np.asarray(optimalSols)[:, None] / profits, axis=0)
+    # a value is Pareto-optimal if its mean ratio is lower than that of every larger value
+    valueOrder = np.argsort(values, kind="stable")
+    sortedRatios = meanRatios[valueOrder]
+    bestAbove = np.minimum.accumulate(np.concatenate(([np.inf], sortedRatios[:0:-1])))[::-1]
+    pareto = np.empty(len(valueOrder), dtype=bool)
+    pareto[valueOrder] = sortedRatios < bestAbove
+    return Frontier(np.asarray(values), meanRatios, pareto)
+
+if __name__ == "__main__":
+    # sweeps a dense grid of alpha (or gamma) values over a data set and prints the frontier
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--theta", type=int, default=10)
+    parser.add_argument("--algorithm", default="ECT", choices=sorted(SWEEP_COLUMNS))
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--error", type=float, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    values = np.linspace(0, 1, args.points + 1)[1:]  # alpha = 0 is not defined for ECT
+    profits, optimalSols = sweepStore(args.theta, args.algorithm, values, error=args.error, processes=args.processes)
+    result = frontier(values, profits, optimalSols)
+    parameter = "gamma" if args.algorithm == "LAECT" else "alpha"
+    print("{:>8} {:>14} {:>7}".format(parameter, "mean ratio", "pareto"))
+    for value, ratio, pareto in zip(*result):
+        print("{:8.4f} {:14.6f} {:>7}".format(value, ratio, "*" if pareto else ""))
+    if instrument.ENABLED:
+        instrument.report()
@@ -0,0 +1,25 @@
+# Time Fairness in Online Knapsack Problems
+# Test Fixtures (short synthetic traces, see workload.py)
+
+import os
+import sys
+import numpy as np
+import pytest
+
+# the modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import workload
+
+# short cloud-like traces of different lengths, so the batch engines run traces that finish at different steps.
+# returns (traceValues, traceWeights, L, U)
+@pytest.fixture(scope="session")
+def traces():
+    traceValues, traceWeights, L, U = workload.generateTraces(6, 400, seed=1)
+    lengths = (400, 37, 250, 1, 399, 120)
+    return ([v[:n] for v, n in zip(traceValues, lengths)], [w[:n] for w, n in zip(traceWeights, lengths)], L, U)
+
+# short traces with log-uniform value densities in [L, U], which fill the knapsack at every utilization
+@pytest.fixture(scope="session")
+def loguniformTraces():
+    return workload.generateTraces(4, 300, seed=2, workload=workload.Workload(values="loguniform", L=1.0, U=500.0))
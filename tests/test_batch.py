@@ -0,0 +1,45 @@
+import random
+import numpy as np
+import pytest
+import knapsack as k
+import batch
+
+# arguments of each algorithm after (W, weights, vals, n, L, U); hat_d (None) is filled in per trace
+ALGORITHM_ARGS = {
+    "ZCL": (),
+    "baseline": (0.5,),
+    "ECT": (0.5,),
+    "LAECT": (None, 0.5),
+}
+
+@pytest.mark.parametrize("name", sorted(ALGORITHM_ARGS))
+@pytest.mark.parametrize("dataset", ["traces", "loguniformTraces"])
+def test_batch_matches_scalar(name, dataset, request):
+    traceValues, traceWeights, L, U = request.getfixturevalue(dataset)
+    args = tuple(np.sqrt(L * U) if a is None else a for a in ALGORITHM_ARGS[name])
+    vals, weights, offsets = batch.flattenTraces(traceValues, traceWeights)
+    profits, utilization, packed = batch.BATCH_ALGORITHMS[name](1, weights, vals, offsets, L, U, *args)
+
+    for t, (tValue, tWeight) in enumerate(zip(traceValues, traceWeights)):
+        profit, util, packedSet = getattr(k, name)(1, tWeight, tValue, len(tValue), L, U, *args)
+        assert profits[t] == profit[-1]
+        assert utilization[t] == util[-1]
+        assert batch.packedSets(packed, offsets)[t] == packedSet
+
+def test_randomized_batch_matches_scalar(traces, monkeypatch):
+    traceValues, traceWeights, L, U = traces
+    z = [0.1, 0.3, 0.5, 0.7, 0.9, 0.2]
+    vals, weights, offsets = batch.flattenTraces(traceValues, traceWeights)
+    profits = batch.ZCLRandomizedBatch(1, weights, vals, offsets, L, U, z=z)[0]
+
+    # the scalar algorithm draws its z with random.uniform(0, 1)
+    for t, (tValue, tWeight) in enumerate(zip(traceValues, traceWeights)):
+        monkeypatch.setattr(random, "uniform", lambda a, b, z_j=z[t]: z_j)
+        profit = k.ZCLRandomized(1, tWeight, tValue, len(tValue), L, U)[0]
+        assert profits[t] == profit[-1]
+
+def test_simulate_traces_restores_order(traces):
+    traceValues, traceWeights, L, U = traces
+    profits = batch.simulateTraces("ECT", 1, traceWeights, traceValues, L, U, 0.5, chunkSize=2)
+    expected = [k.ECT(1, w, v, len(v), L, U, 0.5)[0][-1] for v, w in zip(traceValues, traceWeights)]
+    assert profits.tolist() == expected
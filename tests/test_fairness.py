@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import fairness
+import knapsack as k
+import load_traces
+import trace_store
+
+@pytest.mark.parametrize("algorithm, params, scalar", [
+    ("ZCL", {}, lambda W, w, v, n, L, U: k.ZCL(W, w, v, n, L, U)),
+    ("ECT", {"alpha": [0.5]}, lambda W, w, v, n, L, U: k.ECT(W, w, v, n, L, U, 0.5)),
+])
+def test_admissions_match_the_replayed_shuffles(traces, tmp_path, monkeypatch, algorithm, params, scalar):
+    traceValues, traceWeights, L, U = traces
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(load_traces, "loadDataAndOPT", lambda theta: None)
+    shuffles = 3
+    bases = len(traceValues)
+    trace_store.writeStore(trace_store.storePath(0), traceValues, traceWeights, np.ones(bases), np.ones((bases, 2)),
+                           np.ones(bases), L, U, shuffles, 5)
+    store = trace_store.openStore(trace_store.storePath(0))
+
+    result = fairness.fairnessStudy(0, {algorithm: params}, processes=1, chunkSize=4)
+
+    # replay the scalar algorithm on every shuffle, and map its packed positions back to the base items
+    admissions = np.zeros(int(store.traces.baseOffsets[-1]))
+    for t in range(len(store)):
+        tValue = store.traceValues()[t].tolist()
+        tWeight = store.traceWeights()[t].tolist()
+        packed = sorted(scalar(1, tWeight, tValue, len(tValue), L, U)[2])
+        np.add.at(admissions, store.traces.itemIndex(t)[packed], 1)
+    np.testing.assert_array_equal(result.itemProbability[0], admissions / shuffles)
+    assert result.admitted[0].sum() == admissions.sum()
+    assert result.offered[0].sum() == shuffles * len(admissions)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import grid
+import load_traces
+import result_store
+import trace_store
+import workload
+
+def test_noise_is_independent_across_error_levels():
+    bestDens = np.ones(1000)
+    low = grid.noisyPredictions(bestDens, 0.5, seed=3) - 1
+    high = grid.noisyPredictions(bestDens, 1.0, seed=3) - 1
+    assert abs(np.corrcoef(low, high)[0, 1]) < 0.2
+    assert grid.noisyPredictions(bestDens, 0.5, seed=3).tolist() == (low + 1).tolist()
+    assert grid.noisyPredictions(bestDens, 0, seed=3).tolist() == bestDens.tolist()
+
+def test_expand_grid():
+    spec = {"theta": [10], "error": [0, 1], "algorithms": {"ZCL": {}, "LAECT": {"gamma": [0.5, 1]}}}
+    assert grid.expandGrid(spec) == [grid.Cell(10, "ZCL", None, None, None),
+                                     grid.Cell(10, "LAECT", None, 0.5, 0), grid.Cell(10, "LAECT", None, 0.5, 1),
+                                     grid.Cell(10, "LAECT", None, 1, 0), grid.Cell(10, "LAECT", None, 1, 1)]
+
+def test_task_boundaries():
+    assert grid.taskBoundaries(np.array([], dtype=np.int64), 10).tolist() == [0]
+    assert grid.taskBoundaries(np.array([6, 5, 4, 3, 2]), 10).tolist() == [0, 1, 5]
+
+def test_cell_keys_ignore_the_numeric_type():
+    assert (result_store.cellKey(grid.Cell(10, "ECT", 1, None, None), 0, 1, "d", "v") ==
+            result_store.cellKey(grid.Cell(10.0, "ECT", 1.0, None, None), 0, 1.0, "d", "v"))
+    assert (result_store.cellKey(grid.Cell(10, "ECT", 1, None, None), 0, 1, "d", "v") !=
+            result_store.cellKey(grid.Cell(10, "ECT", 0.5, None, None), 0, 1, "d", "v"))
+
+def test_load_grid_reads_a_finished_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(load_traces, "loadDataAndOPT", lambda theta: None)
+    workload.writeWorkload(trace_store.storePath(0), 4, 150, seed=2, solver="dp")
+    spec = {"theta": [0], "algorithms": {"ZCL": {}, "ECT": {"alpha": [1]}}}
+    with pytest.raises(KeyError):
+        grid.loadGrid(spec)
+    results = grid.runGrid(spec, processes=1)
+    loaded = grid.loadGrid({"theta": [0], "algorithms": {"ZCL": {}, "ECT": {"alpha": [1.0]}}})
+    assert set(loaded) == set(results)
+    for cell in results:
+        np.testing.assert_array_equal(loaded[cell], results[cell])
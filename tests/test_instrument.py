@@ -0,0 +1,19 @@
+import instrument
+
+def test_collect_keeps_the_timers_of_the_caller(monkeypatch):
+    monkeypatch.setattr(instrument, "ENABLED", True)
+    instrument.reset()
+    instrument.count("items", 5)
+
+    def task(n):
+        instrument.count("items", n)
+        return n * 2
+
+    result, profile = instrument.collect(task, 3)
+    assert result == 6
+    assert profile["counters"] == {"items": 3}
+    assert "task" in profile["timers"]
+    assert instrument.summary() == {"timers": {}, "counters": {"items": 5}}
+    instrument.merge(profile)
+    assert instrument.counters["items"] == 8
+    instrument.reset()
@@ -0,0 +1,58 @@
+import random
+import numpy as np
+import pytest
+import knapsack as k
+import opt
+
+pytest.importorskip("numba")
+
+BACKENDS = ("python", "numba")
+
+def algorithms(L, U):
+    return {
+        "ZCL": lambda v, w, backend: k.ZCL(1, w, v, len(v), L, U, backend=backend),
+        "baseline": lambda v, w, backend: k.baseline(1, w, v, len(v), L, U, 0.5, backend=backend),
+        "ECT": lambda v, w, backend: k.ECT(1, w, v, len(v), L, U, 0.5, backend=backend),
+        "LAECT": lambda v, w, backend: k.LAECT(1, w, v, len(v), L, U, np.sqrt(L * U), 0.5, backend=backend),
+        "LAECT1": lambda v, w, backend: k.LAECT(1, w, v, len(v), L, U, np.sqrt(L * U), 1, backend=backend),
+    }
+
+# both backends must return identical profits, utilizations, and packed sets (and DP/d* results)
+def checkParity(traceValues, traceWeights, L, U):
+    for i, (tValue, tWeight) in enumerate(zip(traceValues, traceWeights)):
+        for name, run in algorithms(L, U).items():
+            assert run(tValue, tWeight, "python") == run(tValue, tWeight, "numba"), name
+
+        # both backends draw the same random threshold from the same seed
+        results = []
+        for backend in BACKENDS:
+            random.seed(i)
+            results.append(k.ZCLRandomized(1, tWeight, tValue, len(tValue), L, U, backend=backend))
+        assert results[0] == results[1]
+
+        weightsP = np.rint(np.asarray(tWeight) * 100).astype(np.int64).tolist()
+        for memoryBounded in (False, True):
+            results = [k.dpOptimalKnapsack(100, weightsP, tValue, len(tValue), memoryBounded, backend=backend)
+                       for backend in BACKENDS]
+            assert results[0] == results[1]
+
+        results = [opt.bestConstantThreshold(1, tWeight, tValue, len(tValue), backend=backend) for backend in BACKENDS]
+        assert results[0] == results[1]
+
+def test_synthetic_parity(traces, loguniformTraces):
+    checkParity(*traces)
+    checkParity(*loguniformTraces)
+
+def test_data_cloud_parity():
+    pytest.importorskip("mat4py")
+    import load_traces
+    traceValues, traceWeights, L, U = load_traces.loadBaseTraces(theta=10)
+    checkParity(traceValues[:3], traceWeights[:3], L, U)
+
+def test_tabulated_threshold_falls_back(loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    threshold = k.AlphaFairThreshold(L, U, 0.5).tabulate()
+    tValue, tWeight = traceValues[0], traceWeights[0]
+    results = [k.ECT(1, tWeight, tValue, len(tValue), L, U, 0.5, threshold=threshold, backend=backend)
+               for backend in BACKENDS]
+    assert results[0] == results[1]
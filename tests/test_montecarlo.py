@@ -0,0 +1,31 @@
+import random
+import numpy as np
+import knapsack as k
+import montecarlo
+import opt
+
+def test_profits_match_separate_runs(traces, loguniformTraces):
+    for traceValues, traceWeights, L, U in (traces, loguniformTraces):
+        for tValue, tWeight in zip(traceValues, traceWeights):
+            n = len(tValue)
+            for seed in range(8):
+                # knapsack.ZCLRandomized draws z with random.uniform, so the same seed gives the same draw
+                random.seed(seed)
+                expected = k.ZCLRandomized(1, tWeight, tValue, n, L, U, backend="python")[0][-1]
+                random.seed(seed)
+                z = [random.uniform(0, 1)]
+                profit = montecarlo.ZCLRandomizedProfits(1, tWeight, tValue, n, L, U, z, backend="python")
+                assert profit.tolist() == [expected]
+
+def test_best_draw_is_d_star(loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        n = len(tValue)
+        bestDensity, bestProfit = opt.bestConstantThreshold(1, tWeight, tValue, n)
+        # a constant threshold at d^star reaches the best profit, and no draw of z does better
+        assert k.ZCL(1, tWeight, tValue, n, L, U, k.ConstantThreshold(bestDensity))[0][-1] == bestProfit
+        z = np.random.default_rng(0).uniform(0, 1, 2000)
+        profits = montecarlo.ZCLRandomizedProfits(1, tWeight, tValue, n, L, U, z)
+        assert profits.max() <= bestProfit
+        densities, sweep = opt.constantThresholdProfits(1, tWeight, tValue, n)
+        assert sweep.max() == bestProfit and densities[np.argmax(sweep)] == bestDensity
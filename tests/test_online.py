@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+import knapsack as k
+import online
+
+PARAMS = {
+    "ZCL": {},
+    "baseline": {"alpha": 0.5},
+    "ECT": {"alpha": 0.5},
+    "LAECT": {"hat_d": None, "gamma": 0.5},
+}
+
+def algorithmParams(name, L, U):
+    return {key: np.sqrt(L * U) if value is None else value for key, value in PARAMS[name].items()}
+
+def scalarRun(name, tValue, tWeight, L, U, params):
+    args = [params[key] for key in ("alpha", "hat_d", "gamma") if key in params]
+    return getattr(k, name)(1, tWeight, tValue, len(tValue), L, U, *args)
+
+@pytest.mark.parametrize("name", sorted(PARAMS))
+def test_offer_matches_scalar(name, loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    params = algorithmParams(name, L, U)
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        profit, utilization, packed = scalarRun(name, tValue, tWeight, L, U, params)
+        knapsack = online.OnlineKnapsack(1, L, U, name, history=len(tValue), **params)
+        decisions = [knapsack.offer(v, w) for v, w in zip(tValue, tWeight)]
+        assert set(np.flatnonzero(decisions).tolist()) == packed
+        assert knapsack.history()[0].tolist() == profit
+        assert knapsack.history()[1].tolist() == utilization
+
+@pytest.mark.parametrize("name", sorted(PARAMS))
+def test_offer_many_matches_offer(name, loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    params = algorithmParams(name, L, U)
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        single = online.OnlineKnapsack(1, L, U, name, history=50, **params)
+        expected = [single.offer(v, w) for v, w in zip(tValue, tWeight)]
+        many = online.OnlineKnapsack(1, L, U, name, history=50, **params)
+        decisions = np.concatenate([many.offer_many(tValue[i:i + 70], tWeight[i:i + 70])
+                                    for i in range(0, len(tValue), 70)])
+        assert decisions.tolist() == expected
+        assert (many.value, many.remainingW) == (single.value, single.remainingW)
+        assert [h.tolist() for h in many.history()] == [h.tolist() for h in single.history()]
+
+@pytest.mark.parametrize("name", sorted(PARAMS))
+def test_evaluate_matches_scalar(name, loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    params = algorithmParams(name, L, U)
+    tValue, tWeight = traceValues[0], traceWeights[0]
+    profit, utilization, packed = scalarRun(name, tValue, tWeight, L, U, params)
+    chunks = [(tValue[i:i + 45], tWeight[i:i + 45]) for i in range(0, len(tValue), 45)]
+    result = online.evaluate(1, chunks, L, U, name, sampleEvery=7, blockSize=32, **params)
+    assert (result.profit, result.utilization) == (profit[-1], utilization[-1])
+    assert (result.items, result.admitted) == (len(tValue), len(packed))
+    assert result.sampleIndex.tolist() == list(range(6, len(tValue), 7))
+    assert result.sampleProfit.tolist() == [profit[i] for i in result.sampleIndex]
+    assert result.sampleUtilization.tolist() == [utilization[i] for i in result.sampleIndex]
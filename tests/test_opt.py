@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import knapsack as k
+import opt
+
+def test_dp_reconstructs_optimal_set(traces):
+    traceValues, traceWeights, L, U = traces
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        weightsP = np.rint(np.asarray(tWeight) * 100).astype(np.int64).tolist()
+        value, packed = k.dpOptimalKnapsack(100, weightsP, tValue, len(tValue))
+        assert sum(weightsP[i] for i in packed) <= 100
+        assert sum(tValue[i] for i in packed) == pytest.approx(value, rel=1e-12)
+
+def test_memory_bounded_dp_matches(traces, monkeypatch):
+    traceValues, traceWeights, L, U = traces
+    monkeypatch.setattr(k, "DP_DIRECT_CELLS", 64)  # force the divide-and-conquer reconstruction
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        weightsP = np.rint(np.asarray(tWeight) * 100).astype(np.int64).tolist()
+        value, _ = k.dpOptimalKnapsack(100, weightsP, tValue, len(tValue))
+        boundedValue, packed = k.dpOptimalKnapsack(100, weightsP, tValue, len(tValue), memoryBounded=True)
+        assert boundedValue == value
+        assert sum(weightsP[i] for i in packed) <= 100
+        assert sum(tValue[i] for i in packed) == pytest.approx(value, rel=1e-12)
+
+@pytest.mark.parametrize("method, options", [("bnb", {}), ("bnb", {"maxNodes": 5}), ("fptas", {"epsilon": 0.2})])
+def test_solver_bounds_contain_opt(method, options, traces):
+    traceValues, traceWeights, L, U = traces
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        exact = opt.solveOPT(1, tWeight, tValue, len(tValue), method="dp")
+        result = opt.solveOPT(1, tWeight, tValue, len(tValue), method=method, **options)
+        assert result.lower <= exact.value * (1 + 1e-9)
+        assert result.upper >= exact.value * (1 - 1e-9)
+        assert sum(tWeight[i] for i in result.packed) <= 1 + opt.CAPACITY_TOLERANCE
+        assert sum(tValue[i] for i in result.packed) == pytest.approx(result.value, rel=1e-12)
+
+def test_best_constant_threshold_matches_scalar(traces):
+    traceValues, traceWeights, L, U = traces
+    for tValue, tWeight in zip(traceValues, traceWeights):
+        thresholds, profits = opt.constantThresholdProfits(1, tWeight, tValue, len(tValue))
+        for threshold, profit in zip(thresholds, profits):
+            expected = k.ZCL(1, tWeight, tValue, len(tValue), L, U, threshold=k.ConstantThreshold(threshold))[0][-1]
+            assert profit == expected
+        bestDensity, bestProfit = opt.bestConstantThreshold(1, tWeight, tValue, len(tValue))
+        assert bestProfit == profits.max()
+        assert bestDensity == thresholds[np.argmax(profits)]
+
+@pytest.mark.parametrize("method", ["bnb", "fptas"])
+def test_bounds_ordered_within_capacity_slack(method):
+    # both items only fit together thanks to the relative slack on the capacity
+    weights = [0.5, 0.5 * (1 + 1e-10)]
+    vals = [1.0, 1.0]
+    result = opt.solveOPT(1, weights, vals, 2, method=method)
+    assert result.value == 2.0
+    assert result.lower <= result.upper
+    assert opt.fractionalBound(1, weights, vals) >= result.value
@@ -0,0 +1,27 @@
+import numpy as np
+import grid
+import robustness
+import trace_store
+import workload
+
+def test_replicates_do_not_depend_on_the_split(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    workload.writeWorkload(trace_store.storePath(0), 6, 200, seed=4, solver="dp")
+    grid.initWorker(1)
+    gammas = np.array([0.33, 1])
+
+    def run(groups):
+        ratios = 0
+        for rows in groups:
+            ratios = ratios + robustness.runRobustnessTask((0, 1, 0.5, gammas, 8, np.asarray(rows), 7, 1))[1]
+        return ratios
+
+    whole = run([[0, 1, 2, 3, 4, 5]])
+    split = run([[4, 1], [0], [5, 3, 2]])
+    np.testing.assert_allclose(split, whole, rtol=1e-12)
+    assert len(np.unique(whole[0])) > 1  # replicates draw different noise
+
+def test_noise_does_not_depend_on_the_other_levels():
+    first = robustness.noiseStream(7, 0.5, 3).normal(0, 0.5, 10)
+    assert robustness.noiseStream(7, 0.5, 3).normal(0, 0.5, 10).tolist() == first.tolist()
+    assert robustness.noiseStream(7, 0.25, 3).normal(0, 0.5, 10).tolist() != first.tolist()
@@ -0,0 +1,87 @@
+import asyncio
+import numpy as np
+import pytest
+import knapsack as k
+import server
+
+def test_bank_matches_scalar(traces):
+    traceValues, traceWeights, L, U = traces
+    bank = server.KnapsackBank(len(traceValues), 1, L, U, "ECT", alpha=0.5)
+    # interleave the traces, one item of each knapsack after another
+    offers = [(t, v, w) for i in range(max(len(x) for x in traceValues))
+              for t, (tValue, tWeight) in enumerate(zip(traceValues, traceWeights)) if i < len(tValue)
+              for v, w in [(tValue[i], tWeight[i])]]
+    knapsacks, values, weights = zip(*offers)
+    decisions = bank.admit(knapsacks, values, weights)
+    for t, (tValue, tWeight) in enumerate(zip(traceValues, traceWeights)):
+        packed = k.ECT(1, tWeight, tValue, len(tValue), L, U, 0.5)[2]
+        assert set(np.flatnonzero(decisions[np.asarray(knapsacks) == t]).tolist()) == packed
+
+def test_laect_defaults_to_geometric_mean():
+    bank = server.KnapsackBank(3, 1, 1.0, 100.0, "LAECT", gamma=0.5)
+    assert bank.rowParams[0].tolist() == [10.0, 10.0, 10.0]
+    assert bank.admit([0, 1, 2], [0.5, 0.2, 0.001], [0.01, 0.01, 0.01]).tolist() == [True, True, False]
+
+def test_bad_offers_do_not_stop_the_server():
+    async def run():
+        srv = server.AdmissionServer(server.KnapsackBank(4, 1, 1.0, 100.0, "ZCL"), maxDelay=0)
+        await srv.start()
+        with pytest.raises(ValueError):
+            await srv.offer(7, 1.0, 0.01)
+        for value, weight in [(1.0, 0.0), (1.0, -0.01), (float("nan"), 0.01), (1.0, float("inf"))]:
+            with pytest.raises(ValueError):
+                await srv.offer(0, value, weight)
+        # a batch that fails inside the bank fails its own offers only
+        admit = srv.bank.admit
+
+        def failOnce(*args):
+            srv.bank.admit = admit
+            raise RuntimeError("bank failure")
+
+        srv.bank.admit = failOnce
+        with pytest.raises(RuntimeError):
+            await srv.offer(0, 1.0, 0.01)
+        admitted = await asyncio.wait_for(srv.offer(1, 1.0, 0.01), 5)
+        await srv.stop()
+        return admitted
+
+    assert asyncio.run(run()) is True
+
+def test_failed_batch_leaves_the_bank_unchanged(monkeypatch):
+    bank = server.KnapsackBank(2, 1, 1.0, 100.0, "ZCL")
+    bank.admit([0], [1.0], [0.01])
+    value, remainingW = bank.value.copy(), bank.remainingW.copy()
+    decide = server.batch.decide
+    calls = []
+
+    def failSecondRound(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("decision failure")
+        return decide(*args)
+
+    monkeypatch.setattr(server.batch, "decide", failSecondRound)
+    with pytest.raises(RuntimeError):
+        bank.admit([0, 1, 0], [1.0, 1.0, 1.0], [0.01, 0.01, 0.01])
+    assert bank.value.tolist() == value.tolist()
+    assert bank.remainingW.tolist() == remainingW.tolist()
+
+def test_socket_answers_every_line():
+    async def run():
+        srv = server.AdmissionServer(server.KnapsackBank(4, 1, 1.0, 100.0, "ZCL"), maxDelay=0)
+        await srv.start()
+        listener = await srv.serve(port=0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"0 1.0 0.01\n1 2.0\n2 x 0.01\n9 1.0 0.01\n3 0.001 0.01\n")
+        await writer.drain()
+        answers = [await asyncio.wait_for(reader.readline(), 5) for _ in range(5)]
+        writer.close()
+        listener.close()
+        await srv.stop()
+        return answers
+
+    answers = asyncio.run(run())
+    assert answers[0] == b"1\n"
+    assert [a.startswith(b"error ") for a in answers[1:4]] == [True, True, True]
+    assert answers[4] == b"0\n"
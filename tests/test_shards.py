@@ -0,0 +1,42 @@
+import random
+import numpy as np
+import online
+import shards
+
+def test_one_shard_matches_online(traces):
+    traceValues, traceWeights, L, U = traces
+    values = np.concatenate(traceValues)
+    weights = np.concatenate(traceWeights)
+    threshold, params = shards.makeThreshold("ECT", L, U, alpha=0.5)
+    knapsack = online.OnlineKnapsack(1, L, U, "ECT", threshold=threshold, alpha=0.5)
+    admitted = sum(knapsack.offer(v, w) for v, w in zip(values.tolist(), weights.tolist()))
+    with shards.ShardedBank(1, 1, threshold, params) as bank:
+        _, offers, bankAdmitted, retries = shards.runSharded(values, weights, bank, "hash", workers=1)
+        assert (offers, bankAdmitted, retries) == (len(values), admitted, 0)
+        assert bank.values().tolist() == [knapsack.value]
+        assert bank.utilization().tolist() == [1 - knapsack.remainingW]
+
+def test_workers_never_overfill_a_shard(loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    values = np.tile(np.concatenate(traceValues), 20)
+    weights = np.tile(np.concatenate(traceWeights), 20)
+    threshold, params = shards.makeThreshold("ZCL", L, U)
+    for router in shards.ROUTERS:
+        with shards.ShardedBank(8, 1, threshold, params) as bank:
+            _, offers, admitted, _ = shards.runSharded(values, weights, bank, router, workers=4)
+            assert offers == len(values) and admitted > 0
+            assert np.all(bank.utilization() <= 1)
+            assert np.all(bank.values() > 0)
+
+def test_routes_stay_in_range():
+    threshold, params = shards.makeThreshold("ZCL", 1.0, 100.0)
+    with shards.ShardedBank(7, 1, threshold, params) as bank:
+        rng = random.Random(0)
+        hashed = [shards.hashRoute(bank, key, rng) for key in range(7000)]
+        assert min(hashed) == 0 and max(hashed) == 6
+        assert np.bincount(hashed).min() > 900
+        assert bank.offer(0, 1.0, 0.5)[0] and bank.offer(3, 1.0, 0.25)[0]
+        assert shards.leastUtilizedRoute(bank, 0, rng) == 1
+        for shard in (1, 2, 4, 5, 6):
+            bank.offer(shard, 1.0, 0.75)
+        assert shards.leastUtilizedRoute(bank, 0, rng) == 3
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import batch
+import sweep
+
+@pytest.mark.parametrize("algorithm", ["baseline", "ECT"])
+def test_alpha_sweep_matches_batch(algorithm, loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    alphas = np.linspace(0, 1, 9)[1:]
+    profits = sweep.sweepTraces(algorithm, 1, traceWeights, traceValues, L, U, alphas)
+    for j, alpha in enumerate(alphas):
+        expected = batch.simulateTraces(algorithm, 1, traceWeights, traceValues, L, U, alpha)
+        assert profits[:, j].tolist() == expected.tolist()
+
+def test_gamma_sweep_matches_batch(loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    gammas = np.array([0, 0.33, 0.66, 1])
+    hat_d = np.geomspace(L, U, len(traceValues))
+    profits = sweep.sweepTraces("LAECT", 1, traceWeights, traceValues, L, U, gammas, hat_d=hat_d)
+    for j, gamma in enumerate(gammas):
+        expected = batch.simulateTraces("LAECT", 1, traceWeights, traceValues, L, U, hat_d, gamma)
+        assert profits[:, j].tolist() == expected.tolist()
+
+def test_unsorted_values_keep_their_columns(loguniformTraces):
+    traceValues, traceWeights, L, U = loguniformTraces
+    alphas = np.array([0.8, 0.2, 0.5, 0.35])
+    profits = sweep.sweepTraces("ECT", 1, traceWeights, traceValues, L, U, alphas)
+    for j, alpha in enumerate(alphas):
+        expected = batch.simulateTraces("ECT", 1, traceWeights, traceValues, L, U, alpha)
+        assert profits[:, j].tolist() == expected.tolist()
+
+    vals, weights, offsets = batch.flattenTraces(traceValues, traceWeights)
+    with pytest.raises(ValueError):
+        sweep.sweep(1, weights, vals, offsets, sweep.ECTColumns(L, U, alphas))
+
+def test_frontier():
+    values = np.array([0.25, 0.5, 0.75, 1.0])
+    profits = np.array([[1.0, 0.5, 0.8, 0.4]])
+    result = sweep.frontier(values, profits, [1.0])
+    assert result.meanRatios.tolist() == [1.0, 2.0, 1.25, 2.5]
+    assert result.pareto.tolist() == [True, False, True, True]
+
+def test_frontier_unsorted():
+    values = np.array([0.75, 0.25, 1.0, 0.5])
+    profits = np.array([[0.8, 1.0, 0.4, 0.5]])
+    result = sweep.frontier(values, profits, [1.0])
+    assert result.pareto.tolist() == [True, True, True, False]
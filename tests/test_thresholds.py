@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import knapsack as k
+
+L, U = 1.0, 500.0
+
+# threshold objects and their per-call parameters
+THRESHOLDS = {
+    "phi": (lambda: k.PhiThreshold(L, U), ()),
+    "alphaPhi": (lambda: k.AlphaPhiThreshold(L, U, 0.5), ()),
+    "alphaFair": (lambda: k.AlphaFairThreshold(L, U, 0.5), ()),
+    "alphaLA": (lambda: k.AlphaLAThreshold(L, U, 0.5), (np.sqrt(L * U),)),
+}
+
+@pytest.mark.parametrize("name", sorted(THRESHOLDS))
+def test_objects_match_helpers(name):
+    helpers = {
+        "phi": lambda z: k.phi(z, L, U),
+        "alphaPhi": lambda z: k.alphaPhi(z, L, U, 0.5),
+        "alphaFair": lambda z: float(np.real(k.alphaFair(z, L, U, 0.5))),
+        "alphaLA": lambda z: k.alphaLA(z, L, U, np.sqrt(L * U), 0.5),
+    }
+    make, params = THRESHOLDS[name]
+    threshold = make()
+    z = np.linspace(0, 1, 201)
+    assert [threshold(float(x), *params) for x in z] == [helpers[name](float(x)) for x in z]
+    np.testing.assert_allclose(threshold.vector(z, *params), [helpers[name](float(x)) for x in z], rtol=1e-12)
+
+@pytest.mark.parametrize("maxError", [1e-6, 1e-9])
+@pytest.mark.parametrize("name", sorted(THRESHOLDS))
+def test_tabulate_error_bound(name, maxError):
+    make, params = THRESHOLDS[name]
+    exact = make()
+    table = make().tabulate(maxError)
+    z = np.linspace(0, 1, 100001)
+    expected = exact.vector(z, *params)
+    assert np.max(np.abs(table.vector(z, *params) / expected - 1)) <= maxError
+    scalar = z[::997]
+    assert np.max(np.abs(np.array([table(float(x), *params) for x in scalar]) / expected[::997] - 1)) <= maxError
+
+def test_threshold_function_is_abstract():
+    with pytest.raises(TypeError):
+        k.ThresholdFunction(L, U)
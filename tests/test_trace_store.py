@@ -0,0 +1,27 @@
+import os
+import numpy as np
+import trace_store
+import workload
+
+def test_written_traces_keep_their_order(tmp_path):
+    path = str(tmp_path / "store")
+    generated = workload.generateTraces(3, 250, seed=5)
+    store = workload.writeWorkload(path, 3, 250, seed=5, chunkSize=100)
+    assert store.traces.identity
+    assert not os.path.exists(os.path.join(path, "permutations.idx"))
+    for t in range(3):
+        np.testing.assert_array_equal(store.traceValues()[t], generated[0][t])
+        np.testing.assert_array_equal(store.traceWeights()[t], generated[1][t])
+    values, offsets = store.traceValues().gather([2, 0])
+    np.testing.assert_array_equal(values, np.concatenate([generated[0][2], generated[0][0]]))
+    assert offsets.tolist() == [0, 250, 500]
+
+def test_gather_matches_the_shuffled_traces(tmp_path):
+    tValue = [np.arange(n, dtype=float) for n in (5, 1, 7)]
+    path = str(tmp_path / "store")
+    trace_store.writeStore(path, tValue, tValue, np.zeros(3), np.zeros((3, 2)), np.zeros(3), 1.0, 10.0, 4, 3)
+    store = trace_store.openStore(path)
+    rows = [11, 0, 5, 6]
+    values, offsets = store.traceValues().gather(rows)
+    np.testing.assert_array_equal(values, np.concatenate([store.traceValues()[t] for t in rows]))
+    assert sorted(store.traceValues()[11].tolist()) == tValue[2].tolist()
@@ -0,0 +1,306 @@
+# Time Fairness in Online Knapsack Problems
+# Columnar Trace Store (flat value/weight arrays plus trace offsets, opened with np.memmap)
+#
+# each base trace is stored once, and every shuffled trace is a permutation of a base trace.  permutations are
+# derived from a single master seed, and are kept on disk as compact (uint16/uint32) index arrays.  stores of
+# unshuffled traces (see StoreWriter) keep no permutations at all
+
+import numpy as np
+import json
+import os
+import shutil
+
+# directory holding the store for the specified value of theta
+def storePath(theta):
+    return "columnar{}".format(theta)
+
+# smallest unsigned integer type that can index every item of a trace with maxLength items
+def permutationDtype(maxLength):
+    return np.uint16 if maxLength <= np.iinfo(np.uint16).max + 1 else np.uint32
+
+# master seed                 -- seed
+# index of the base trace     -- base
+# index of the shuffle        -- shuffle
+# number of items             -- n
+# the permutation only depends on (seed, base, shuffle), so any subset can be regenerated on demand
+def permutation(seed, base, shuffle, n):
+    return np.random.default_rng(np.random.SeedSequence([seed, base, shuffle])).permutation(n)
+
+# number of items in each base trace  -- lengths
+# number of shuffles per base trace   -- shuffles
+# master seed                         -- seed
+# returns all permutations (base trace by base trace, shuffle by shuffle) in one flat compact array
+def generatePermutations(lengths, shuffles, seed):
+    dtype = permutationDtype(max(lengths) if len(lengths) > 0 else 0)
+    return np.concatenate([permutation(seed, b, s, n).astype(dtype) for b, n in enumerate(lengths) for s in range(shuffles)]
+                          or [np.zeros(0, dtype=dtype)])
+
+# flat positions of the items of the selected rows, plus offsets of the gathered rows
+def rowIndex(offsets, rows):
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = offsets[rows + 1] - offsets[rows]
+    newOffsets = np.concatenate(([0], np.cumsum(lengths)))
+    return np.repeat(offsets[rows] - newOffsets[:-1], lengths) + np.arange(newOffsets[-1]), newOffsets
+
+# a sequence of traces backed by one flat array, where trace i is flat[offsets[i]:offsets[i+1]]
+class TraceView:
+    def __init__(self, flat, offsets):
+        self.flat = flat
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("trace index out of range")
+        return self.flat[self.offsets[i]:self.offsets[i+1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    # returns the selected traces as one flat array, plus their offsets
+    def gather(self, rows):
+        index, offsets = rowIndex(self.offsets, rows)
+        return np.asarray(self.flat[index], dtype=float), offsets
+
+# shuffled traces: trace t is base trace t // shuffles, permuted by shuffle t % shuffles
+class PermutedTraces:
+    # flat arrays of base trace values and weights -- baseValues, baseWeights
+    # base trace boundaries                        -- baseOffsets
+    # number of shuffles per base trace            -- shuffles
+    # master seed                                  -- seed
+    # precomputed permutations (optional)          -- perms
+    # every shuffle keeps the base order           -- identity
+    def __init__(self, baseValues, baseWeights, baseOffsets, shuffles, seed, perms=None, identity=False):
+        self.baseValues = baseValues
+        self.baseWeights = baseWeights
+        self.baseOffsets = baseOffsets
+        self.shuffles = shuffles
+        self.seed = seed
+        self.perms = perms
+        self.identity = identity
+        self.permOffsets = np.concatenate(([0], np.cumsum(np.repeat(np.diff(baseOffsets), shuffles))))
+
+    def __len__(self):
+        return (len(self.baseOffsets) - 1) * self.shuffles
+
+    def lengths(self):
+        return np.diff(self.permOffsets)
+
+    def permutation(self, t):
+        if self.identity:
+            b = t // self.shuffles
+            return np.arange(self.baseOffsets[b+1] - self.baseOffsets[b])
+        if self.perms is not None:
+            return self.perms[self.permOffsets[t]:self.permOffsets[t+1]]
+        b, s = divmod(t, self.shuffles)
+        return permutation(self.seed, b, s, self.baseOffsets[b+1] - self.baseOffsets[b])
+
+    # flat positions (in the base arrays) of the items of trace t, in arrival order
+    def itemIndex(self, t):
+        return self.baseOffsets[t // self.shuffles] + self.permutation(t).astype(np.int64)
+
+    # flat positions of the items of the selected traces, plus offsets of the gathered traces
+    def gatherIndex(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.identity:
+            return rowIndex(self.baseOffsets, rows // self.shuffles)
+        if self.perms is None:
+            index = [self.itemIndex(t) for t in rows]
+            offsets = np.concatenate(([0], np.cumsum([len(x) for x in index])))
+            return (np.concatenate(index) if len(index) > 0 else np.zeros(0, dtype=np.int64)), offsets
+        index, offsets = rowIndex(self.permOffsets, rows)
+        base = np.repeat(self.baseOffsets[rows // self.shuffles], np.diff(offsets))
+        return base + self.perms[index].astype(np.int64), offsets
+
+    def traceValues(self):
+        return PermutedView(self, self.baseValues)
+
+    def traceWeights(self):
+        return PermutedView(self, self.baseWeights)
+
+# one column (values or weights) of PermutedTraces, as a sequence of traces
+class PermutedView:
+    def __init__(self, traces, column):
+        self.traces = traces
+        self.column = column
+
+    def __len__(self):
+        return len(self.traces)
+
+    def __getitem__(self, t):
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError("trace index out of range")
+        return np.asarray(self.column[self.traces.itemIndex(t)])
+
+    def __iter__(self):
+        for t in range(len(self)):
+            yield self[t]
+
+    def lengths(self):
+        return self.traces.lengths()
+
+    # returns the selected traces as one flat array, plus their offsets
+    def gather(self, rows):
+        index, offsets = self.traces.gatherIndex(rows)
+        return np.asarray(self.column[index], dtype=float), offsets
+
+# traces and their precomputed quantities, as stored on disk.  optimal solutions, bounds and d^star
+# are stored per base trace, and repeated for each of its shuffles
+class TraceStore:
+    def __init__(self, traces, optimalSols, optimalBounds, bestDensities, L, U, keys=None):
+        self.traces = traces
+        self.keys = keys
+        self.optimalSols = np.repeat(optimalSols, traces.shuffles)
+        self.optimalBounds = np.repeat(optimalBounds, traces.shuffles, axis=0)
+        self.bestDensities = np.repeat(bestDensities, traces.shuffles)
+        self.L = L
+        self.U = U
+
+    def __len__(self):
+        return len(self.traces)
+
+    def traceValues(self):
+        return self.traces.traceValues()
+
+    def traceWeights(self):
+        return self.traces.traceWeights()
+
+# directory of the store                                        -- path
+# list of value sequences, one per base trace                   -- traceValues
+# list of weight sequences, one per base trace                  -- traceWeights
+# optimal solution of each base trace                           -- optimalSols
+# certified (lower, upper) bounds on each optimal solution      -- optimalBounds
+# d^star of each base trace                                     -- bestDensities
+# lower/upper bound on value size ratio                         -- L, U
+# number of shuffles per base trace                             -- shuffles
+# master seed of the shuffles                                   -- seed
+# cache key of each base trace (optional, see load_traces.py)   -- keys
+def writeStore(path, traceValues, traceWeights, optimalSols, optimalBounds, bestDensities, L, U, shuffles, seed, keys=None):
+    lengths = np.array([len(x) for x in traceValues], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    perms = generatePermutations(lengths, shuffles, seed)
+
+    # write everything to a temporary directory first, so an interrupted write never leaves a partial store
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp, mode = 0o777)
+    writeColumn(os.path.join(tmp, "values.f64"), np.concatenate([np.asarray(x, dtype=np.float64) for x in traceValues]))
+    writeColumn(os.path.join(tmp, "weights.f64"), np.concatenate([np.asarray(x, dtype=np.float64) for x in traceWeights]))
+    writeColumn(os.path.join(tmp, "offsets.i64"), offsets)
+    writeColumn(os.path.join(tmp, "permutations.idx"), perms)
+    writeColumn(os.path.join(tmp, "optimal_sols.f64"), np.asarray(optimalSols, dtype=np.float64))
+    writeColumn(os.path.join(tmp, "optimal_bounds.f64"), np.asarray(optimalBounds, dtype=np.float64).reshape(-1))
+    writeColumn(os.path.join(tmp, "optimal_dens.f64"), np.asarray(bestDensities, dtype=np.float64))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"L": L, "U": U, "traces": len(lengths), "items": int(offsets[-1]), "shuffles": shuffles,
+                   "seed": seed, "permutationDtype": np.dtype(perms.dtype).name, "keys": keys}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp, path)
+
+# writes a store one chunk at a time, so the traces never have to be in memory together (see workload.py).
+# traces are stored in the order they are written, unshuffled (one shuffle per trace, and no permutations on
+# disk), and are only visible under path once the writer is closed
+class StoreWriter:
+    # directory of the store                                        -- path
+    # lower/upper bound on value size ratio                         -- L, U
+    # seed the traces were generated from                           -- seed
+    # cache key of each trace (optional)                            -- keys
+    def __init__(self, path, L, U, seed=0, keys=None):
+        self.path = path
+        self.tmp = path + ".tmp"
+        self.L = L
+        self.U = U
+        self.seed = seed
+        self.keys = keys
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp, mode = 0o777)
+        self.values = open(os.path.join(self.tmp, "values.f64"), "wb")
+        self.weights = open(os.path.join(self.tmp, "weights.f64"), "wb")
+        self.offsets = [0]
+        self.traceLength = 0
+        self.optimalSols = []
+        self.optimalBounds = []
+        self.bestDensities = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+    # appends a chunk of items to the current trace
+    def append(self, values, weights):
+        values = np.asarray(values, dtype=np.float64)
+        values.tofile(self.values)
+        np.asarray(weights, dtype=np.float64).tofile(self.weights)
+        self.traceLength += len(values)
+
+    # ends the current trace, with its optimal solution, bounds, and d^star (NaN if they were not computed)
+    def endTrace(self, optimalSol=np.nan, optimalBounds=(np.nan, np.nan), bestDensity=np.nan):
+        self.offsets.append(self.offsets[-1] + self.traceLength)
+        self.traceLength = 0
+        self.optimalSols.append(optimalSol)
+        self.optimalBounds.append(optimalBounds)
+        self.bestDensities.append(bestDensity)
+
+    def close(self):
+        if self.traceLength > 0:
+            self.endTrace()
+        for f in (self.values, self.weights):
+            f.close()
+        writeColumn(os.path.join(self.tmp, "offsets.i64"), np.asarray(self.offsets, dtype=np.int64))
+        writeColumn(os.path.join(self.tmp, "optimal_sols.f64"), np.asarray(self.optimalSols, dtype=np.float64))
+        writeColumn(os.path.join(self.tmp, "optimal_bounds.f64"), np.asarray(self.optimalBounds, dtype=np.float64).reshape(-1))
+        writeColumn(os.path.join(self.tmp, "optimal_dens.f64"), np.asarray(self.bestDensities, dtype=np.float64))
+        with open(os.path.join(self.tmp, "meta.json"), "w") as f:
+            json.dump({"L": self.L, "U": self.U, "traces": len(self.offsets) - 1, "items": int(self.offsets[-1]),
+                       "shuffles": 1, "seed": self.seed, "permutationDtype": None, "keys": self.keys}, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.rename(self.tmp, self.path)
+
+    # discards everything written so far
+    def abort(self):
+        for f in (self.values, self.weights):
+            f.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+def writeColumn(path, array):
+    array.tofile(path)
+
+# opens a column read-only, sharing pages with every other process that maps the same file
+def openColumn(path, dtype):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+# directory of the store -- path
+def openStore(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    # a store without a permutation dtype keeps every trace in its stored order
+    identity = meta["permutationDtype"] is None
+    traces = PermutedTraces(openColumn(os.path.join(path, "values.f64"), np.float64),
+                            openColumn(os.path.join(path, "weights.f64"), np.float64),
+                            openColumn(os.path.join(path, "offsets.i64"), np.int64),
+                            meta["shuffles"], meta["seed"],
+                            None if identity else openColumn(os.path.join(path, "permutations.idx"),
+                                                             np.dtype(meta["permutationDtype"])),
+                            identity)
+    return TraceStore(traces,
+                      openColumn(os.path.join(path, "optimal_sols.f64"), np.float64),
+                      openColumn(os.path.join(path, "optimal_bounds.f64"), np.float64).reshape(-1, 2),
+                      openColumn(os.path.join(path, "optimal_dens.f64"), np.float64),
+                      meta["L"], meta["U"], meta.get("keys"))
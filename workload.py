@@ -0,0 +1,196 @@
+# Time Fairness in Online Knapsack Problems
+# Synthetic Workload Generator (cloud-like traces of any size, streamed in chunks, see data-cloud/generate*.m)
+#
+# generateValue.m gives each job a weight drawn uniformly from (0.01, 0.03, 0.05) and a value of
+# unifrnd(1, theta) * duration * weight, where the durations (10 to 1000 slots) come from the arrival
+# instances built by generateIns.m.  this module draws jobs the same way (with durations resampled from those
+# instances, or drawn uniformly), and extends it with arrival processes, a log-uniform value model with any
+# L and U, and other weight sets.  every trace is generated in fixed blocks, each from its own seed, so a
+# trace only depends on (seed, trace) -- not on the chunk size, or on which other traces are generated
+
+import argparse
+import itertools
+import os
+from collections import namedtuple
+import numpy as np
+import trace_store
+
+# weights of the cloud jobs, and the range of job durations kept by generateIns.m
+CLOUD_WEIGHTS = (0.01, 0.03, 0.05)
+DURATION_RANGE = (10, 1000)
+
+# number of items drawn from each seed
+BLOCK_SIZE = 1 << 16
+
+# arrival process ("poisson", "diurnal", or "bursty")                      -- arrivals
+# mean arrival rate (jobs per slot)                                        -- rate
+# period and relative amplitude of the diurnal rate                        -- period, amplitude
+# rate multiplier during bursts, and probability of entering/leaving one   -- burstRate, switch
+# value model: "cloud" (generateValue.m) or "loguniform" (densities in [L, U]) -- values
+# values are unifrnd(1, theta) * duration * weight in the cloud model      -- theta
+# job durations: "uniform" over DURATION_RANGE, or "empirical" (resampled from data-cloud/arrival_Instance) -- durations
+# value density bounds of the loguniform model                             -- L, U
+# possible weights, drawn uniformly                                        -- weights
+# the algorithms only see the order of the items; arrival times are returned alongside for analyses (and for
+# pacing a load generator)
+Workload = namedtuple("Workload", ["arrivals", "rate", "period", "amplitude", "burstRate", "switch", "values",
+                                   "theta", "durations", "L", "U", "weights"],
+                      defaults=("poisson", 1.0, 8640.0, 0.5, 10.0, 0.001, "cloud", 10, "uniform", 1.0, 1000.0,
+                                CLOUD_WEIGHTS))
+
+# lower and upper bound on the value densities of a workload, known before any item is drawn
+def bounds(workload):
+    if workload.values == "cloud":
+        return float(DURATION_RANGE[0]), float(workload.theta * DURATION_RANGE[1])
+    if workload.values == "loguniform":
+        return float(workload.L), float(workload.U)
+    raise ValueError("unknown value model {}".format(workload.values))
+
+# job durations of the arrival instances built by generateIns.m (loaded once)
+empiricalDurations = None
+
+def loadDurations():
+    global empiricalDurations
+    if empiricalDurations is None:
+        from mat4py import loadmat
+        directory = os.path.join("data-cloud", "arrival_Instance")
+        durations = []
+        for name in sorted(os.listdir(directory)):
+            arrIns = np.asarray(loadmat(os.path.join(directory, name))["arrIns"], dtype=float)
+            durations.append(arrIns.reshape(-1, 4)[:, 2])
+        empiricalDurations = np.concatenate(durations)
+    return empiricalDurations
+
+# arrival times of size candidate jobs after time t, and the time and burst state to continue from.  the diurnal
+# process thins candidates at the peak rate, so it may return fewer than size arrivals
+def arrivalTimes(workload, rng, size, t, burst):
+    if workload.arrivals == "poisson":
+        times = t + np.cumsum(rng.exponential(1 / workload.rate, size))
+        return times, times[-1], burst
+    if workload.arrivals == "diurnal":
+        peak = workload.rate * (1 + workload.amplitude)
+        times = t + np.cumsum(rng.exponential(1 / peak, size))
+        rate = workload.rate * (1 + workload.amplitude * np.sin(2 * np.pi * times / workload.period))
+        return times[rng.uniform(0, peak, size) < rate], times[-1], burst
+    if workload.arrivals == "bursty":
+        # two-state (normal/burst) Markov-modulated Poisson process
+        states = (burst + np.cumsum(rng.uniform(0, 1, size) < workload.switch)) % 2
+        rate = workload.rate * np.where(states == 1, workload.burstRate, 1.0)
+        times = t + np.cumsum(rng.exponential(1, size) / rate)
+        return times, times[-1], int(states[-1])
+    raise ValueError("unknown arrival process {}".format(workload.arrivals))
+
+# values and weights of size jobs
+def jobs(workload, rng, size):
+    weights = rng.choice(np.asarray(workload.weights, dtype=float), size)
+    if workload.values == "loguniform":
+        density = np.exp(rng.uniform(np.log(workload.L), np.log(workload.U), size))
+        return density * weights, weights
+    if workload.values != "cloud":
+        raise ValueError("unknown value model {}".format(workload.values))
+    if workload.durations == "empirical":
+        durations = rng.choice(loadDurations(), size)
+    elif workload.durations == "uniform":
+        durations = rng.integers(DURATION_RANGE[0], DURATION_RANGE[1] + 1, size).astype(float)
+    else:
+        raise ValueError("unknown duration model {}".format(workload.durations))
+    return rng.uniform(1, workload.theta, size) * durations * weights, weights
+
+# unbounded sequence of (times, values, weights) blocks of one trace
+def blocks(workload, seed, trace):
+    t, burst = 0.0, 0
+    for block in itertools.count():
+        rng = np.random.default_rng(np.random.SeedSequence([seed, trace, block]))
+        times, t, burst = arrivalTimes(workload, rng, BLOCK_SIZE, t, burst)
+        values, weights = jobs(workload, rng, len(times))
+        yield times, values, weights
+
+# number of items                            -- n
+# index of the trace                         -- trace
+# master seed                                -- seed
+# parameters of the workload                 -- workload
+# number of items per chunk                  -- chunkSize
+# streams one trace as (times, values, weights) chunks of chunkSize items (the last one may be shorter)
+def traceChunks(n, trace=0, seed=0, workload=Workload(), chunkSize=BLOCK_SIZE):
+    pending = []
+    buffered = 0
+    remaining = n
+    for block in blocks(workload, seed, trace):
+        if remaining == 0:
+            break
+        block = tuple(x[:remaining] for x in block)
+        remaining -= len(block[0])
+        pending.append(block)
+        buffered += len(block[0])
+        while buffered >= chunkSize or (remaining == 0 and buffered > 0):
+            columns = [np.concatenate(x) for x in zip(*pending)]
+            yield tuple(x[:chunkSize] for x in columns)
+            pending = [tuple(x[chunkSize:] for x in columns)]
+            buffered = len(pending[0][0])
+
+# number of traces                           -- traces
+# number of items per trace                  -- n
+# generates whole traces in memory, in the form returned by load_traces.loadBaseTraces
+def generateTraces(traces, n, seed=0, workload=Workload()):
+    traceValues = []
+    traceWeights = []
+    for trace in range(traces):
+        chunks = list(traceChunks(n, trace, seed, workload))
+        traceValues.append(np.concatenate([c[1] for c in chunks]).tolist())
+        traceWeights.append(np.concatenate([c[2] for c in chunks]).tolist())
+    L, U = bounds(workload)
+    return traceValues, traceWeights, L, U
+
+# directory of the columnar store                                    -- path
+# number of traces                                                   -- traces
+# number of items per trace                                          -- n
+# solver for the offline optimum of each trace, or None to skip it   -- solver
+# writes the traces straight to a columnar store (see trace_store.py), chunk by chunk.  the offline optimum
+# and d^star need one whole trace in memory (and the DP needs time proportional to its length), so they are
+# only computed when a solver is given; otherwise they are stored as NaN
+def writeWorkload(path, traces, n, seed=0, workload=Workload(), chunkSize=BLOCK_SIZE, solver=None, **solverOptions):
+    import opt
+    L, U = bounds(workload)
+    with trace_store.StoreWriter(path, L, U, seed) as writer:
+        for trace in range(traces):
+            chunks = []
+            for times, values, weights in traceChunks(n, trace, seed, workload, chunkSize):
+                writer.append(values, weights)
+                if solver is not None:
+                    chunks.append((values, weights))
+            if solver is None:
+                writer.endTrace()
+            else:
+                tValue = np.concatenate([c[0] for c in chunks]).tolist()
+                tWeight = np.concatenate([c[1] for c in chunks]).tolist()
+                result = opt.solveOPT(1, tWeight, tValue, n, method=solver, **solverOptions)
+                bestDensity, _ = opt.bestConstantThreshold(1, tWeight, tValue, n)
+                writer.endTrace(result.value, (result.lower, result.upper), bestDensity)
+            print("\rgenerating traces: {}/{}".format(trace + 1, traces), end="", flush=True)
+    print()
+    return trace_store.openStore(path)
+
+if __name__ == "__main__":
+    # writes a synthetic workload to a columnar store, e.g. 1000 traces of 100000 items each:
+    # python3 workload.py --output columnar-synthetic --traces 1000 --items 100000
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="columnar-synthetic")
+    parser.add_argument("--traces", type=int, default=100)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--arrivals", default="poisson", choices=["poisson", "diurnal", "bursty"])
+    parser.add_argument("--values", default="cloud", choices=["cloud", "loguniform"])
+    parser.add_argument("--theta", type=float, default=10)
+    parser.add_argument("--durations", default="uniform", choices=["uniform", "empirical"])
+    parser.add_argument("--L", type=float, default=1.0)
+    parser.add_argument("--U", type=float, default=1000.0)
+    parser.add_argument("--weights", type=float, nargs="+", default=list(CLOUD_WEIGHTS))
+    parser.add_argument("--chunk", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--solver", default=None, choices=["dp", "bnb", "fptas"])
+    args = parser.parse_args()
+
+    workload = Workload(arrivals=args.arrivals, values=args.values, theta=args.theta, durations=args.durations,
+                        L=args.L, U=args.U, weights=tuple(args.weights))
+    store = writeWorkload(args.output, args.traces, args.items, args.seed, workload, args.chunk, args.solver)
+    print("wrote {} traces ({} items) to {}, L = {}, U = {}".format(len(store), int(store.traces.baseOffsets[-1]),
+                                                                   args.output, store.L, store.U))